@@ -1,3 +1,5 @@
+import time
+STARTUP_BEGIN = time.perf_counter()   # 启动计时起点：开始导入模块
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import os
@@ -6,31 +8,3811 @@ import hashlib
 from datetime import datetime, date, timedelta
 import re
 import random
-from collections import defaultdict
-import time
+from collections import defaultdict, deque
 import sys
 import tempfile
-from tkinter import font
+import sqlite3
+import calendar
+import zlib
+import codecs
+import threading
+import queue
+import csv
+import shutil
+import select
+import struct
+import ctypes
+import ctypes.util
+import bisect
+import functools
+import math
+import gc
+import urllib.error
+import urllib.parse
+
+# 打印功能适配（兼容多系统，优先核心问题修复）
+# pywin32/PIL 和 reportlab 导入较慢且只在打印时用到，首次打印时才导入
+win32print = win32ui = None
+canvas = letter = pdfmetrics = TTFont = None
+
+@functools.lru_cache(maxsize=None)
+def win32_printing_supported():
+    """导入 Windows 打印所需的 pywin32 和 PIL，返回是否可用（只尝试一次）"""
+    global win32print, win32ui
+    import importlib.util
+    try:
+        import win32print
+        import win32ui
+    except ImportError:
+        return False
+    # 打印不直接使用 PIL，只检查是否已安装
+    return importlib.util.find_spec("PIL") is not None
+
+@functools.lru_cache(maxsize=None)
+def reportlab_supported():
+    """导入 PDF 打印所需的 reportlab，返回是否可用（只尝试一次）"""
+    global canvas, letter, pdfmetrics, TTFont
+    try:
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import letter
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+    except ImportError:
+        return False
+    return True
+
+# 跨进程文件锁：Windows 使用 msvcrt，其余系统使用 fcntl
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# 可选：有 NumPy 时按等级规则重算等级使用向量化计算（导入较慢，首次重算时才导入）
+@functools.lru_cache(maxsize=None)
+def optional_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+PHONE_PATTERN = re.compile(r'^1[3-9]\d{9}$')
+BIRTHDAY_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+MEMBER_ID_PATTERN = re.compile(r'^VIP\d{14}[0-9A-F]{6}$')
+LOAD_POLL_INTERVAL = 30   # 加载进度轮询间隔（毫秒）
+LOAD_POLL_BUDGET = 0.04   # 每次轮询最多占用界面线程的时间（秒）
+SAVE_POLL_INTERVAL = 50   # 后台保存结果轮询间隔（毫秒）
+SEARCH_DEBOUNCE = 250     # 输入停顿多久后执行搜索（毫秒）
+SUMMARY_INTERVAL = 500    # 状态栏汇总刷新间隔（毫秒）
+MEMBER_PAGE_SIZE = 200    # 会员列表每页显示的行数
+TRANSACTION_PAGE_SIZE = 200  # 交易记录窗口每页显示的行数
+WATCH_SCAN_INTERVAL = 1.0    # 自动导入目录无法使用 inotify 时的扫描间隔（秒）
+AUTO_IMPORT_POLL_INTERVAL = 50  # 界面线程领取自动导入文件的间隔（毫秒）
+IMPORT_BATCH_SIZE = 500     # 导入提交时每批加入的会员数
+METRIC_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # 耗时直方图各格上界（毫秒）
+METRICS_WINDOW = 1000       # 计算 p50/p95/p99 使用的最近样本数
+METRICS_LOG_MAX_BYTES = 1 << 20  # 性能日志超过该大小时轮转
+METRICS_LOG_KEEP = 3        # 保留的旧性能日志个数
+SERVE_PORT = 8765           # 会员服务默认端口
+SERVE_BATCH_INTERVAL = 0.02  # 会员服务合并写入的间隔（秒）
+SERVE_SEARCH_LIMIT = 200    # 会员服务每次搜索最多返回的会员数
+SERVE_MAX_BODY = 1 << 16    # 会员服务请求体上限（字节）
+SERVE_TOKEN_HEADER = "X-Service-Token"   # 会员服务口令请求头
+SERVE_TOKEN_ENV = "VIP_SERVICE_TOKEN"    # 未指定 --token 时从该环境变量读取口令
+SYNC_INTERVAL = 3000        # 读取其他终端写入的变更的间隔（毫秒）
+PRINT_RETRIES = 3           # 每个打印任务最多尝试几次
+PRINT_RETRY_DELAY = 1.0     # 打印失败后的重试间隔（秒，逐次递增）
+PRINT_POLL_INTERVAL = 200   # 打印任务状态轮询间隔（毫秒）
+PRINT_JOB_HISTORY = 50      # 打印队列窗口保留最近多少个任务
+PDF_FONT_PATHS = ("C:/Windows/Fonts/simhei.ttf",  # 黑体
+                  "C:/Windows/Fonts/simsun.ttc",  # 宋体
+                  "C:/Windows/Fonts/msyh.ttc")    # 微软雅黑
+
+# ------------------------------
+# 会员记录（紧凑存储）
+# ------------------------------
+def to_cents(value):
+    """金额/积分（如 "12.34"）转换为以 0.01 为单位的整数；无法解析时为 0，无穷大和 NaN 抛出 ValueError"""
+    try:
+        cents = float(value) * 100
+    except (TypeError, ValueError):
+        return 0
+    if not math.isfinite(cents):
+        raise ValueError(f"无效的数值：{value}")
+    return int(round(cents))
+
+def from_cents(cents):
+    return f"{cents / 100:.2f}"
+
+class Transaction:
+    """交易记录：金额、积分变化和操作后余额都是以 0.01 为单位的整数
+
+    数据文件中的其他字段原样保存在 extra 中（没有时为 None）。
+    """
+    __slots__ = ('time', 'action', 'amount', 'points_change', 'balance_after', 'extra')
+    FIELDS = ('time', 'action', 'amount', 'points_change', 'balance_after')
+
+    def __init__(self, time, action, amount=0, points_change=0, balance_after=0, extra=None):
+        self.time = time
+        self.action = sys.intern(action)
+        self.amount = amount
+        self.points_change = points_change
+        self.balance_after = balance_after
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {k: v for k, v in data.items() if k not in cls.FIELDS} or None
+        return cls(data.get('time', ''), data.get('action', ''), to_cents(data.get('amount')),
+                   to_cents(data.get('points_change')), to_cents(data.get('balance_after')), extra)
+
+    def to_dict(self):
+        data = {
+            'time': self.time,
+            'action': self.action,
+            'amount': from_cents(self.amount),
+            'points_change': from_cents(self.points_change),
+            'balance_after': from_cents(self.balance_after)
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+class Member:
+    """会员记录：余额、积分和累计消费都是以 0.01 为单位的整数
+
+    等级、状态等重复出现的字符串会被驻留（intern），只在读写数据文件时
+    与原有的字典格式（金额为 "12.34" 形式的字符串）互相转换。
+    transactions 为 None 表示交易记录只保存在存储中，需要时再按会员读取。
+    version 为数据文件中该会员的版本号，每写入一次加一（多台终端合并变更时使用）。
+    """
+    __slots__ = ('id', 'name', 'phone', 'birthday', 'level', 'balance', 'points', 'total_spent',
+                 'status', 'created_time', 'transactions', 'extra', 'version')
+    FIELDS = ('id', 'name', 'phone', 'birthday', 'level', 'balance', 'points', 'total_spent',
+              'status', 'created_time', 'transactions', 'version')
+
+    def __init__(self, member_id, name, phone, birthday="", level="普通会员", balance=0, points=0,
+                 total_spent=0, status="正常", created_time="", transactions=None, extra=None, version=0):
+        self.id = member_id
+        self.name = name
+        self.phone = phone
+        self.birthday = birthday
+        self.level = sys.intern(level)
+        self.balance = balance
+        self.points = points
+        self.total_spent = total_spent
+        self.status = sys.intern(status)
+        self.created_time = created_time
+        self.transactions = transactions
+        self.extra = extra
+        self.version = version
+
+    @classmethod
+    def from_dict(cls, data):
+        """从数据文件格式转换，旧版本缺少的积分、累计消费、版本号等字段补为 0"""
+        extra = {k: v for k, v in data.items() if k not in cls.FIELDS} or None
+        return cls(data.get('id', ''), data.get('name', ''), data.get('phone', ''),
+                   data.get('birthday', ''), data.get('level', '普通会员'),
+                   to_cents(data.get('balance')), to_cents(data.get('points')),
+                   to_cents(data.get('total_spent')), data.get('status', '正常'),
+                   data.get('created_time', ''),
+                   [Transaction.from_dict(t) for t in data['transactions']] if 'transactions' in data else None,
+                   extra, int(data.get('version') or 0))
+
+    def to_dict(self, transactions=True):
+        data = {
+            'id': self.id,
+            'name': self.name,
+            'phone': self.phone,
+            'birthday': self.birthday,
+            'level': self.level,
+            'balance': from_cents(self.balance),
+            'points': from_cents(self.points),
+            'total_spent': from_cents(self.total_spent),
+            'status': self.status,
+            'created_time': self.created_time,
+            'version': self.version
+        }
+        if self.extra:
+            data.update(self.extra)
+        if transactions and self.transactions is not None:
+            data['transactions'] = [t.to_dict() for t in self.transactions]
+        return data
+
+    def copy(self, transactions=True):
+        """副本：交易记录创建后不再修改，只需复制列表；transactions=False 时不含交易记录"""
+        return Member(self.id, self.name, self.phone, self.birthday, self.level, self.balance,
+                      self.points, self.total_spent, self.status, self.created_time,
+                      list(self.transactions) if transactions and self.transactions is not None else None,
+                      self.extra, self.version)
+
+class PhoneIndex:
+    """手机号 -> 会员ID 索引，只收录非注销会员
+
+    正常情况下一个手机号只对应一个会员；旧数据中重复的手机号以集合保存。
+    会员的手机号或状态变更前先 remove()，变更后再 add()。
+    """
+
+    def __init__(self):
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def rebuild(self, members):
+        self._ids = {}
+        for member in members.values():
+            self.add(member)
+
+    def add(self, member):
+        if member.status == "已注销":
+            return
+        current = self._ids.get(member.phone)
+        if current is None:
+            self._ids[member.phone] = member.id
+        elif isinstance(current, set):
+            current.add(member.id)
+        elif current != member.id:
+            self._ids[member.phone] = {current, member.id}
+
+    def remove(self, member):
+        current = self._ids.get(member.phone)
+        if current == member.id:
+            del self._ids[member.phone]
+        elif isinstance(current, set):
+            current.discard(member.id)
+            if len(current) == 1:
+                self._ids[member.phone] = current.pop()
+
+    def find(self, phone, exclude_id=None):
+        """返回使用该手机号的非注销会员ID（排除 exclude_id），没有时返回 None"""
+        current = self._ids.get(phone)
+        if isinstance(current, set):
+            return next((member_id for member_id in current if member_id != exclude_id), None)
+        return current if current != exclude_id else None
+
+class SearchIndex:
+    """会员搜索索引：关键词（小写）在会员ID、姓名、手机号或等级中出现即匹配
+
+    每个会员保存一份小写的检索文本（ID、姓名、手机号以 \\x00 分隔），
+    三字组（trigram）-> 会员ID 的倒排表用于筛选候选，最后用子串匹配核对，
+    因此倒排表里允许残留已删除或已变更会员的旧条目，残留过多时整体重建。
+    少于三个字的关键词：非ASCII（中文姓名）用姓名的单字/二字组倒排表，
+    ASCII（ID、手机号中的数字字母，筛选性很差）直接扫描检索文本。
+    等级只有少数几种取值，按等级分组保存会员。
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.texts = {}                   # 会员ID -> 检索文本
+        self.postings = defaultdict(list) # 三字组/姓名短词 -> [会员ID]
+        self.by_level = defaultdict(set)
+        self.rank = {}                    # 会员ID -> 加入顺序（搜索结果按列表顺序排列）
+        self.entries = 0
+        self.stale = 0
+
+    def rebuild(self, members):
+        self.clear()
+        for member in members.values():
+            self.add(member)
+
+    @staticmethod
+    def _grams(member_id, name, phone):
+        text = f"{member_id}\x00{name}\x00{phone}"
+        grams = {text[i:i + 3] for i in range(len(text) - 2)}
+        grams.update(name)
+        grams.update(name[i:i + 2] for i in range(len(name) - 1))
+        return text, grams
+
+    def add(self, member):
+        text, grams = self._grams(member.id.lower(), member.name.lower(), member.phone.lower())
+        self.texts[member.id] = text
+        for gram in grams:
+            self.postings[gram].append(member.id)
+        self.entries += len(grams)
+        self.by_level[member.level].add(member.id)
+        self.rank.setdefault(member.id, len(self.rank))
+
+    def remove(self, member):
+        text = self.texts.pop(member.id, None)
+        if text is None:
+            return
+        self.stale += len(self._grams(*text.split("\x00"))[1])
+        self.by_level[member.level].discard(member.id)
+        if self.stale > self.entries - self.stale:
+            self._compact()
+
+    def _compact(self):
+        """清除倒排表中的残留条目"""
+        self.postings = defaultdict(list)
+        self.entries = self.stale = 0
+        for member_id, text in self.texts.items():
+            grams = self._grams(*text.split("\x00"))[1]
+            for gram in grams:
+                self.postings[gram].append(member_id)
+            self.entries += len(grams)
+
+    def search(self, keyword):
+        """返回匹配的会员ID（按加入顺序）"""
+        keyword = keyword.lower()
+        texts = self.texts
+        if len(keyword) >= 3:
+            lists = sorted((self.postings.get(keyword[i:i + 3], ()) for i in range(len(keyword) - 2)), key=len)
+            candidates = set(lists[0])
+            # 再用几个较短的倒排表缩小候选范围
+            for other in lists[1:4]:
+                if len(candidates) <= 64:
+                    break
+                candidates.intersection_update(other)
+        elif keyword.isascii():
+            candidates = texts
+        else:
+            candidates = self.postings.get(keyword, ())
+        result = {member_id for member_id in candidates
+                  if keyword in texts.get(member_id, "")}
+        for level, member_ids in self.by_level.items():
+            if keyword in level.lower():
+                result.update(member_ids)
+        return sorted(result, key=self.rank.__getitem__)
+
+class BirthdayIndex:
+    """生日日历索引：按 MM-DD 分桶保存状态正常的会员
+
+    查询未来 N 天的生日只需查看 N+1 个桶；2月29日生日在平年按2月28日提醒，
+    跨年由日期运算自然处理。查询结果按（日期, 天数）缓存，会员变更时清空。
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.buckets = defaultdict(set)   # MM-DD -> {会员ID}
+        self.month_days = {}              # 会员ID -> MM-DD
+        self.cache = {}
+
+    def rebuild(self, members):
+        self.clear()
+        for member in members.values():
+            self.add(member)
+
+    @staticmethod
+    def _month_day(birthday):
+        month_day = birthday_month_day(birthday)
+        if not month_day:
+            return ""
+        try:
+            date(2000, int(month_day[:2]), int(month_day[3:]))  # 2000 年为闰年，允许 02-29
+        except ValueError:
+            return ""
+        return month_day
+
+    def add(self, member):
+        if member.status != "正常":
+            return
+        month_day = self._month_day(member.birthday)
+        if month_day:
+            self.buckets[month_day].add(member.id)
+            self.month_days[member.id] = month_day
+            self.cache.clear()
+
+    def remove(self, member):
+        month_day = self.month_days.pop(member.id, None)
+        if month_day:
+            self.buckets[month_day].discard(member.id)
+            self.cache.clear()
+
+    def upcoming(self, today, days):
+        """返回未来 days 天内（含今天）过生日的 [(会员ID, 生日日期, 天数)]，按天数排序"""
+        key = (today, days)
+        if key in self.cache:
+            return self.cache[key]
+        result = []
+        for offset in range(min(days, 365) + 1):
+            day = today + timedelta(days=offset)
+            month_day = day.strftime("%m-%d")
+            member_ids = list(self.buckets.get(month_day, ()))
+            if month_day == "02-28" and not calendar.isleap(day.year):
+                member_ids.extend(self.buckets.get("02-29", ()))
+            for member_id in sorted(member_ids):
+                result.append((member_id, day, offset))
+        self.cache = {key: result}
+        return result
+
+class MemberStats:
+    """会员统计的累计值：人数、等级/状态分布、总余额、总积分、总消费
+
+    每个会员记下最近一次计入的数值，会员变化后 update() 先减去旧值再加上新值，
+    因此任何修改路径的更新都是 O(1)，统计时无需遍历会员。
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.entries = {}                 # 会员ID -> (等级, 状态, 余额, 积分, 累计消费)
+        self.levels = defaultdict(int)
+        self.statuses = defaultdict(int)
+        self.total_balance = 0
+        self.total_points = 0
+        self.total_spent = 0
+
+    def rebuild(self, members):
+        self.clear()
+        for member in members.values():
+            self.update(member)
+
+    def _apply(self, entry, sign):
+        level, status, balance, points, spent = entry
+        self.levels[level] += sign
+        self.statuses[status] += sign
+        self.total_balance += sign * balance
+        self.total_points += sign * points
+        self.total_spent += sign * spent
+
+    def update(self, member):
+        """计入会员当前的数值（已计入过的会员先扣除旧值）"""
+        entry = (member.level, member.status, member.balance, member.points, member.total_spent)
+        old = self.entries.get(member.id)
+        if old == entry:
+            return
+        if old:
+            self._apply(old, -1)
+        self.entries[member.id] = entry
+        self._apply(entry, 1)
+
+    def remove(self, member):
+        old = self.entries.pop(member.id, None)
+        if old:
+            self._apply(old, -1)
+
+    def move_level(self, member):
+        """只有等级变化时的 update()"""
+        old = self.entries.get(member.id)
+        if old is None or old[0] == member.level:
+            self.update(member)
+            return
+        self.levels[old[0]] -= 1
+        self.levels[member.level] += 1
+        self.entries[member.id] = (member.level,) + old[1:]
+
+    @staticmethod
+    def _nonzero(counts):
+        return {key: count for key, count in counts.items() if count}
+
+    def snapshot(self):
+        """返回 (总数, 等级分布, 状态分布, 总余额, 总积分)，金额和积分以 0.01 为单位"""
+        return (len(self.entries), self._nonzero(self.levels), self._nonzero(self.statuses),
+                self.total_balance, self.total_points)
+
+class LevelTable:
+    """编译后的等级门槛表：按累计消费（以 0.01 为单位）二分查找等级
+
+    rules 为 {等级: 门槛（元）}，低于所有门槛时为普通会员；门槛相同时取规则中靠前的等级。
+    """
+
+    DEFAULT_LEVEL = "普通会员"
+
+    def __init__(self, rules):
+        self.rules = dict(rules)
+        ordered = sorted(self.rules.items(), key=lambda x: x[1], reverse=True)[::-1]
+        self.thresholds = [int(round(threshold * 100)) for _, threshold in ordered]
+        self.levels = [sys.intern(level) for level, _ in ordered]
+
+    def lookup(self, total_spent):
+        i = bisect.bisect_right(self.thresholds, total_spent)
+        return self.levels[i - 1] if i else self.DEFAULT_LEVEL
+
+    def assign(self, members):
+        """返回与 members 顺序一致的新等级列表；有 NumPy 时一次计算全部会员"""
+        numpy = optional_numpy()
+        if numpy is None or not members:
+            lookup = self.lookup
+            return [lookup(member.total_spent) for member in members]
+        spent = numpy.fromiter((member.total_spent for member in members), dtype=numpy.int64, count=len(members))
+        positions = numpy.searchsorted(numpy.array(self.thresholds, dtype=numpy.int64), spent, side='right')
+        names = numpy.array([self.DEFAULT_LEVEL] + self.levels, dtype=object)
+        return names[positions].tolist()
+
+class MemberIdAllocator:
+    """会员ID分配器：VIP + 秒级时间戳（14位）+ 6位十六进制序号，按分配顺序单调递增
+
+    同一秒内序号依次加一，时钟回拨或序号用完时沿用/推进上一个时间戳，
+    因此一次可以分出一整段ID，不需要查重重试。observe() 记录已有的最大ID，
+    加载或导入的旧ID（同样格式）不会与新分配的ID重复。
+    """
+
+    SEQUENCE_LIMIT = 1 << 24
+
+    def __init__(self):
+        self.last = ""   # 已分配或已见过的最大ID
+        self.lock = threading.Lock()
+
+    def observe(self, member_id):
+        if member_id > self.last and MEMBER_ID_PATTERN.match(member_id):
+            with self.lock:
+                if member_id > self.last:
+                    self.last = member_id
+
+    def allocate(self, count=1):
+        """分配 count 个连续的ID"""
+        now = datetime.now().strftime("%Y%m%d%H%M%S")
+        ids = []
+        with self.lock:
+            if self.last and self.last[3:17] >= now:
+                stamp, sequence = self.last[3:17], int(self.last[17:], 16) + 1
+            else:
+                stamp, sequence = now, 0
+            while len(ids) < count:
+                if sequence >= self.SEQUENCE_LIMIT:
+                    stamp = (datetime.strptime(stamp, "%Y%m%d%H%M%S") + timedelta(seconds=1)).strftime("%Y%m%d%H%M%S")
+                    sequence = 0
+                end = min(self.SEQUENCE_LIMIT, sequence + count - len(ids))
+                prefix = "VIP" + stamp
+                ids.extend([f"{prefix}{value:06X}" for value in range(sequence, end)])
+                sequence = end
+            if ids:
+                self.last = ids[-1]
+        return ids
+
+# ------------------------------
+# 追加式操作日志（快照 + 日志）
+# ------------------------------
+class MemberJournal:
+    """追加式操作日志：每次操作只追加一行记录，定期合并进快照文件
+
+    记录格式（每行一个JSON）：
+    - {"seq": n, "op": "put", "id": 会员ID, "data": 会员资料（默认不含交易记录）}
+    - {"seq": n, "op": "txn", "id": 会员ID, "data": 交易记录}
+    - {"seq": n, "op": "clear_txns", "id": 会员ID}
+    - {"seq": n, "op": "delete", "id": 会员ID}
+    快照文件中的 journal_seq 表示已合并的最大序号，重放时跳过序号不大于它的记录。
+    交易记录现在写入 TransactionStore，txn / clear_txns 只出现在旧版本的日志中。
+    多台终端共用数据文件时，序号和 offset（已读到的位置）在跨进程锁内推进。
+    """
+
+    def __init__(self, data_path, seq=0):
+        self.path = self.journal_path(data_path)
+        self.seq = seq
+        self.count = 0  # 自上次快照以来的日志记录数
+        self.offset = 0  # 已重放或写入到的字节位置，之后的记录由其他终端写入
+
+    @staticmethod
+    def journal_path(data_path):
+        return os.path.splitext(data_path)[0] + ".journal"
+
+    def append(self, records):
+        if not records:
+            return
+        lines = []
+        seq = self.seq
+        for record in records:
+            seq += 1
+            record['seq'] = seq
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        with open(self.path, 'a+b') as f:
+            # 上次写入中断留下的残缺行单独成行，不影响新记录
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    data = b'\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+
+        self.seq = seq
+        self.count += len(records)
+
+    def replay(self, members, base_seq=0):
+        """将日志中序号大于 base_seq 的记录应用到 members，返回应用条数
+
+        末尾没有换行的残缺记录截断丢弃；中间无法解析的行移到“日志文件.bad”并从日志中删除，
+        其后的记录照常重放。
+        """
+        self.seq = max(self.seq, base_seq)
+        self.count = 0
+        if not os.path.exists(self.path):
+            return 0
+
+        applied = 0
+        good_offset = 0
+        kept = []       # 保留的行（有损坏行时用于重写日志）
+        bad_lines = []
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                try:
+                    record = json.loads(raw.decode('utf-8')) if raw.strip() else None
+                except (UnicodeDecodeError, ValueError):
+                    if not raw.endswith(b'\n'):
+                        # 末尾没有换行的残缺记录（写入中断），截断后丢弃
+                        break
+                    # 中间的损坏行移到 .bad 文件，继续重放后面的记录
+                    bad_lines.append(raw)
+                    continue
+                kept.append(raw)
+                good_offset += len(raw)
+                if record is None:
+                    continue
+                seq = record.get('seq', 0)
+                self.seq = max(self.seq, seq)
+                if seq <= base_seq:
+                    continue
+                self.apply(members, record)
+                applied += 1
+
+        if bad_lines:
+            with open(self.path + ".bad", 'ab') as f:
+                f.writelines(bad_lines)
+            # 不含损坏行的日志写入临时文件后替换，下次加载不会再次移出同样的行
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.writelines(kept)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        elif good_offset < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        self.count = applied
+        self.offset = good_offset
+        return applied
+
+    def read_new(self):
+        """读取 offset 之后其他终端追加的完整记录；日志被截短（已合并进快照）时返回 None"""
+        if not os.path.exists(self.path):
+            return [] if self.offset == 0 else None
+        if os.path.getsize(self.path) < self.offset:
+            return None
+        records = []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                self.offset += len(raw)
+                try:
+                    record = json.loads(raw.decode('utf-8'))
+                except (UnicodeDecodeError, ValueError):
+                    continue  # 空行或损坏行（重放时移到 .bad 文件）
+                self.seq = max(self.seq, record.get('seq', 0))
+                records.append(record)
+        self.count += len(records)
+        return records
+
+    @staticmethod
+    def apply(members, record):
+        op = record.get('op')
+        member_id = record.get('id')
+        if op == "put":
+            data = record['data']
+            member = Member.from_dict(data)
+            # 资料变更记录不含交易记录，沿用已有的交易记录
+            if 'transactions' not in data and member_id in members:
+                member.transactions = members[member_id].transactions
+            members[member_id] = member
+        elif op == "txn":
+            if member_id in members and members[member_id].transactions is not None:
+                members[member_id].transactions.append(Transaction.from_dict(record['data']))
+        elif op == "clear_txns":
+            if member_id in members:
+                members[member_id].transactions = []
+        elif op == "delete":
+            members.pop(member_id, None)
+
+    def reset(self):
+        """快照写入后清空日志（序号继续递增）"""
+        if os.path.exists(self.path):
+            with open(self.path, 'w', encoding='utf-8'):
+                pass
+        self.count = 0
+        self.offset = 0
+
+class ChangeSet:
+    """未保存的变更集：记录新增/变更/删除的会员以及新增和清空的交易记录
+
+    bases 保存会员第一次修改前的资料，写入时作为与其他终端的修改合并的共同基准。
+    """
+
+    def __init__(self):
+        self.added = set()       # 新建会员（资料连同交易记录整体写入）
+        self.members = set()     # 资料有变更的会员
+        self.transactions = defaultdict(list)  # 会员ID -> 新增交易记录
+        self.cleared = set()     # 交易记录被清空的会员
+        self.deleted = set()
+        self.bases = {}          # 会员ID -> 修改前的资料
+
+    def __len__(self):
+        return (len(self.added) + len(self.members) + len(self.cleared) + len(self.deleted) +
+                sum(len(t) for t in self.transactions.values()))
+
+    def add_member(self, member_id):
+        self.added.add(member_id)
+
+    def keep_base(self, member):
+        """在修改已保存的会员之前调用"""
+        if member.id not in self.added and member.id not in self.bases:
+            self.bases[member.id] = member.copy(transactions=False)
+
+    def mark_member(self, member_id):
+        if member_id not in self.added:
+            self.members.add(member_id)
+
+    def add_transaction(self, member_id, transaction):
+        if member_id not in self.added:
+            self.transactions[member_id].append(transaction)
+
+    def clear_transactions(self, member_id):
+        if member_id not in self.added:
+            self.transactions.pop(member_id, None)
+            self.cleared.add(member_id)
+
+    def delete_member(self, member_id):
+        was_added = member_id in self.added
+        self.added.discard(member_id)
+        self.members.discard(member_id)
+        self.cleared.discard(member_id)
+        self.transactions.pop(member_id, None)
+        self.bases.pop(member_id, None)
+        # 尚未保存过的新会员直接丢弃即可
+        if not was_added:
+            self.deleted.add(member_id)
+
+    def forget(self, member_id):
+        """放弃会员未保存的修改（被其他终端的修改取代）"""
+        self.members.discard(member_id)
+        self.cleared.discard(member_id)
+        self.transactions.pop(member_id, None)
+        self.bases.pop(member_id, None)
+
+    def dirty_member_ids(self):
+        return self.added | self.members
+
+    def touched_member_ids(self):
+        return self.added | self.members | self.cleared | self.deleted | set(self.transactions)
+
+    def to_records(self, members):
+        """转换为日志记录（删除 -> 新增 -> 清空 -> 资料变更 -> 新交易）
+
+        记录中的会员数据已转换为数据文件格式，可以交给后台线程写入而不受之后修改的影响。
+        """
+        records = [{'op': "delete", 'id': member_id} for member_id in self.deleted]
+        for member_id in self.added:
+            records.append({'op': "put", 'id': member_id, 'data': members[member_id].to_dict()})
+        for member_id in self.cleared:
+            records.append({'op': "clear_txns", 'id': member_id})
+        for member_id in self.members:
+            records.append({'op': "put", 'id': member_id, 'data': members[member_id].to_dict(transactions=False)})
+        for member_id, transactions in self.transactions.items():
+            records.extend({'op': "txn", 'id': member_id, 'data': t.to_dict()} for t in transactions)
+        return records
+
+    def clear(self):
+        self.__init__()
+
+MERGE_AMOUNT_FIELDS = ('balance', 'points', 'total_spent')
+MERGE_PROFILE_FIELDS = (('name', "姓名"), ('phone', "手机号"), ('birthday', "生日"), ('level', "等级"),
+                        ('status', "状态"), ('extra', "附加资料"))
+
+def merge_member(ours, base, theirs):
+    """把本机相对 base 的修改合并到其他终端写入的 theirs 上，返回 (合并结果, None) 或 (None, 冲突原因)
+
+    余额、积分和累计消费按增减量合并；资料字段只取本机改过的，双方改成不同的值时冲突。
+    """
+    merged = theirs.copy(transactions=False)
+    for field in MERGE_AMOUNT_FIELDS:
+        setattr(merged, field, getattr(theirs, field) + getattr(ours, field) - getattr(base, field))
+    if merged.balance < 0 or merged.points < 0:
+        return None, "合并其他终端的交易后余额或积分不足"
+    for field, label in MERGE_PROFILE_FIELDS:
+        value = getattr(ours, field)
+        if value != getattr(base, field):
+            if getattr(theirs, field) not in (getattr(base, field), value):
+                return None, f"{label}已被其他终端修改"
+            setattr(merged, field, value)
+    return merged, None
+
+# ------------------------------
+# 存储引擎（JSON快照+日志 / SQLite）
+# ------------------------------
+def birthday_month_day(birthday):
+    """生日 YYYY-MM-DD 取 MM-DD，格式不对时返回空串"""
+    if birthday and BIRTHDAY_PATTERN.match(birthday):
+        return birthday[5:10]
+    return ""
+
+class StreamingJsonReader:
+    """增量解析 {"members": {...}, ...} 结构的数据文件
+
+    按块读取并逐个解码会员对象，不把整个文件读成一个字符串，
+    峰值内存约为已解析的会员数据加一个读取块。其余顶层字段保存在 header 中。
+    """
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, path, chunk_size=1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = max(os.path.getsize(path), 1)
+        self.bytes_read = 0
+        self.header = {}
+        self._decoder = json.JSONDecoder()
+
+    def progress(self):
+        return min(self.bytes_read / self.size, 1.0)
+
+    def items(self, key="members"):
+        """逐个产出 key 对应对象中的 (键, 值)"""
+        with open(self.path, 'rb') as f:
+            self._file = f
+            self._utf8 = codecs.getincrementaldecoder('utf-8')()
+            self._buf = ""
+            self._pos = 0
+            self._eof = False
+
+            self._expect('{')
+            if self._peek() == '}':
+                return
+            while True:
+                name = self._value()
+                self._expect(':')
+                if name == key and self._peek() == '{':
+                    self._pos += 1
+                    if self._peek() == '}':
+                        self._pos += 1
+                    else:
+                        while True:
+                            item_key = self._value()
+                            self._expect(':')
+                            yield item_key, self._value()
+                            if self._separator('}'):
+                                break
+                else:
+                    self.header[name] = self._value()
+                if self._separator('}'):
+                    break
+
+    def _read_more(self):
+        data = self._file.read(self.chunk_size)
+        if not data:
+            self._eof = True
+            decoded = self._utf8.decode(b'', final=True)
+        else:
+            self.bytes_read += len(data)
+            decoded = self._utf8.decode(data)
+        self._buf = self._buf[self._pos:] + decoded
+        self._pos = 0
+
+    def _peek(self):
+        while True:
+            self._pos = self.WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or self._eof:
+                return self._buf[self._pos:self._pos + 1]
+            self._read_more()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"数据文件格式错误：位置 {self.bytes_read} 附近应为 '{char}'")
+        self._pos += 1
+
+    def _separator(self, close):
+        """读取 ',' 或结束符，遇到结束符时返回 True"""
+        char = self._peek()
+        self._pos += 1
+        if char == close:
+            return True
+        if char != ',':
+            raise ValueError(f"数据文件格式错误：位置 {self.bytes_read} 附近应为 ',' 或 '{close}'")
+        return False
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._read_more()
+                continue
+            # 数字等标量恰好在缓冲区末尾结束时可能被截断，读入更多再解析
+            if end == len(self._buf) and not self._eof:
+                self._read_more()
+                continue
+            self._pos = end
+            return value
+
+class TransactionStore:
+    """分段追加的交易记录存储（JSON存储引擎使用），按会员读取交易记录
+
+    交易记录按会员ID散列到 SEGMENTS 个 JSONL 分段文件，每行一条记录：
+    - {"id": 会员ID, "op": "txn", "data": 交易记录}
+    - {"id": 会员ID, "op": "clear_txns"}（之前的交易记录作废）
+    读取少数会员时只扫描对应分段，并先按行首的会员ID筛选再解析JSON。
+    含作废记录的分段在 write_all() 时重写。
+    """
+    SEGMENTS = 256
+    PREFIX_FILTER_LIMIT = 16   # 一个分段中要读取的会员不超过该数量时按行首筛选
+    ENCODE = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.dirty = set()   # 含作废记录的分段
+
+    @staticmethod
+    def store_path(data_path):
+        return os.path.splitext(data_path)[0] + ".txns"
+
+    def segment(self, member_id):
+        return zlib.crc32(member_id.encode('utf-8')) % self.SEGMENTS
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{segment:03d}.jsonl")
+
+    @classmethod
+    def _line(cls, member_id, op, data=None):
+        record = {'id': member_id, 'op': op}
+        if data is not None:
+            record['data'] = data
+        return cls.ENCODE(record)
+
+    def append(self, records):
+        """追加 txn / clear_txns 记录（与日志记录格式相同）"""
+        lines = defaultdict(list)
+        for record in records:
+            segment = self.segment(record['id'])
+            lines[segment].append(self._line(record['id'], record['op'], record.get('data')))
+            if record['op'] != "txn":
+                self.dirty.add(segment)
+        if not lines:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for segment, segment_lines in lines.items():
+            data = ('\n'.join(segment_lines) + '\n').encode('utf-8')
+            with open(self._segment_path(segment), 'a+b') as f:
+                # 上次写入中断留下的残缺行单独成行，不影响新记录
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        data = b'\n' + data
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _read(self, segment, member_ids=None):
+        """读取一个分段，返回 {会员ID: [交易记录]}；member_ids 为 None 时读取全部会员"""
+        path = self._segment_path(segment)
+        result = {}
+        if not os.path.exists(path):
+            return result
+        prefixes = wanted = None
+        if member_ids is not None:
+            if len(member_ids) <= self.PREFIX_FILTER_LIMIT:
+                prefixes = tuple(('{"id":' + self.ENCODE(mid) + ',').encode('utf-8')
+                                 for mid in member_ids)
+            else:
+                wanted = set(member_ids)
+        with open(path, 'rb') as f:
+            for raw in f:
+                if prefixes is not None and not raw.startswith(prefixes):
+                    continue
+                try:
+                    record = json.loads(raw.decode('utf-8'))
+                except (UnicodeDecodeError, ValueError):
+                    continue
+                member_id = record.get('id')
+                if wanted is not None and member_id not in wanted:
+                    continue
+                if record.get('op') == "txn":
+                    result.setdefault(member_id, []).append(Transaction.from_dict(record['data']))
+                else:
+                    result[member_id] = []
+        return result
+
+    def load(self, member_ids):
+        by_segment = defaultdict(list)
+        for member_id in member_ids:
+            by_segment[self.segment(member_id)].append(member_id)
+        result = {}
+        for segment, segment_ids in by_segment.items():
+            result.update(self._read(segment, segment_ids))
+        return result
+
+    def write_all(self, members):
+        """与完整会员数据同步：交易记录在内存中的会员整体替换，其余会员沿用已有记录，
+        不在 members 中的会员的记录删除；只重写受影响的分段"""
+        replace = defaultdict(dict)
+        for member_id, member in members.items():
+            if member.transactions is not None:
+                replace[self.segment(member_id)][member_id] = member.transactions
+        full = sum(len(r) for r in replace.values()) == len(members)
+        segments = range(self.SEGMENTS) if full else set(replace) | self.dirty
+        os.makedirs(self.directory, exist_ok=True)
+        for segment in segments:
+            kept = {} if full else self._read(segment)
+            kept.update(replace.get(segment, {}))
+            lines = []
+            for member_id, transactions in kept.items():
+                if member_id in members and transactions:
+                    head = '{"id":' + self.ENCODE(member_id) + ',"op":"txn","data":'
+                    lines.extend(head + self.ENCODE(t.to_dict()) + '}' for t in transactions)
+            path = self._segment_path(segment)
+            if not lines:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            temp_path = path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        self.dirty.clear()
+
+class FileLock:
+    """跨进程独占锁：锁文件与数据文件放在一起，共享同一数据文件的多台终端依次写入"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        f = open(self.path, 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK 重试约10秒仍未取得时抛出，继续等待
+                        continue
+        except BaseException:
+            f.close()
+            raise
+        self.file = f
+        return self
+
+    def __exit__(self, *exc_info):
+        f, self.file = self.file, None
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            f.close()
+
+class Storage:
+    """存储引擎基类：stream() 在工作线程中逐批读取会员，finish_load() 在界面线程收尾
+
+    会员的交易记录不随 stream() 读取，由 load_transactions() 按需读取。
+    多台终端（进程）可以共用同一数据文件：commit() / rewrite() / compact() / sync() 在跨进程锁内
+    先读入其他终端写入的变更（read_changes()），再写入本机的变更，返回的同步结果为字典：
+    {"members": {会员ID: 磁盘上的会员 或 None（已删除）}, "versions": {会员ID: 写入的版本号},
+     "conflicts": [(会员ID, 原因)], "duplicates": [与其他终端新增的会员ID重复的新会员ID]}。
+    versions 为已知的磁盘上各会员的版本号（None 表示尚未从该文件读取或写入过，此时本机数据
+    整体覆盖文件），加载后只在写入任务（后台线程）中读写。
+    level_rules 为数据文件中保存的等级规则（stream() 读取，写入完整数据时保存），旧文件中没有时为 None。
+    """
+    LOAD_BATCH = 1000
+    level_rules = None
+
+    def load(self):
+        """同步读取全部会员，返回 (members, 重放条数)"""
+        members = {}
+        for batch, _ in self.stream():
+            members.update(batch)
+        return members, self.finish_load(members)
+
+    def finish_load(self, members):
+        self.track(members)
+        return 0
+
+    def track(self, members):
+        self.versions = {member_id: member.version for member_id, member in members.items()}
+
+    def lock(self):
+        return FileLock(self.path + ".lock")
+
+    def read_changes(self):
+        """读入其他终端写入的变更 {会员ID: 会员 或 None}（在锁内调用）"""
+        raise NotImplementedError
+
+    def remote_changes(self):
+        if self.versions is None:
+            self.versions = {}
+            return {}
+        return self.read_changes()
+
+    def reload_changes(self):
+        """重新读取全部会员，按版本号找出变化的会员"""
+        known = self.versions
+        members, _ = self.load()
+        changes = {member_id: member for member_id, member in members.items()
+                   if known.get(member_id) != member.version}
+        changes.update((member_id, None) for member_id in known if member_id not in members)
+        return changes
+
+    @staticmethod
+    def sync_result(members, versions=None, conflicts=None, duplicates=None):
+        return {"members": members, "versions": versions or {}, "conflicts": conflicts or [],
+                "duplicates": duplicates or []}
+
+    def sync(self):
+        """只读取其他终端的变更"""
+        with self.lock():
+            return self.sync_result(self.remote_changes())
+
+    def commit(self, records, bases):
+        """合并其他终端的变更后追加 records
+
+        bases 为 {会员ID: 修改前的资料}，新会员对应 None。其他终端同时修改了同一会员时，
+        本机的修改按 merge_member() 合并到对方的结果上；无法合并时放弃本机对该会员的修改。
+        """
+        with self.lock():
+            remote = self.remote_changes()
+            phones = {theirs.phone: member_id for member_id, theirs in remote.items()
+                      if theirs is not None and theirs.status != "已注销"}
+            merged = {}
+            reverted = {}   # 因手机号重复放弃写入的会员：恢复为修改前的资料，新会员为 None
+            versions = {}
+            conflicts = []
+            duplicates = []
+            dropped = set()
+            for record in records:
+                member_id = record['id']
+                if record['op'] != "put":
+                    continue
+                if member_id in bases and bases[member_id] is None:
+                    if member_id in self.versions:
+                        duplicates.append(member_id)
+                        dropped.add(member_id)
+                        continue
+                elif member_id in remote:
+                    theirs = remote[member_id]
+                    if theirs is None:
+                        conflicts.append((member_id, "会员已被其他终端删除"))
+                        dropped.add(member_id)
+                        continue
+                    base = bases.get(member_id) or theirs
+                    member, reason = merge_member(Member.from_dict(record['data']), base, theirs)
+                    if member is None:
+                        conflicts.append((member_id, reason))
+                        dropped.add(member_id)
+                        continue
+                    record['data'] = member.to_dict()
+                    merged[member_id] = member
+                data = record['data']
+                owner = phones.get(data.get('phone'))
+                if owner is not None and owner != member_id and data.get('status') != "已注销":
+                    # 其他终端同时新增或改用了同一手机号，先写入的一方保留
+                    conflicts.append((member_id, f"手机号 {data['phone']} 已被其他终端的会员使用"))
+                    dropped.add(member_id)
+                    merged.pop(member_id, None)
+                    if member_id not in remote:
+                        base = bases.get(member_id)
+                        reverted[member_id] = base.copy(transactions=False) if base is not None else None
+                    continue
+                versions[member_id] = self.versions.get(member_id, 0) + 1
+                record['data']['version'] = versions[member_id]
+                if member_id in merged:
+                    merged[member_id].version = versions[member_id]
+            self.append([record for record in records if record['id'] not in dropped])
+            self.versions.update(versions)
+            for record in records:
+                if record['op'] == "delete":
+                    self.versions.pop(record['id'], None)
+        return self.sync_result({**remote, **merged, **reverted}, versions, conflicts, duplicates)
+
+    def rewrite(self, members, touched, level_rules=None):
+        """用本机数据整体重写（新文件、恢复、写入失败后等）：只有本机修改过的会员（touched）
+        覆盖其他终端的结果，其余会员沿用其他终端写入的最新资料；level_rules 不为空时一并保存"""
+        if level_rules is not None:
+            self.level_rules = level_rules
+        with self.lock():
+            remote = self.remote_changes()
+            for member_id, theirs in remote.items():
+                if member_id in touched:
+                    continue
+                if theirs is None:
+                    members.pop(member_id, None)
+                else:
+                    members[member_id] = theirs
+            versions = {}
+            for member_id in touched:
+                if member_id in members:
+                    versions[member_id] = members[member_id].version = self.versions.get(member_id, 0) + 1
+            self.write_all(members)
+        return self.sync_result({k: v for k, v in remote.items() if k not in touched}, versions)
+
+    def compact(self):
+        """按数据文件中的内容（含其他终端的变更）重写，不使用内存中的数据"""
+        with self.lock():
+            remote = self.remote_changes()
+            members, _ = self.load()
+            self.write_all(members)
+        return self.sync_result(remote)
+
+    def load_transactions(self, member_ids):
+        """读取会员的交易记录，返回 {会员ID: [交易记录]}，没有记录的会员可能不出现"""
+        raise NotImplementedError
+
+    def with_transactions(self, members):
+        """会员副本，交易记录只在本存储中的会员补上完整交易记录（导出、迁移、备份使用）"""
+        missing = [member_id for member_id, m in members.items() if m.transactions is None]
+        histories = self.load_transactions(missing) if missing else {}
+        result = {}
+        for member_id, member in members.items():
+            member = member.copy()
+            if member.transactions is None:
+                member.transactions = histories.get(member_id, [])
+            result[member_id] = member
+        return result
+
+class JsonStorage(Storage):
+    """JSON快照 + 追加日志存储（默认引擎），交易记录保存在单独的 TransactionStore 中"""
+    engine = "json"
+
+    def __init__(self, path, compact_threshold=1000, seq=0):
+        self.path = path
+        self.compact_threshold = compact_threshold
+        self.journal = MemberJournal(path, seq)
+        self.history = TransactionStore(TransactionStore.store_path(path))
+        self._base_seq = 0
+        self.versions = None
+        self.stamp = None   # 已读取的快照文件 (修改时间, 大小, inode)，变化说明其他终端合并过快照
+
+    @property
+    def seq(self):
+        return self.journal.seq
+
+    def exists(self):
+        return os.path.exists(self.path) or os.path.exists(self.journal.path)
+
+    def stream(self):
+        """逐批产出快照中的会员 ([(会员ID, 会员)], 进度)"""
+        self._base_seq = 0
+        self.stamp = self.snapshot_stamp()
+        if not os.path.exists(self.path):
+            return
+        reader = StreamingJsonReader(self.path)
+        batch = []
+        for member_id, data in reader.items('members'):
+            batch.append((member_id, Member.from_dict(data)))
+            if len(batch) >= self.LOAD_BATCH:
+                yield batch, reader.progress()
+                batch = []
+        if batch:
+            yield batch, 1.0
+        self._base_seq = reader.header.get('journal_seq', 0)
+        self.level_rules = reader.header.get('level_rules')
+
+    def finish_load(self, members):
+        """重放快照之后的日志，返回重放条数"""
+        replayed = self.journal.replay(members, self._base_seq)
+        self.track(members)
+        return replayed
+
+    def snapshot_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def read_changes(self):
+        """快照未变时只读取日志中新追加的记录，否则重新读取全部数据"""
+        records = self.journal.read_new() if self.snapshot_stamp() == self.stamp else None
+        if records is None:
+            return self.reload_changes()
+        changes = {}
+        for record in records:
+            member_id = record.get('id')
+            if record.get('op') == "put":
+                member = Member.from_dict(record['data'])
+                member.transactions = None
+                changes[member_id] = member
+                self.versions[member_id] = member.version
+            elif record.get('op') == "delete":
+                changes[member_id] = None
+                self.versions.pop(member_id, None)
+        return changes
+
+    def append(self, records):
+        """会员资料记录追加到日志，交易记录追加到交易记录存储（先写交易记录）"""
+        journal_records = []
+        history_records = []
+        for record in records:
+            op = record['op']
+            if op in ("txn", "clear_txns"):
+                history_records.append(record)
+            elif op == "put" and 'transactions' in record['data']:
+                data = dict(record['data'])
+                history_records.append({'op': "clear_txns", 'id': record['id']})
+                history_records.extend({'op': "txn", 'id': record['id'], 'data': t} for t in data.pop('transactions'))
+                journal_records.append({'op': "put", 'id': record['id'], 'data': data})
+            else:
+                if op == "delete":
+                    history_records.append({'op': "clear_txns", 'id': record['id']})
+                journal_records.append(record)
+        self.history.append(history_records)
+        self.journal.append(journal_records)
+
+    def load_transactions(self, member_ids):
+        return self.history.load(member_ids)
+
+    def needs_compaction(self, pending=0):
+        """日志记录数（加上即将追加的 pending 条）达到阈值时需要合并快照"""
+        return self.journal.count + pending >= self.compact_threshold
+
+    def write_all(self, members):
+        """写入完整快照并清空日志（快照合并），交易记录只重写有变化的分段"""
+        self.history.write_all(members)
+        data = {
+            'members': {member_id: member.to_dict(transactions=False) for member_id, member in members.items()},
+            'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'version': "1.17.95",
+            'journal_seq': self.journal.seq
+        }
+        if self.level_rules is not None:
+            data['level_rules'] = self.level_rules
+
+        # 先写临时文件再替换，避免写入中断导致快照损坏
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.journal.reset()
+        self.stamp = self.snapshot_stamp()
+        self.track(members)
+
+    def close(self):
+        pass
+
+class SQLiteStorage(Storage):
+    """SQLite存储引擎（WAL模式）
+
+    金额和积分与 Member 相同，以 0.01 为单位的整数存储。会员在加载时全部读入内存，手机号、等级、
+    状态和生日的查询都使用内存索引，members 表只按主键读写，因此不为这些列建索引（旧库中的索引
+    和生日月日列 birthday_md 会删除）。
+    """
+    engine = "sqlite"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS members (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            birthday TEXT NOT NULL DEFAULT '',
+            level TEXT NOT NULL,
+            status TEXT NOT NULL,
+            balance INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            total_spent INTEGER NOT NULL DEFAULT 0,
+            created_time TEXT NOT NULL DEFAULT '',
+            extra TEXT,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_id TEXT NOT NULL,
+            time TEXT NOT NULL DEFAULT '',
+            action TEXT NOT NULL DEFAULT '',
+            amount INTEGER NOT NULL DEFAULT 0,
+            points_change INTEGER NOT NULL DEFAULT 0,
+            balance_after INTEGER NOT NULL DEFAULT 0,
+            extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        DROP INDEX IF EXISTS idx_members_phone;
+        DROP INDEX IF EXISTS idx_members_status;
+        DROP INDEX IF EXISTS idx_members_level;
+        DROP INDEX IF EXISTS idx_members_birthday;
+        CREATE INDEX IF NOT EXISTS idx_transactions_member ON transactions(member_id, seq);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._exists = os.path.exists(path)
+        # 写入在后台保存线程中执行，查询只在没有待写入任务时由界面线程执行
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        # 旧版本建立的数据库没有 version 列，但有不再使用的 birthday_md 列
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(members)")]
+        if "version" not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE members ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "birthday_md" in columns:
+            try:
+                with self.conn:
+                    self.conn.execute("ALTER TABLE members DROP COLUMN birthday_md")
+            except sqlite3.OperationalError:
+                pass  # SQLite 3.35 之前不支持删除列，该列有默认值，保留也不影响写入
+        self.seq = self.disk_seq()
+        self.versions = None
+
+    def disk_seq(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()
+        return int(row[0]) if row else 0
+
+    def read_changes(self):
+        """数据库的写入序号与本机记录的相同时没有其他终端的写入，否则重新读取全部会员"""
+        seq = self.disk_seq()
+        if seq == self.seq:
+            return {}
+        changes = self.reload_changes()
+        self.seq = seq
+        return changes
+
+    def exists(self):
+        return self._exists
+
+    def stream(self):
+        """逐批读取会员（工作线程使用独立连接），交易记录按需读取"""
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'level_rules'").fetchone()
+            self.level_rules = json.loads(row[0]) if row else None
+            total = max(conn.execute("SELECT COUNT(*) FROM members").fetchone()[0], 1)
+            cursor = conn.execute(
+                "SELECT id, name, phone, birthday, level, status, balance, points, "
+                "total_spent, created_time, extra, version FROM members")
+            done = 0
+            while True:
+                rows = cursor.fetchmany(self.LOAD_BATCH)
+                if not rows:
+                    break
+                done += len(rows)
+                yield [(row[0], self._row_to_member(row)) for row in rows], done / total
+        finally:
+            conn.close()
+
+    def load_transactions(self, member_ids):
+        member_ids = list(member_ids)
+        result = {}
+        # 每批不超过500个ID，兼容旧版SQLite的参数个数限制
+        for i in range(0, len(member_ids), 500):
+            batch = member_ids[i:i + 500]
+            placeholders = ", ".join("?" * len(batch))
+            for member_id, *values in self.conn.execute(
+                    "SELECT member_id, time, action, amount, points_change, balance_after, extra "
+                    f"FROM transactions WHERE member_id IN ({placeholders}) ORDER BY seq", batch):
+                result.setdefault(member_id, []).append(self._row_to_transaction(values))
+        return result
+
+    def _row_to_member(self, row):
+        member_id, name, phone, birthday, level, status, balance, points, total_spent, created_time, extra, version = row
+        return Member(member_id, name, phone, birthday, level, balance, points, total_spent, status,
+                      created_time, extra=json.loads(extra) if extra else None, version=version)
+
+    def _row_to_transaction(self, values):
+        time_, action, amount, points_change, balance_after, extra = values
+        return Transaction(time_, action, amount, points_change, balance_after,
+                           json.loads(extra) if extra else None)
+
+    def _member_row(self, member):
+        return (member.id, member.name, member.phone, member.birthday, member.level, member.status,
+                member.balance, member.points, member.total_spent, member.created_time,
+                json.dumps(member.extra, ensure_ascii=False) if member.extra else None, member.version)
+
+    def _transaction_row(self, member_id, trans):
+        return (member_id, trans.time, trans.action, trans.amount, trans.points_change, trans.balance_after,
+                json.dumps(trans.extra, ensure_ascii=False) if trans.extra else None)
+
+    def _put_member(self, member):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO members (id, name, phone, birthday, level, status, "
+            "balance, points, total_spent, created_time, extra, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            self._member_row(member))
+
+    def _insert_transactions(self, member_id, transactions):
+        self.conn.executemany(
+            "INSERT INTO transactions (member_id, time, action, amount, points_change, balance_after, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [self._transaction_row(member_id, t) for t in transactions])
+
+    def append(self, records):
+        """在一个事务中应用变更记录（与日志记录格式相同）"""
+        if not records:
+            return
+        with self.conn:
+            for record in records:
+                op = record['op']
+                member_id = record['id']
+                if op == "put":
+                    member = Member.from_dict(record['data'])
+                    self._put_member(member)
+                    if 'transactions' in record['data']:
+                        self.conn.execute("DELETE FROM transactions WHERE member_id = ?", (member_id,))
+                        self._insert_transactions(member_id, member.transactions)
+                elif op == "txn":
+                    self._insert_transactions(member_id, [Transaction.from_dict(record['data'])])
+                elif op == "clear_txns":
+                    self.conn.execute("DELETE FROM transactions WHERE member_id = ?", (member_id,))
+                elif op == "delete":
+                    self.conn.execute("DELETE FROM members WHERE id = ?", (member_id,))
+                    self.conn.execute("DELETE FROM transactions WHERE member_id = ?", (member_id,))
+            self.seq += 1
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seq', ?)", (str(self.seq),))
+
+    def needs_compaction(self, pending=0):
+        return False
+
+    def write_all(self, members):
+        """整体重写会员表；交易记录在内存中的会员替换其交易记录，其余会员沿用表中已有记录"""
+        with self.conn:
+            self.conn.execute("DELETE FROM members")
+            self.conn.executemany(
+                "INSERT INTO members (id, name, phone, birthday, level, status, "
+                "balance, points, total_spent, created_time, extra, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._member_row(m) for m in members.values()])
+            full = all(m.transactions is not None for m in members.values())
+            if full:
+                self.conn.execute("DELETE FROM transactions")
+            else:
+                self.conn.execute("DELETE FROM transactions WHERE member_id NOT IN (SELECT id FROM members)")
+            for member_id, member in members.items():
+                if member.transactions is not None:
+                    if not full:
+                        self.conn.execute("DELETE FROM transactions WHERE member_id = ?", (member_id,))
+                    self._insert_transactions(member_id, member.transactions)
+            if self.level_rules is not None:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('level_rules', ?)",
+                                  (json.dumps(self.level_rules, ensure_ascii=False),))
+            self.seq += 1
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seq', ?)", (str(self.seq),))
+        self._exists = True
+        self.track(members)
+
+    def close(self):
+        self.conn.close()
+
+def open_storage(path, compact_threshold=1000, seq=0):
+    """按扩展名选择存储引擎：.db 使用SQLite，其余为JSON"""
+    if os.path.splitext(path)[1].lower() == ".db":
+        return SQLiteStorage(path)
+    return JsonStorage(path, compact_threshold, seq)
+
+# ------------------------------
+# 增量备份（内容寻址 + 分层保留）
+# ------------------------------
+class BackupManager:
+    """内容寻址的增量备份：会员资料和交易记录分块压缩存储，相同内容只保存一份
+
+    每次备份写一个清单：全量清单（base）记录所有会员的对象哈希，
+    增量清单（delta）只记录相对其全量清单的累积变化，因此任意保留的增量
+    只依赖一个全量清单。清单按最近/每小时/每天/每周分层保留，
+    不再被引用的对象在清理时删除。
+    一次备份新产生的对象合并写成一个包文件（objects/packs/时间.pack + .idx 索引），
+    不再每个对象写一个文件；旧版本散放在 objects/xx/ 下的对象仍可读取。
+    """
+    TRANSACTION_CHUNK = 256   # 每个交易记录分块的条数，追加交易只会改变最后一块
+    REBASE_RATIO = 0.3        # 累积变化超过全量的该比例时重新生成全量清单
+    GC_INTERVAL = 50          # 删除这么多个增量清单后清理一次无引用对象
+
+    def __init__(self, backup_dir, retention=None):
+        self.objects_dir = os.path.join(backup_dir, "objects")
+        self.packs_dir = os.path.join(self.objects_dir, "packs")
+        self.manifests_dir = os.path.join(backup_dir, "manifests")
+        os.makedirs(self.packs_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        self.retention = retention or {"recent": 10, "hourly": 24, "daily": 30, "weekly": 12}
+
+        self.entries = None       # 当前数据各会员的条目缓存（None 表示需要全量计算）
+        self.changed = set()      # 上次备份后变更过的会员
+        self.pruned_since_gc = 0
+        self.index = None         # 对象哈希 -> (包名, 偏移, 长度)，散放的对象为 None；首次使用时读取
+        self.pending = {}         # 本次备份新产生、尚未写入包文件的对象 {哈希: 压缩数据}
+
+        # 增量基准在第一次备份时（后台线程中）从最新清单恢复，见 load_baseline()
+        self.baseline_loaded = False
+        self.base_name = None
+        self.base_entries = None
+        self.last_entries = None
+
+    def load_baseline(self):
+        """读取最新清单及其全量清单作为增量基准（只读取一次）"""
+        if self.baseline_loaded:
+            return
+        self.baseline_loaded = True
+        manifests = self.list_manifests()
+        if manifests:
+            try:
+                latest = self.read_manifest(manifests[0])
+                self.base_name = manifests[0] if latest['type'] == "base" else latest['base']
+                self.base_entries = self.read_manifest(self.base_name)['members']
+                self.last_entries = self.resolve_entries(manifests[0], latest)
+            except Exception:
+                self.base_name = None
+                self.base_entries = None
+                self.last_entries = None
+
+    # 对象存储
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def load_index(self):
+        """读取全部包索引和散放的对象文件名"""
+        if self.index is not None:
+            return
+        index = {}
+        for dir_name in os.listdir(self.objects_dir):
+            dir_path = os.path.join(self.objects_dir, dir_name)
+            if dir_path == self.packs_dir:
+                continue
+            for digest in os.listdir(dir_path):
+                if not digest.endswith(".tmp"):
+                    index[digest] = None
+        for name in os.listdir(self.packs_dir):
+            if name.endswith(".idx"):
+                pack = name[:-len(".idx")]
+                with open(os.path.join(self.packs_dir, name), 'rb') as f:
+                    offsets = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+                for digest, (offset, length) in offsets.items():
+                    index[digest] = (pack, offset, length)
+        self.index = index
+
+    def put_object(self, payload):
+        """登记对象，返回哈希；新对象先留在内存中，由 write_pack() 一次写入"""
+        data = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        self.load_index()
+        if digest not in self.index and digest not in self.pending:
+            self.pending[digest] = zlib.compress(data)
+        return digest
+
+    def write_pack(self, objects):
+        """把 {哈希: 压缩数据} 写成一个包文件，再写包索引（有索引的包才会被读取）"""
+        if not objects:
+            return
+        name = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        while os.path.exists(os.path.join(self.packs_dir, name + ".idx")):
+            name += "_"
+        offsets = {}
+        offset = 0
+        for digest, data in objects.items():
+            offsets[digest] = (offset, len(data))
+            offset += len(data)
+        self._write_atomic(os.path.join(self.packs_dir, name + ".pack"), b''.join(objects.values()))
+        self._write_atomic(os.path.join(self.packs_dir, name + ".idx"),
+                           zlib.compress(json.dumps(offsets, separators=(',', ':')).encode('utf-8')))
+        for digest, (offset, length) in offsets.items():
+            self.index[digest] = (name, offset, length)
+
+    def _read_object(self, digest):
+        """对象的压缩数据"""
+        self.load_index()
+        location = self.index.get(digest)
+        if location is None:
+            with open(self._object_path(digest), 'rb') as f:
+                return f.read()
+        pack, offset, length = location
+        with open(os.path.join(self.packs_dir, pack + ".pack"), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def get_object(self, digest):
+        return json.loads(zlib.decompress(self._read_object(digest)).decode('utf-8'))
+
+    @staticmethod
+    def _write_atomic(path, data):
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def member_entry(self, member):
+        """会员条目：[资料对象哈希, [交易分块哈希...]]"""
+        summary = member.to_dict(transactions=False)
+        transactions = [t.to_dict() for t in member.transactions]
+        chunks = [self.put_object(transactions[i:i + self.TRANSACTION_CHUNK])
+                  for i in range(0, len(transactions), self.TRANSACTION_CHUNK)]
+        return [self.put_object(summary), chunks]
+
+    # 清单
+    def list_manifests(self):
+        """所有清单名（新的在前）"""
+        return sorted((name for name in os.listdir(self.manifests_dir) if name.endswith(".json.z")), reverse=True)
+
+    @staticmethod
+    def manifest_time(name):
+        return datetime.strptime(name[:22], "%Y%m%d_%H%M%S_%f")
+
+    @staticmethod
+    def manifest_base(name):
+        """增量清单所依赖的全量清单名（全量清单返回自身）"""
+        if "_delta_" in name:
+            return name.split("_delta_", 1)[1]
+        return name
+
+    def read_manifest(self, name):
+        with open(os.path.join(self.manifests_dir, name), 'rb') as f:
+            return json.loads(zlib.decompress(f.read()).decode('utf-8'))
+
+    def write_manifest(self, name, manifest):
+        data = json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self._write_atomic(os.path.join(self.manifests_dir, name), zlib.compress(data))
+
+    def resolve_entries(self, name, manifest=None):
+        manifest = manifest or self.read_manifest(name)
+        if manifest['type'] == "base":
+            return manifest['members']
+        entries = dict(self.read_manifest(manifest['base'])['members'])
+        entries.update(manifest['changed'])
+        for member_id in manifest['deleted']:
+            entries.pop(member_id, None)
+        return entries
+
+    # 备份
+    def mark_changed(self, member_ids):
+        self.changed.update(member_ids)
+
+    def invalidate(self):
+        """会员数据整体替换后，下次备份重新计算全部条目"""
+        self.entries = None
+        self.changed.clear()
+
+    def snapshot(self, members):
+        """复制下次备份要读取的会员，返回 (会员副本, 变更的会员ID)，供后台线程调用 create()
+
+        已有条目缓存时只复制变更过的会员，否则复制全部会员。
+        """
+        changed, self.changed = self.changed, set()
+        member_ids = members.keys() if self.entries is None else changed
+        return {mid: members[mid].copy() for mid in member_ids if mid in members}, changed
+
+    def create(self, members, changed=None):
+        """创建一次备份，数据与上次备份相同时跳过并返回 None"""
+        self.load_baseline()
+        if changed is None:
+            changed, self.changed = self.changed, set()
+        if self.entries is None:
+            entries = {member_id: self.member_entry(m) for member_id, m in members.items()}
+        else:
+            entries = self.entries
+            for member_id in changed:
+                if member_id in members:
+                    entries[member_id] = self.member_entry(members[member_id])
+                else:
+                    entries.pop(member_id, None)
+        # 先写对象再写清单，清单引用的对象都已在磁盘上
+        objects, self.pending = self.pending, {}
+        self.write_pack(objects)
+        self.entries = entries
+        if entries == self.last_entries:
+            return None
+
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        changed = deleted = None
+        if self.base_entries is not None:
+            changed = {mid: e for mid, e in entries.items() if self.base_entries.get(mid) != e}
+            deleted = [mid for mid in self.base_entries if mid not in entries]
+
+        if changed is None or len(changed) + len(deleted) > self.REBASE_RATIO * max(len(self.base_entries), 1):
+            name = f"{stamp}_base.json.z"
+            self.write_manifest(name, {'type': "base", 'time': created, 'members': entries})
+            self.base_name = name
+            self.base_entries = dict(entries)
+        else:
+            name = f"{stamp}_delta_{self.base_name}"
+            self.write_manifest(name, {'type': "delta", 'time': created, 'base': self.base_name,
+                                       'changed': changed, 'deleted': deleted})
+
+        self.last_entries = dict(entries)
+        self.prune()
+        return name
+
+    def prune(self):
+        """分层保留：最近N个，以及每小时/每天/每周各保留最新的一个"""
+        self.load_baseline()
+        manifests = self.list_manifests()
+        keep = set()
+        for tier, key_format in (("recent", None), ("hourly", "%Y%m%d%H"), ("daily", "%Y%m%d"), ("weekly", "%G%V")):
+            buckets = set()
+            for name in manifests:
+                key = name if key_format is None else self.manifest_time(name).strftime(key_format)
+                if key in buckets:
+                    continue
+                if len(buckets) >= self.retention.get(tier, 0):
+                    break
+                buckets.add(key)
+                keep.add(name)
+
+        # 保留的增量依赖的全量清单，以及当前基准
+        keep.update(self.manifest_base(name) for name in list(keep))
+        if self.base_name:
+            keep.add(self.base_name)
+
+        removed_base = False
+        for name in manifests:
+            if name not in keep:
+                os.remove(os.path.join(self.manifests_dir, name))
+                removed_base = removed_base or "_delta_" not in name
+                self.pruned_since_gc += 1
+
+        if removed_base or self.pruned_since_gc >= self.GC_INTERVAL:
+            self.collect_garbage()
+
+    def collect_garbage(self):
+        referenced = set()
+        for name in self.list_manifests():
+            manifest = self.read_manifest(name)
+            entries = manifest['members'] if manifest['type'] == "base" else manifest['changed']
+            for summary_hash, chunks in entries.values():
+                referenced.add(summary_hash)
+                referenced.update(chunks)
+
+        self.load_index()
+        for dir_name in os.listdir(self.objects_dir):
+            dir_path = os.path.join(self.objects_dir, dir_name)
+            if dir_path == self.packs_dir:
+                continue
+            for digest in os.listdir(dir_path):
+                if digest not in referenced:
+                    os.remove(os.path.join(dir_path, digest))
+                    self.index.pop(digest, None)
+
+        # 包中还有被引用的对象时只把这些对象重新打包，全部无引用时直接删除
+        packs = defaultdict(list)
+        for digest, location in self.index.items():
+            if location is not None:
+                packs[location[0]].append(digest)
+        for pack, digests in packs.items():
+            live = [digest for digest in digests if digest in referenced]
+            if len(live) == len(digests):
+                continue
+            self.write_pack({digest: self._read_object(digest) for digest in live})
+            for digest in digests:
+                if digest not in referenced:
+                    del self.index[digest]
+            os.remove(os.path.join(self.packs_dir, pack + ".idx"))
+            os.remove(os.path.join(self.packs_dir, pack + ".pack"))
+        # 写入中断留下的没有索引的包和临时文件
+        for name in os.listdir(self.packs_dir):
+            if not name.endswith(".idx") and not os.path.exists(
+                    os.path.join(self.packs_dir, name.rsplit(".", 1)[0] + ".idx")):
+                os.remove(os.path.join(self.packs_dir, name))
+        self.pruned_since_gc = 0
+
+    def restore(self, name):
+        """按清单重建会员数据（含交易记录）"""
+        members = {}
+        for member_id, (summary_hash, chunks) in self.resolve_entries(name).items():
+            member = self.get_object(summary_hash)
+            member['transactions'] = [t for chunk in chunks for t in self.get_object(chunk)]
+            members[member_id] = Member.from_dict(member)
+        return members
+
+def backup_cli(argv):
+    """命令行备份工具：--list-backups 列出可恢复的时间点；--restore 名称 --output 文件 恢复为JSON数据文件"""
+    import argparse
+    parser = argparse.ArgumentParser(description="会员管理系统备份工具")
+    parser.add_argument("--list-backups", action="store_true", help="列出可恢复的备份时间点")
+    parser.add_argument("--restore", metavar="名称", help="要恢复的备份（清单名或其时间前缀）")
+    parser.add_argument("--output", metavar="文件", help="恢复输出的JSON数据文件")
+    parser.add_argument("--backup-dir", default=os.path.join(os.path.expanduser("~"), "会员系统数据", "备份"))
+    args = parser.parse_args(argv)
+
+    manager = BackupManager(args.backup_dir)
+    manifests = manager.list_manifests()
+    if args.list_backups:
+        for name in manifests:
+            kind = "全量" if "_delta_" not in name else "增量"
+            print(f"{manager.manifest_time(name).strftime('%Y-%m-%d %H:%M:%S')}  {kind}  {name}")
+        return 0
+
+    if not args.restore or not args.output:
+        parser.error("恢复需要同时指定 --restore 和 --output")
+    matches = [name for name in manifests if name.startswith(args.restore)]
+    if not matches:
+        print(f"未找到备份：{args.restore}")
+        return 1
+
+    members = manager.restore(matches[0])
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'members': {mid: m.to_dict() for mid, m in members.items()}, 'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                   'version': "1.17.95"}, f, ensure_ascii=False, indent=4)
+    print(f"已从 {matches[0]} 恢复 {len(members)} 位会员至 {args.output}")
+    return 0
+
+# ------------------------------
+# 批量导入（JSON / JSONL / CSV 流式读取）
+# ------------------------------
+IMPORT_EXTENSIONS = (".json", ".jsonl", ".csv")
+IMPORT_STATUSES = ("正常", "冻结", "已注销", "需审核")
+IMPORT_CSV_COLUMNS = {"会员ID": "id", "姓名": "name", "手机号": "phone", "生日": "birthday", "等级": "level",
+                      "余额": "balance", "积分": "points", "累计消费": "total_spent", "状态": "status"}
+IMPORT_AMOUNT_FIELDS = (("balance", "余额"), ("points", "积分"), ("total_spent", "累计消费"))
+
+def iter_import_rows(path):
+    """按扩展名流式读取导入文件，逐条产出 (行号, 会员数据)
+
+    - .json：与导出文件相同的 {"members": {ID: 会员, ...}}，行号为会员在文件中的序号
+    - .jsonl：每行一个会员对象，无法解析的行产出 None
+    - .csv：首行为列名，可以使用英文字段名或中文列名（姓名、手机号……）
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            # 第1行为列名
+            for row, data in enumerate(csv.DictReader(f), 2):
+                yield row, {IMPORT_CSV_COLUMNS.get(k.strip(), k.strip()): v for k, v in data.items() if k}
+    elif ext == ".jsonl":
+        with open(path, 'r', encoding='utf-8') as f:
+            for row, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    data = None
+                yield row, data
+    else:
+        for row, (_, data) in enumerate(StreamingJsonReader(path).items('members'), 1):
+            yield row, data
+
+def normalize_import_row(data, levels, created_time):
+    """校验并规范化一条导入数据，返回 (会员, None) 或 (None, 拒绝原因)
+
+    会员ID留空，提交时统一分配；未知字段不保留。
+    """
+    if not isinstance(data, dict):
+        return None, "无法解析的数据"
+    name = str(data.get('name') or '').strip()
+    phone = str(data.get('phone') or '').strip()
+    if not name:
+        return None, "缺少姓名"
+    if not phone:
+        return None, "缺少手机号"
+    if not PHONE_PATTERN.match(phone):
+        return None, "手机号格式错误"
+
+    birthday = str(data.get('birthday') or '').strip()
+    if birthday == "YYYY-MM-DD":
+        birthday = ""
+    if birthday and not BIRTHDAY_PATTERN.match(birthday):
+        return None, "生日格式错误"
+    level = str(data.get('level') or '普通会员').strip()
+    if level not in levels:
+        return None, f"未知会员等级：{level}"
+    status = str(data.get('status') or '正常').strip()
+    if status not in IMPORT_STATUSES:
+        return None, f"未知状态：{status}"
+
+    amounts = []
+    for field, label in IMPORT_AMOUNT_FIELDS:
+        value = data.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            amounts.append(0)
+            continue
+        try:
+            amount = int(round(float(value) * 100))
+        except (TypeError, ValueError, OverflowError):
+            return None, f"{label}格式错误"
+        if amount < 0:
+            return None, f"{label}不能为负数"
+        amounts.append(amount)
+
+    transactions = data.get('transactions') or []
+    try:
+        transactions = [Transaction.from_dict(t) for t in transactions]
+    except (AttributeError, TypeError, ValueError):
+        return None, "交易记录格式错误"
+
+    return Member("", name, phone, birthday, level, *amounts, status, created_time, transactions), None
+
+def import_rejection(row, data, reason):
+    """拒绝明细：(行号, 姓名, 手机号, 原因)"""
+    if isinstance(data, dict):
+        return row, str(data.get('name') or ''), str(data.get('phone') or ''), reason
+    return row, "", "", reason
+
+def write_import_report(path, rejected):
+    """写入未导入记录的明细（CSV，Excel可直接打开）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["行号", "姓名", "手机号", "原因"])
+        writer.writerows(rejected)
+
+# ------------------------------
+# 自动导入目录监视
+# ------------------------------
+class ImportLedger:
+    """自动导入记录：已导入文件的内容哈希，每行一条 JSON，重启后仍然有效
+
+    按内容而不是文件名判断，改名或重复放入的同一文件不会再次导入，
+    同名但内容更新的文件会作为新文件导入。监视线程和界面线程共用，读写加锁。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hashes = set()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.hashes.add(json.loads(line)["hash"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 写入中断留下的半行
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def __contains__(self, digest):
+        with self.lock:
+            return digest in self.hashes
+
+    def record(self, digest, file_name, success, rejected):
+        """记录一个已导入的文件；在数据保存之后调用，崩溃时宁可重新检查也不漏导入"""
+        line = json.dumps({"hash": digest, "file": file_name, "success": success, "rejected": rejected,
+                           "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.hashes.add(digest)
+
+class ImportWatcher:
+    """在后台线程中监视自动导入目录，新文件计算内容哈希后放入 ready 队列
+
+    Linux 上使用 inotify（IN_CLOSE_WRITE / IN_MOVED_TO），文件写完或移入后立即触发；
+    inotify 不可用时每 WATCH_SCAN_INTERVAL 秒用 os.scandir 扫描，文件大小和修改时间
+    在两次扫描之间不再变化才视为写入完成。ready 中为 (文件路径, 内容哈希)，
+    已在导入记录中的文件不会放入。
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory, ledger, extensions=IMPORT_EXTENSIONS):
+        self.directory = directory
+        self.ledger = ledger
+        self.extensions = extensions
+        self.ready = queue.Queue()
+        self.scan_requested = threading.Event()
+        self.stopped = threading.Event()
+        self.checked = {}   # 文件名 -> 已检查过的 (大小, 修改时间)，未变化的文件不再计算哈希
+        self.pending = {}   # 轮询模式：文件名 -> 上次扫描看到的 (大小, 修改时间)
+        self.fd = self._open_inotify()
+        self.mode = "inotify" if self.fd is not None else "scandir"
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _open_inotify(self):
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(self.IN_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, os.fsencode(self.directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def request_scan(self):
+        """重新检查目录中的全部文件（包括之前导入失败、内容未变化的文件）"""
+        self.scan_requested.set()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        self._scan(full=True)
+        while not self.stopped.is_set():
+            if self.scan_requested.is_set():
+                self.scan_requested.clear()
+                self._scan(full=True)
+            if self.fd is None:
+                self.stopped.wait(WATCH_SCAN_INTERVAL)
+                self._scan(full=False)
+                continue
+            readable, _, _ = select.select([self.fd], [], [], WATCH_SCAN_INTERVAL)
+            if readable:
+                self._read_events()
+        if self.fd is not None:
+            os.close(self.fd)
+
+    def _read_events(self):
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                self._scan(full=True)
+            elif name:
+                self._check(name, None)
+
+    def _scan(self, full):
+        """扫描目录；full 为 True 时把现有文件都当作已写完，否则等大小和修改时间稳定"""
+        if full:
+            self.checked.clear()
+        seen = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(self.extensions) or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    seen[entry.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return
+        for name, state in sorted(seen.items()):
+            if full or self.pending.get(name) == state:
+                self._check(name, state)
+        self.pending = seen
+
+    def _check(self, name, state):
+        if self.stopped.is_set() or not name.lower().endswith(self.extensions):
+            return
+        path = os.path.join(self.directory, name)
+        try:
+            if state is None:
+                st = os.stat(path)
+                state = (st.st_size, st.st_mtime_ns)
+            if self.checked.get(name) == state:
+                return
+            digest = self.ledger.file_hash(path)
+        except OSError:
+            return  # 文件已被移走
+        self.checked[name] = state
+        if digest not in self.ledger:
+            self.ready.put((path, digest))
+
+# ------------------------------
+# 性能统计
+# ------------------------------
+class MetricSeries:
+    """一个指标的累计次数、总耗时、最大耗时、直方图和最近样本（秒）"""
+    __slots__ = ('count', 'total', 'max', 'buckets', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(METRIC_BUCKETS_MS) + 1)   # 最后一格为超过最大上界
+        self.recent = deque(maxlen=METRICS_WINDOW)
+
+def percentiles(samples):
+    """返回样本的 (p50, p95, p99)，单位与样本相同"""
+    if not samples:
+        return 0, 0, 0
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return tuple(ordered[min(last, int(q * len(ordered)))] for q in (0.5, 0.95, 0.99))
+
+class Metrics:
+    """耗时统计：按名称记录每次耗时，界面线程和后台线程都可以记录
+
+    summary() 给出累计次数、平均值、p50/p95/p99（最近 METRICS_WINDOW 次）和直方图；
+    interval() 返回上次调用以来的汇总并清空，用于写入滚动日志。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.pending = defaultdict(list)
+
+    def record(self, name, seconds):
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = MetricSeries()
+            series.count += 1
+            series.total += seconds
+            series.max = max(series.max, seconds)
+            series.buckets[bisect.bisect_left(METRIC_BUCKETS_MS, seconds * 1000)] += 1
+            series.recent.append(seconds)
+            self.pending[name].append(seconds)
+
+    def wrap(self, name, func):
+        """返回记录耗时的 func 包装（用于提交给后台线程的任务）"""
+        def timed_func(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return timed_func
+
+    def summary(self):
+        """[{name, count, avg_ms, p50_ms, p95_ms, p99_ms, max_ms, buckets}]，按名称排序"""
+        with self.lock:
+            items = [(name, series.count, series.total, series.max, list(series.buckets), list(series.recent))
+                     for name, series in self.series.items()]
+        rows = []
+        for name, count, total, longest, buckets, recent in sorted(items):
+            p50, p95, p99 = percentiles(recent)
+            rows.append({"name": name, "count": count, "avg_ms": total / count * 1000, "p50_ms": p50 * 1000,
+                         "p95_ms": p95 * 1000, "p99_ms": p99 * 1000, "max_ms": longest * 1000, "buckets": buckets})
+        return rows
+
+    def interval(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(list)
+        result = {}
+        for name, samples in pending.items():
+            p50, p95, p99 = percentiles(samples)
+            result[name] = {"count": len(samples), "p50_ms": round(p50 * 1000, 3), "p95_ms": round(p95 * 1000, 3),
+                            "p99_ms": round(p99 * 1000, 3), "max_ms": round(max(samples) * 1000, 3)}
+        return result
+
+def instrumented(name):
+    """方法装饰器：把每次调用的耗时记入 self.metrics 的 name 指标"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.metrics.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def append_metrics_log(path, entry):
+    """追加一条性能日志（JSONL）；文件超过 METRICS_LOG_MAX_BYTES 时先轮转为 .1、.2……"""
+    if os.path.exists(path) and os.path.getsize(path) > METRICS_LOG_MAX_BYTES:
+        base, ext = os.path.splitext(path)
+        for i in range(METRICS_LOG_KEEP - 1, 0, -1):
+            if os.path.exists(f"{base}.{i}{ext}"):
+                os.replace(f"{base}.{i}{ext}", f"{base}.{i + 1}{ext}")
+        os.replace(path, f"{base}.1{ext}")
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+# ------------------------------
+# 后台持久化
+# ------------------------------
+class PersistenceWorker:
+    """后台保存线程：界面线程提交写入任务后立即返回，任务按提交顺序依次执行
+
+    任务只能使用提交时传入的数据副本。执行结果由界面线程调用 poll() 取回，
+    在界面线程中回调 on_done(结果) 或 on_error(异常)；flush() 等待全部任务完成。
+    """
+
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.pending = 0  # 已提交但结果尚未取回的任务数（只在界面线程中读写）
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, on_done=None, on_error=None):
+        self.pending += 1
+        self.tasks.put((func, on_done, on_error))
+
+    def _run(self):
+        while True:
+            func, on_done, on_error = self.tasks.get()
+            try:
+                self.results.put((on_done, func(), None))
+            except Exception as e:
+                self.results.put((on_error, None, e))
+            finally:
+                self.tasks.task_done()
+
+    def poll(self):
+        """在界面线程中执行已完成任务的回调"""
+        while True:
+            try:
+                callback, result, error = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self.pending -= 1
+            if callback:
+                callback(error if error is not None else result)
+
+    def flush(self):
+        """等待已提交的任务全部完成并执行回调"""
+        self.tasks.join()
+        self.poll()
+
+# ------------------------------
+# 会员数据核心（不依赖界面）
+# ------------------------------
+class MemberStore:
+    """会员数据核心：会员、内存索引、变更集和持久化，界面和批处理共用
+
+    金额和积分参数都是以 0.01 为单位的整数。参数不合法或会员状态不允许时抛出 ValueError，
+    消息可直接显示给用户。写入任务由 PersistenceWorker 在后台执行，flush() 等待全部写完。
+    使用方可设置回调：on_submit() 在提交写入任务前调用，on_commit(会员ID集合) 在一批变更
+    交给存储后调用，on_write_error(异常) 在写入失败时调用，on_sync(会员ID集合) 在应用了
+    其他终端写入的变更后调用，on_conflict([提示消息]) 在本机的修改因冲突被放弃时调用。
+    """
+    BATCH_OPERATIONS = {"recharge": "批量充值", "points": "赠送积分", "level": "调整等级",
+                        "status": "调整状态", "delete": "删除会员"}
+
+    def __init__(self, storage, config=None, metrics=None):
+        self.config = config if config is not None else self.default_config()
+        self.level_table = LevelTable(self.config["level_rules"])
+        self.metrics = metrics or Metrics()
+        self.storage = storage
+        self.members = {}
+        self.phone_index = PhoneIndex()
+        self.search_index = SearchIndex()
+        self.birthday_index = BirthdayIndex()
+        self.stats = MemberStats()
+        self.id_allocator = MemberIdAllocator()
+        self.history_cache = {}   # 会员ID -> 从存储读取的交易记录（只缓存最近查看的会员）
+        self.load_source = None   # 加载期间交易记录从该存储读取
+        self.changes = ChangeSet()
+        self.unwritten = []       # 已交给后台但尚未写入存储的交易记录变更 [(清空的会员ID, {会员ID: [交易记录]})]
+        self.storage_lock = threading.Lock()   # 后台存储任务与界面线程读取交易记录互斥
+        self.needs_full_save = False
+        self.data_version = 0        # 每提交一次写入加一，用于判断备份后数据是否有变化
+        self.write_failures = 0
+        self.syncing = 0             # 结果尚未应用的同步任务数，期间的保存推迟到应用之后
+        self.save_pending = False
+        self.saved_callbacks = []    # 推迟的保存写入完成后调用
+        self.persistence = PersistenceWorker()
+        self.on_submit = None
+        self.on_commit = None
+        self.on_write_error = None
+        self.on_sync = None
+        self.on_conflict = None
+
+    @staticmethod
+    def default_config():
+        return {
+            "level_rules": {
+                "普通会员": 0,
+                "白银会员": 1000,
+                "黄金会员": 5000,
+                "钻石会员": 20000
+            },
+            "points_rate": 0.1,
+            "points_exchange_rate": 100,
+            "journal_compact_threshold": 1000
+        }
+
+    # 内存索引
+    def index(self, member):
+        """会员新增或资料变更后更新内存索引"""
+        self.phone_index.add(member)
+        self.search_index.add(member)
+        self.birthday_index.add(member)
+        self.stats.update(member)
+        self.id_allocator.observe(member.id)
+
+    def unindex(self, member):
+        """会员删除或资料变更前从内存索引中移除"""
+        self.phone_index.remove(member)
+        self.search_index.remove(member)
+        self.birthday_index.remove(member)
+        self.stats.remove(member)
+
+    def insert(self, member):
+        self.members[member.id] = member
+        self.index(member)
+
+    def reset(self, members):
+        """替换全部会员并重建索引（不记录变更）"""
+        self.members = members
+        self.phone_index.rebuild(members)
+        self.search_index.rebuild(members)
+        self.birthday_index.rebuild(members)
+        self.stats.rebuild(members)
+        for member_id in members:
+            self.id_allocator.observe(member_id)
+        self.history_cache = {}
+
+    # 查询
+    def find_by_phone(self, phone, exclude_id=None):
+        """查找使用该手机号的非注销会员，返回会员ID"""
+        return self.phone_index.find(phone, exclude_id)
+
+    def search(self, keyword):
+        return self.search_index.search(keyword)
+
+    def snapshot(self):
+        """返回 (总数, 等级分布, 状态分布, 总余额, 总积分)，金额和积分以 0.01 为单位"""
+        return self.stats.snapshot()
+
+    def levels(self):
+        """当前等级规则的门槛表（规则变化后重新编译）"""
+        if self.level_table.rules != self.config["level_rules"]:
+            self.level_table = LevelTable(self.config["level_rules"])
+        return self.level_table
+
+    def level_for_spent(self, total_spent):
+        """累计消费（以 0.01 为单位）对应的等级"""
+        return self.levels().lookup(total_spent)
+
+    def member(self, member_id):
+        member = self.members.get(member_id)
+        if member is None:
+            raise ValueError(f"会员不存在：{member_id}")
+        return member
+
+    def active_member(self, member_id):
+        member = self.member(member_id)
+        if member.status != "正常":
+            raise ValueError(f"会员状态为 {member.status}，无法操作")
+        return member
+
+    def transactions(self, member_id):
+        """会员的全部交易记录：不在内存中时从存储读取（含尚未保存的变更），并缓存最近查看的会员"""
+        member = self.members[member_id]
+        if member.transactions is not None:
+            return member.transactions
+        transactions = self.history_cache.get(member_id)
+        if transactions is None:
+            storage = self.load_source or self.storage
+            # 不等待后台写完：已提交但尚未写入的变更从内存中补上，
+            # 持有锁时后台没有正在执行的存储任务，不会读到写了一半的数据
+            with self.storage_lock:
+                transactions = storage.load_transactions([member_id]).get(member_id, [])
+                for cleared, added in self.unwritten + [(self.changes.cleared, self.changes.transactions)]:
+                    if member_id in cleared:
+                        transactions = []
+                    transactions = transactions + added.get(member_id, [])
+            self.history_cache = {member_id: transactions}
+        return transactions
+
+    # 会员资料
+    @staticmethod
+    def check_profile(name, phone, birthday):
+        if not name:
+            raise ValueError("请输入会员姓名")
+        if not phone:
+            raise ValueError("请输入手机号")
+        if not PHONE_PATTERN.match(phone):
+            raise ValueError("手机号格式错误（11位数字，以13-19开头）")
+        if birthday and not BIRTHDAY_PATTERN.match(birthday):
+            raise ValueError("生日格式应为 YYYY-MM-DD（例如 1990-01-01）")
+
+    def add_member(self, name, phone, birthday="", level="普通会员", status="正常"):
+        self.check_profile(name, phone, birthday)
+        if self.find_by_phone(phone):
+            raise ValueError("该手机号已被使用（非注销状态）")
+        member = Member(self.id_allocator.allocate()[0], name, phone, birthday=birthday, level=level,
+                        status=status, created_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        transactions=[])
+        self.insert(member)
+        self.changes.add_member(member.id)
+        return member
+
+    def update_member(self, member_id, name, phone, birthday="", level="普通会员", status="正常"):
+        member = self.member(member_id)
+        self.check_profile(name, phone, birthday)
+        if self.find_by_phone(phone, exclude_id=member_id):
+            raise ValueError("该手机号已被使用")
+        self.changes.keep_base(member)
+        self.unindex(member)
+        member.name = name
+        member.phone = phone
+        member.birthday = birthday
+        member.level = sys.intern(level)
+        member.status = sys.intern(status)
+        self.index(member)
+        self.changes.mark_member(member_id)
+        return member
+
+    def delete_member(self, member_id):
+        member = self.members.pop(self.member(member_id).id)
+        self.unindex(member)
+        self.changes.delete_member(member_id)
+        return member
+
+    def import_batch(self, rows, seen):
+        """加入一批已校验的导入会员 [(行号, 会员)]，分配新ID；seen 为本次导入已出现的手机号
+
+        返回 (加入的会员ID列表, 拒绝明细列表)。
+        """
+        added = []
+        rejected = []
+        for (row, member), member_id in zip(rows, self.id_allocator.allocate(len(rows))):
+            member.id = member_id
+            # 先与已有会员比较，再与文件中前面的行比较
+            if self.find_by_phone(member.phone):
+                rejected.append((row, member.name, member.phone, "手机号已被使用"))
+                continue
+            if member.phone in seen:
+                rejected.append((row, member.name, member.phone, "文件内手机号重复"))
+                continue
+            seen.add(member.phone)
+            self.insert(member)
+            self.changes.add_member(member_id)
+            added.append(member_id)
+        # 新会员加上日志中已有的记录达到合并阈值时，保存时直接用内存数据写入完整快照，
+        # 不再先追加日志、合并时又重新读取快照和全部日志
+        if added and self.storage.needs_compaction(len(self.changes.added)):
+            self.needs_full_save = True
+        return added, rejected
+
+    # 余额与积分
+    def record_transaction(self, member, action, amount, points_change=0):
+        """记录一笔交易（余额和积分已更新），同时更新统计"""
+        transaction = Transaction(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), action,
+                                  amount, points_change, member.balance)
+        if member.transactions is not None:
+            member.transactions.append(transaction)
+        elif member.id in self.history_cache:
+            self.history_cache[member.id].append(transaction)
+        self.changes.mark_member(member.id)
+        self.changes.add_transaction(member.id, transaction)
+        self.stats.update(member)
+        return transaction
+
+    def recharge(self, member_id, amount):
+        member = self.active_member(member_id)
+        if amount <= 0:
+            raise ValueError("请输入有效的正数金额")
+        self.changes.keep_base(member)
+        member.balance += amount
+        return self.record_transaction(member, "充值", amount)
+
+    def consume(self, member_id, amount):
+        """消费：扣减余额，按 points_rate 累计积分，并按累计消费调整等级"""
+        member = self.active_member(member_id)
+        if amount <= 0:
+            raise ValueError("请输入有效的正数金额")
+        if amount > member.balance:
+            raise ValueError(f"余额不足（当前：¥{from_cents(member.balance)}）")
+        self.changes.keep_base(member)
+        points_change = int(amount * self.config["points_rate"] + 0.5)
+        member.balance -= amount
+        member.points += points_change
+        member.total_spent += amount
+        new_level = self.level_for_spent(member.total_spent)
+        if new_level != member.level:
+            self.set_level(member, new_level)
+        return self.record_transaction(member, "消费", amount, points_change)
+
+    def exchange_points(self, member_id, points):
+        """积分兑换余额：points 需为 100 积分的整数倍"""
+        member = self.active_member(member_id)
+        rate = self.config["points_exchange_rate"]
+        if member.points < rate * 100:
+            raise ValueError(f"积分不足（最低需{rate}积分）")
+        if points <= 0:
+            raise ValueError("请输入有效的积分数量")
+        if points > member.points:
+            raise ValueError(f"请输入有效的积分数量\n不能超过当前积分（{from_cents(member.points)}）")
+        if points % 10000 != 0:
+            raise ValueError("请输入有效的积分数量\n积分兑换需为100的整数倍")
+        self.changes.keep_base(member)
+        amount = int(points / rate + 0.5)
+        member.balance += amount
+        member.points -= points
+        return self.record_transaction(member, "积分兑换", amount, -points)
+
+    def adjust_points(self, member_id, delta, reason):
+        member = self.active_member(member_id)
+        if not reason:
+            raise ValueError("请输入调整原因")
+        if member.points + delta < 0:
+            raise ValueError("调整后积分不能为负数")
+        self.changes.keep_base(member)
+        member.points += delta
+        return self.record_transaction(member, f"积分调整（{reason}）", 0, delta)
+
+    def clear_transactions(self, member_id):
+        member = self.member(member_id)
+        if member.transactions is not None:
+            member.transactions = []
+        self.history_cache.pop(member_id, None)
+        self.changes.clear_transactions(member_id)
+
+    # 批量操作
+    def select_members(self, keyword="", level=None, status=None):
+        """按关键字、等级和状态筛选会员，返回会员ID（按加入顺序）"""
+        members = self.members
+        member_ids = self.search(keyword) if keyword else members
+        return [member_id for member_id in member_ids
+                if (not level or members[member_id].level == level) and
+                (not status or members[member_id].status == status)]
+
+    def run_batch(self, member_ids, operation, value=None, reason="", dry_run=False):
+        """对一组会员执行同一操作（见 BATCH_OPERATIONS），不符合条件的会员跳过
+
+        充值和赠送积分的 value 以 0.01 为单位，每位会员记一条交易；调整等级/状态的 value 为新值。
+        只记录变更，由调用方保存一次。dry_run=True 时只校验和汇总，不修改数据（执行前预览）。
+        返回 {"count": 处理人数, "amount": 充值合计, "points": 积分合计, "balance": 处理会员的余额合计,
+        "changes": {原等级或原状态: 人数}, "skipped": [(会员ID, 原因)]}。
+        """
+        if operation not in self.BATCH_OPERATIONS:
+            raise ValueError(f"未知的批量操作：{operation}")
+        if operation == "recharge" and not (value and value > 0):
+            raise ValueError("请输入有效的正数金额")
+        if operation == "points" and not (value and value > 0):
+            raise ValueError("请输入有效的积分数量")
+        if operation == "level" and value not in self.config["level_rules"]:
+            raise ValueError(f"未知会员等级：{value}")
+        if operation == "status" and value not in IMPORT_STATUSES:
+            raise ValueError(f"未知状态：{value}")
+
+        note = f"（{reason}）" if reason else ""
+        summary = {"count": 0, "amount": 0, "points": 0, "balance": 0, "changes": defaultdict(int), "skipped": []}
+        reactivated = set()   # 本批恢复使用的手机号（dry_run 时索引不更新）
+        for member_id in member_ids:
+            member = self.members.get(member_id)
+            if member is None:
+                skip = "会员不存在"
+            elif operation in ("recharge", "points") and member.status != "正常":
+                skip = f"会员状态为 {member.status}"
+            elif operation == "level" and member.level == value:
+                skip = "等级未变化"
+            elif operation == "status" and member.status == value:
+                skip = "状态未变化"
+            elif (operation == "status" and member.status == "已注销" and
+                  (member.phone in reactivated or self.find_by_phone(member.phone, exclude_id=member_id))):
+                skip = "手机号已被其他会员使用"
+            else:
+                skip = None
+            if skip:
+                summary["skipped"].append((member_id, skip))
+                continue
+
+            summary["count"] += 1
+            summary["balance"] += member.balance
+            if operation == "recharge":
+                summary["amount"] += value
+            elif operation == "points":
+                summary["points"] += value
+            elif operation == "level":
+                summary["changes"][member.level] += 1
+            elif operation == "status":
+                summary["changes"][member.status] += 1
+                if member.status == "已注销":
+                    reactivated.add(member.phone)
+            if dry_run:
+                continue
+
+            if operation == "delete":
+                self.delete_member(member_id)
+                continue
+            self.changes.keep_base(member)
+            if operation == "recharge":
+                member.balance += value
+                self.record_transaction(member, "批量充值" + note, value)
+            elif operation == "points":
+                member.points += value
+                self.record_transaction(member, "赠送积分" + note, 0, value)
+            elif operation == "level":
+                self.set_level(member, value)
+                self.changes.mark_member(member_id)
+            else:
+                self.unindex(member)
+                member.status = sys.intern(value)
+                self.index(member)
+                self.changes.mark_member(member_id)
+        summary["changes"] = dict(summary["changes"])
+        return summary
+
+    # 等级
+    def set_level(self, member, level):
+        """只修改等级：等级只影响等级分组和统计，不需要重建其他索引"""
+        self.search_index.by_level[member.level].discard(member.id)
+        member.level = sys.intern(level)
+        self.search_index.by_level[member.level].add(member.id)
+        self.stats.move_level(member)
+
+    def relevel(self, rules=None, dry_run=False):
+        """按等级规则重算全部会员的等级；rules 不为空时先替换等级规则（dry_run 时不替换）
+
+        只逐个处理等级有变化的会员，记录变更但不保存（调用方保存一次）。
+        dry_run=True 时只计算报告，用于修改规则前预览。
+        返回 {"count": 变化人数, "changes": {(原等级, 新等级): 人数}, "members": [(会员ID, 原等级, 新等级)]}。
+        """
+        if rules is not None:
+            rules = {str(level).strip(): float(threshold) for level, threshold in rules.items()}
+            if not rules or any(not level or threshold < 0 for level, threshold in rules.items()):
+                raise ValueError("等级名称不能为空，门槛不能为负数")
+            table = LevelTable(rules)
+        else:
+            table = self.levels()
+        # 会员很多时，报告和变更产生的大量小对象会反复触发完整的垃圾回收，期间暂停回收
+        gc_enabled = gc.isenabled()
+        try:
+            gc.disable()
+            members = list(self.members.values())
+            changed = [(member, level) for member, level in zip(members, table.assign(members))
+                       if member.level != level]
+            report = {"count": len(changed), "changes": defaultdict(int), "members": []}
+            for member, level in changed:
+                report["changes"][(member.level, level)] += 1
+                report["members"].append((member.id, member.level, level))
+            report["changes"] = dict(report["changes"])
+            if dry_run:
+                return report
+            if rules is not None:
+                self.config["level_rules"] = rules
+                self.level_table = table
+                # 等级规则随完整数据保存（JSON快照 / 数据库 meta 表）
+                self.needs_full_save = True
+            for member, level in changed:
+                self.changes.keep_base(member)
+                self.set_level(member, level)
+                self.changes.mark_member(member.id)
+            return report
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    # 加载与持久化
+    @staticmethod
+    def migrate_member(member):
+        """旧版本缺少的字段已在 Member.from_dict 中补齐，这里只标记手机号异常的会员"""
+        if not PHONE_PATTERN.match(member.phone):
+            member.status = "需审核"
+
+    def load(self):
+        """在调用线程中读入存储的全部会员，返回重放的日志条数（界面使用分批加载）"""
+        self.reset({})
+        for batch, _ in self.storage.stream():
+            for member_id, member in batch:
+                self.migrate_member(member)
+                self.insert(member)
+        replayed = self.storage.finish_load(self.members)
+        self.use_level_rules(self.storage)
+        if replayed:
+            self.reset(self.members)
+        # 旧版数据文件的交易记录内嵌在会员数据中：下次保存时整体写入一次
+        if any(member.transactions is not None for member in self.members.values()):
+            self.needs_full_save = True
+        return replayed
+
+    def use_level_rules(self, storage):
+        """使用数据文件中保存的等级规则；旧数据文件没有保存时沿用当前规则"""
+        if storage.level_rules:
+            self.config["level_rules"] = dict(storage.level_rules)
+            self.level_table = LevelTable(self.config["level_rules"])
+
+    def submit(self, func, on_done=None, on_error=None):
+        if self.on_submit:
+            self.on_submit()
+        self.persistence.submit(func, on_done, on_error)
+
+    def submit_write(self, func, on_done=None, on_failed=None):
+        """提交一个写入任务；失败时下次保存改为写入完整数据"""
+        def on_error(e):
+            self.write_failures += 1
+            self.needs_full_save = True
+            if self.on_write_error:
+                self.on_write_error(e)
+            if on_failed:
+                on_failed()
+
+        self.data_version += 1
+        self.submit(self.metrics.wrap("storage.write", func), on_done, on_error)
+
+    def submit_sync(self, func, on_done=None, write=True):
+        """提交一个返回同步结果的存储任务（见 Storage），完成后先应用结果再调用 on_done()"""
+        def finished(result):
+            self.syncing -= 1
+            if result is not None:
+                self.apply_sync(result)
+                if on_done:
+                    on_done()
+            if self.save_pending and not self.syncing:
+                self.save_pending = False
+                callbacks, self.saved_callbacks = self.saved_callbacks, []
+                try:
+                    self.save(lambda: [callback() for callback in callbacks])
+                except ValueError:
+                    pass   # 校验失败留到下次保存时提示
+
+        def task():
+            with self.storage_lock:
+                return func()
+
+        self.syncing += 1
+        if write:
+            self.submit_write(task, finished, lambda: finished(None))
+        else:
+            self.submit(task, finished, lambda e: finished(None))
+
+    def sync(self):
+        """读取其他终端写入的变更；已有同步任务时跳过，返回是否提交"""
+        if self.syncing or self.load_source is not None:
+            return False
+        self.submit_sync(self.storage.sync, write=False)
+        return True
+
+    def apply_sync(self, result):
+        """应用同步结果：更新版本号，把其他终端的变更合并到内存中（与本机未保存的修改合并）"""
+        changes = self.changes
+        for member_id, version in result["versions"].items():
+            for member in (self.members.get(member_id), changes.bases.get(member_id)):
+                if member is not None:
+                    member.version = version
+        messages = []
+        changed = set()
+        for member_id in result["duplicates"]:
+            # 新会员的ID被其他终端先用了：换一个新ID，下次保存时重新写入
+            member = self.members.get(member_id)
+            if member is None or member_id in changes.added:
+                continue
+            self.unindex(member)
+            del self.members[member_id]
+            member.id = self.id_allocator.allocate()[0]
+            self.insert(member)
+            changes.add_member(member.id)
+            changed.add(member.id)
+            self.save_pending = True
+            messages.append(f"会员 {member.name} 的ID与其他终端新增的会员重复，已改为 {member.id}")
+        conflicts = dict(result["conflicts"])
+        for member_id, theirs in result["members"].items():
+            current = self.members.get(member_id)
+            if member_id in changes.deleted or member_id in changes.added:
+                continue
+            if member_id in conflicts and current is not None:
+                messages.append(f"会员 {current.name} 的修改未保存：{conflicts[member_id]}")
+            if theirs is None:
+                if current is not None:
+                    self.unindex(current)
+                    del self.members[member_id]
+                    changes.forget(member_id)
+                    changed.add(member_id)
+                continue
+            base = changes.bases.get(member_id)
+            if current is not None and base is not None:
+                merged, reason = merge_member(current, base, theirs)
+                if merged is None:
+                    messages.append(f"会员 {current.name} 的修改未保存：{reason}")
+                    changes.forget(member_id)
+                    merged = theirs
+                else:
+                    changes.bases[member_id] = theirs
+                theirs = merged
+            if current is not None:
+                self.unindex(current)
+                theirs.transactions = current.transactions
+            self.insert(theirs)
+            self.history_cache.pop(member_id, None)
+            changed.add(member_id)
+        # 其他终端写入的手机号与本机未保存的新会员或手机号修改重复时，放弃本机的修改
+        for member_id in list(changed):
+            member = self.members.get(member_id)
+            if member is None or member_id not in result["members"] or member.status == "已注销":
+                continue
+            other_id = self.phone_index.find(member.phone, exclude_id=member_id)
+            if other_id is None or other_id in result["members"]:
+                continue
+            message = self.drop_phone_clash(other_id)
+            if message:
+                messages.append(message)
+                changed.add(other_id)
+        if changed:
+            self.data_version += 1
+            if self.on_commit:
+                self.on_commit(changed)
+            if self.on_sync:
+                self.on_sync(changed)
+        if messages and self.on_conflict:
+            self.on_conflict(messages)
+
+    def drop_phone_clash(self, member_id):
+        """本机未保存的会员与其他终端的会员手机号重复：新会员删除，修改恢复为修改前的资料
+
+        返回提示消息；手机号在修改前就已重复（旧数据）时不处理，返回 None。
+        """
+        member = self.members[member_id]
+        changes = self.changes
+        reason = f"手机号 {member.phone} 已被其他终端的会员使用"
+        if member_id in changes.added:
+            self.unindex(member)
+            del self.members[member_id]
+            changes.delete_member(member_id)
+            return f"新会员 {member.name} 未保存：{reason}"
+        base = changes.bases.get(member_id)
+        if base is None or (base.phone == member.phone and base.status != "已注销"):
+            return None
+        self.unindex(member)
+        changes.forget(member_id)
+        restored = base.copy(transactions=False)
+        restored.transactions = member.transactions
+        self.insert(restored)
+        self.history_cache.pop(member_id, None)
+        return f"会员 {member.name} 的修改未保存：{reason}"
+
+    def flush(self):
+        """等待全部写入完成（包括同步结果应用后补交的保存）"""
+        self.persistence.flush()
+        while self.persistence.pending:
+            self.persistence.flush()
+
+    def close(self):
+        self.flush()
+        self.storage.close()
+
+    def validate_changes(self):
+        """只校验本次变更涉及的会员"""
+        for member_id in self.changes.dirty_member_ids():
+            member = self.members[member_id]
+            if not member.name or not member.phone:
+                raise ValueError(f"会员 {member_id} 缺少姓名或手机号")
+            if not PHONE_PATTERN.match(member.phone):
+                raise ValueError(f"会员 {member_id} 手机号格式错误")
+
+    def commit_changes(self):
+        if self.on_commit:
+            self.on_commit(self.changes.touched_member_ids())
+        self.changes.clear()
+
+    def save(self, on_written=None):
+        """提交未保存的变更，返回 (记录数, 是否写入了完整数据)；日志过长时合并为快照
+
+        校验失败时抛出 ValueError。写入失败时内存中的数据不会丢失，下次保存写入完整数据。
+        on_written() 在这次提交的写入结束后调用；正在同步时保存推迟（save_pending），
+        推迟的写入结束后才调用。
+        """
+        if not self.changes and not self.needs_full_save:
+            if on_written:
+                on_written()
+            return 0, False
+        self.validate_changes()
+        if self.syncing:
+            # 上一次写入时其他终端的变更还未合并到内存中，应用之后再写入
+            self.save_pending = True
+            if on_written:
+                self.saved_callbacks.append(on_written)
+            return len(self.changes), False
+        if self.needs_full_save:
+            count = len(self.members)
+            self.write_snapshot()
+            self.notify_written(on_written)
+            return count, True
+        storage = self.storage
+        records = self.changes.to_records(self.members)
+        bases = {**self.changes.bases, **dict.fromkeys(self.changes.added)}
+        # 有未完成的写入时日志计数还不准确，合并推迟到之后的保存
+        compact = not self.persistence.pending and storage.needs_compaction(len(records))
+        written = self.transaction_lists(self.changes.added)
+        unwritten = (self.changes.cleared, self.changes.transactions)
+        self.unwritten.append(unwritten)
+        self.commit_changes()
+
+        def commit():
+            try:
+                return storage.commit(records, bases)
+            finally:
+                # 在后台线程中持有 storage_lock 时移除，读取交易记录时不会重复或遗漏
+                self.unwritten.remove(unwritten)
+
+        self.submit_sync(commit, lambda: self.release_transactions(storage, written))
+        if compact:
+            self.submit_sync(storage.compact)
+        self.notify_written(on_written)
+        return len(records), compact
+
+    def notify_written(self, on_written):
+        """写入任务按提交顺序执行：排在后面的空任务完成时，之前提交的写入都已结束"""
+        if on_written:
+            self.submit(lambda: None, lambda _: on_written())
+
+    def write_snapshot(self):
+        """提交完整数据写入（JSON快照合并 / 数据库整体重写）"""
+        storage = self.storage
+        members = {member_id: m.copy() for member_id, m in self.members.items()}
+        touched = self.changes.touched_member_ids()
+        written = self.transaction_lists(self.members)
+        rules = dict(self.config["level_rules"])
+        self.commit_changes()
+        self.needs_full_save = False
+        self.submit_sync(lambda: storage.rewrite(members, touched, rules),
+                         lambda: self.release_transactions(storage, written))
+
+    def transaction_lists(self, member_ids):
+        """交易记录仍在内存中的会员：{会员ID: 交易记录列表}"""
+        lists = {}
+        for member_id in member_ids:
+            member = self.members.get(member_id)
+            if member is not None and member.transactions is not None:
+                lists[member_id] = member.transactions
+        return lists
+
+    def load_all_transactions(self):
+        """把只在存储中的交易记录全部读入内存（另存为新文件前调用）"""
+        missing = [member_id for member_id, m in self.members.items() if m.transactions is None]
+        if missing:
+            histories = self.storage.load_transactions(missing)
+            for member_id in missing:
+                self.members[member_id].transactions = histories.get(member_id, [])
+
+    def release_transactions(self, storage, lists):
+        """交易记录已完整写入存储的会员不再在内存中保留交易记录，之后按需读取"""
+        if storage is not self.storage:
+            return
+        for member_id, transactions in lists.items():
+            member = self.members.get(member_id)
+            if member is not None and member.transactions is transactions:
+                member.transactions = None
+
+    def switch_storage(self, storage):
+        # 先写完提交给旧存储的任务
+        self.flush()
+        if storage is not self.storage:
+            self.storage.close()
+        self.storage = storage
+        self.history_cache = {}
+        self.changes.clear()
+
+# ------------------------------
+# 性能基准（合成数据）
+# ------------------------------
+BENCHMARK_SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+BENCHMARK_GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红梅鑫宇浩然子轩欣怡梓涵雨晨思远佳琪嘉俊"
+BENCHMARK_SIZES = (10000, 100000)
+BENCHMARK_QUERIES = 50   # 搜索、手机号查找各取多少个样本，结果取中位数
+
+def synthetic_members(count, history=5, seed=0, config=None):
+    """逐个生成合成会员：中文姓名、1[3-9] 开头的有效手机号（互不重复）、生日、等级和交易记录
+
+    交易记录为充值/消费交替，余额、积分、累计消费与等级和交易记录一致。
+    """
+    rng = random.Random(seed)
+    config = config or MemberStore.default_config()
+    levels = LevelTable(config["level_rules"])
+    # 与 10**9 互素的步长：序号映射为互不相同的 9 位尾号
+    stride, offset = 7919 * 7927, rng.randrange(10 ** 9)
+    first_birthday, last_birthday = date(1950, 1, 1).toordinal(), date(2010, 12, 31).toordinal()
+    start = datetime.now() - timedelta(days=3 * 365)
+    for i, member_id in enumerate(MemberIdAllocator().allocate(count)):
+        name = rng.choice(BENCHMARK_SURNAMES) + "".join(rng.choice(BENCHMARK_GIVEN) for _ in range(rng.randint(1, 2)))
+        phone = f"1{rng.randint(3, 9)}{(i * stride + offset) % 10 ** 9:09d}"
+        birthday = date.fromordinal(rng.randint(first_birthday, last_birthday)).isoformat() if rng.random() < 0.9 else ""
+        created = start + timedelta(seconds=rng.randrange(3 * 365 * 86400))
+        balance = points = spent = 0
+        transactions = []
+        for k in range(history):
+            when = (created + timedelta(days=k, seconds=rng.randrange(86400))).strftime("%Y-%m-%d %H:%M:%S")
+            if balance < 5000 or rng.random() < 0.4:
+                amount = rng.randint(1, 200) * 1000
+                balance += amount
+                transactions.append(Transaction(when, "充值", amount, 0, balance))
+            else:
+                amount = rng.randint(1, balance)
+                points_change = int(amount * config["points_rate"] + 0.5)
+                balance -= amount
+                points += points_change
+                spent += amount
+                transactions.append(Transaction(when, "消费", amount, points_change, balance))
+        level = levels.lookup(spent)
+        status = rng.choices(IMPORT_STATUSES[:3], weights=(95, 3, 2))[0]
+        yield Member(member_id, name, phone, birthday, level, balance, points, spent, status,
+                     created.strftime("%Y-%m-%d %H:%M:%S"), transactions)
+
+def write_import_file(path, members):
+    """把会员写成 JSONL 导入文件（不含ID和交易记录）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for member in members:
+            data = member.to_dict(transactions=False)
+            del data['id']
+            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+def timed(func, *args):
+    """执行一次，返回 (耗时秒数, 返回值)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def import_into(store, path):
+    """无界面的批量导入：流式读取、校验、加入会员并保存一次，返回 (成功人数, 拒绝人数)"""
+    created_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    accepted = []
+    rejected = 0
+    for row, data in iter_import_rows(path):
+        member, reason = normalize_import_row(data, store.config["level_rules"], created_time)
+        if member is None:
+            rejected += 1
+        else:
+            accepted.append((row, member))
+    seen = set()
+    success = 0
+    for start in range(0, len(accepted), IMPORT_BATCH_SIZE):
+        added, skipped = store.import_batch(accepted[start:start + IMPORT_BATCH_SIZE], seen)
+        success += len(added)
+        rejected += len(skipped)
+    store.save()
+    store.flush()
+    return success, rejected
+
+def benchmark_size(size, history, seed, workdir):
+    """对一个数据规模计时：生成、加载、搜索、统计、生日扫描、保存、备份和导入"""
+    import statistics
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, "members_data.json")
+    import_path = os.path.join(workdir, "import.jsonl")
+    result = {"members": size, "history": history}
+
+    result["generate_s"], members = timed(lambda: {m.id: m for m in synthetic_members(size, history, seed)})
+    storage = open_storage(path)
+    result["write_s"], _ = timed(storage.write_all, members)
+    storage.close()
+    del members
+    write_import_file(import_path, synthetic_members(max(1, size // 10), 0, seed + 1))
+    result["file_bytes"] = os.path.getsize(path)
+
+    store = MemberStore(open_storage(path))
+    result["load_s"], _ = timed(store.load)
+    result["index_rebuild_s"], _ = timed(store.reset, store.members)
+
+    rng = random.Random(seed)
+    sample = rng.sample(list(store.members.values()), min(BENCHMARK_QUERIES, size))
+    result["search_ms"] = statistics.median(timed(store.search, m.name[:2])[0] for m in sample) * 1000
+    result["phone_search_ms"] = statistics.median(timed(store.search, m.phone[-4:])[0] for m in sample) * 1000
+    result["phone_lookup_us"] = statistics.median(timed(store.find_by_phone, m.phone)[0] for m in sample) * 1e6
+    result["statistics_ms"] = timed(store.snapshot)[0] * 1000
+    raised = {level: threshold * 2 for level, threshold in store.config["level_rules"].items()}
+    # 预览一次，NumPy 的导入和首次调用不计入耗时
+    store.relevel(raised, dry_run=True)
+    result["relevel_ms"] = timed(store.relevel, raised, True)[0] * 1000
+    store.birthday_index.cache.clear()
+    result["birthday_scan_ms"] = timed(store.birthday_index.upcoming, date.today(), 7)[0] * 1000
+    result["transactions_ms"] = statistics.median(timed(store.transactions, m.id)[0] for m in sample) * 1000
+
+    # 先做一次完整备份，之后的修改由增量备份写入
+    backups = BackupManager(os.path.join(workdir, "备份"))
+    snapshot, backup_changed = backups.snapshot(store.members)
+    result["backup_full_s"], _ = timed(backups.create, store.storage.with_transactions(snapshot), backup_changed)
+
+    # 约 1% 的会员各充值一次
+    changed = rng.sample(list(store.members), max(1, size // 100))
+    for member_id in changed:
+        if store.members[member_id].status == "正常":
+            store.recharge(member_id, 100)
+    result["save_incremental_s"], _ = timed(lambda: (store.save(), store.flush()))
+    store.needs_full_save = True
+    result["save_full_s"], _ = timed(lambda: (store.save(), store.flush()))
+
+    backups.mark_changed(changed)
+    snapshot, backup_changed = backups.snapshot(store.members)
+    result["backup_incremental_s"], _ = timed(backups.create, store.storage.with_transactions(snapshot), backup_changed)
+
+    result["import_s"], (result["import_added"], result["import_rejected"]) = timed(import_into, store, import_path)
+    store.close()
+    return result
+
+def run_benchmark(sizes=BENCHMARK_SIZES, history=5, seed=0, workdir=None, keep=False, progress=None):
+    """依次测量各数据规模，返回可直接写成 JSON 的结果"""
+    results = {
+        "version": "1.17.95",
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "seed": seed,
+        "runs": []
+    }
+    root = workdir or tempfile.mkdtemp(prefix="会员系统基准_")
+    try:
+        for size in sizes:
+            results["runs"].append(benchmark_size(size, history, seed, os.path.join(root, str(size))))
+            if progress:
+                progress(results["runs"][-1])
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def compare_benchmarks(baseline, results):
+    """与之前的结果逐项对比耗时，返回文本行：规模 指标 旧值 → 新值 (倍数)"""
+    lines = []
+    previous = {run["members"]: run for run in baseline.get("runs", [])}
+    for run in results["runs"]:
+        old = previous.get(run["members"])
+        if not old:
+            continue
+        for key, value in run.items():
+            if key.endswith(("_s", "_ms", "_us")) and old.get(key):
+                lines.append(f"{run['members']:>8} {key:<22} {old[key]:>10.4f} → {value:>10.4f} ({value / old[key]:.2f}x)")
+    return lines
+
+def benchmark_cli(argv):
+    """命令行基准测试：--benchmark [--sizes 10000,100000,1000000] [--history 5] [--output 结果.json] [--compare 旧结果.json]"""
+    import argparse
+    parser = argparse.ArgumentParser(description="会员管理系统性能基准")
+    parser.add_argument("--benchmark", action="store_true", help="运行基准测试")
+    parser.add_argument("--sizes", default=",".join(map(str, BENCHMARK_SIZES)), help="会员数量，逗号分隔")
+    parser.add_argument("--history", type=int, default=5, help="每位会员的交易记录条数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="数据文件目录（默认使用临时目录）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的数据文件")
+    parser.add_argument("--output", metavar="文件", help="结果JSON文件（默认输出到标准输出）")
+    parser.add_argument("--compare", metavar="文件", help="与之前的结果JSON对比")
+    args = parser.parse_args(argv)
+    try:
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    except ValueError:
+        parser.error(f"无效的会员数量：{args.sizes}")
+
+    def progress(run):
+        print(f"{run['members']} 位会员：加载 {run['load_s']:.2f}s，完整保存 {run['save_full_s']:.2f}s，"
+              f"导入 {run['import_s']:.2f}s", file=sys.stderr)
+
+    results = run_benchmark(sizes, args.history, args.seed, args.workdir, args.keep, progress)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            for line in compare_benchmarks(json.load(f), results):
+                print(line, file=sys.stderr)
+    return 0
+
+# ------------------------------
+# 会员服务（局域网 HTTP 接口）
+# ------------------------------
+SERVE_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+                 405: "Method Not Allowed", 413: "Payload Too Large", 431: "Request Header Fields Too Large"}
+SERVE_OPERATIONS = ("recharge", "consume", "exchange", "adjust")
+
+class MemberService:
+    """多台收银终端共用一份会员数据的 HTTP/JSON 服务（asyncio，只依赖标准库）
+
+    接口（金额、积分与数据文件一样使用 "12.34" 形式的字符串）：
+      GET  /health                      服务状态
+      GET  /stats                       会员统计
+      GET  /members?phone=手机号         按手机号查找
+      GET  /members?q=关键字&limit=50    搜索
+      GET  /members/{ID}                会员资料
+      GET  /members/{ID}/transactions   交易记录
+      POST /members/{ID}/recharge  {"amount": "100"}
+      POST /members/{ID}/consume   {"amount": "35.5"}
+      POST /members/{ID}/exchange  {"points": "100"}
+      POST /members/{ID}/adjust    {"delta": "-20", "reason": "原因"}
+    每个请求都要在 X-Service-Token 请求头中带上启动服务时设置的口令，否则返回 401。
+    MemberStore 只在事件循环线程中使用，每个余额操作在两次 await 之间完整执行，同一会员的
+    操作因此按到达顺序串行。各终端的变更每隔 batch_interval 合并为一次写入，写入磁盘后才返回。
+    """
+
+    def __init__(self, store, token, host="127.0.0.1", port=SERVE_PORT, batch_interval=SERVE_BATCH_INTERVAL):
+        if not token:
+            raise ValueError("会员服务必须设置口令")
+        self.store = store
+        self.token = token
+        self.host = host
+        self.port = port
+        self.batch_interval = batch_interval
+        self.waiters = []   # 等待下一批写入完成的请求
+        self.server = None
+
+    async def run(self, on_started=None):
+        import asyncio
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        if on_started:
+            on_started(self.server.sockets[0].getsockname())
+        writer = asyncio.ensure_future(self.write_batches())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            writer.cancel()
+            self.store.save()
+            self.store.flush()
+
+    # 批量写入
+    async def write_batches(self):
+        import asyncio
+        last_sync = time.monotonic()
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            self.store.persistence.poll()
+            if self.store.syncing:
+                continue
+            if not self.store.changes and not self.store.needs_full_save:
+                # 界面程序也可能直接写入同一数据文件
+                if time.monotonic() - last_sync >= SYNC_INTERVAL / 1000:
+                    self.store.sync()
+                    last_sync = time.monotonic()
+                continue
+            waiters, self.waiters = self.waiters, []
+            failures = self.store.write_failures
+            try:
+                self.store.save()
+            except ValueError:
+                self.resolve(waiters, False)
+                continue
+            # 写入任务按提交顺序执行：这个空任务完成时，本批变更已写入
+            self.store.submit(lambda: None,
+                              lambda _: self.resolve(waiters, self.store.write_failures == failures))
+
+    @staticmethod
+    def resolve(waiters, saved):
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(saved)
+
+    async def durable(self):
+        """等待当前变更随下一批写入磁盘，返回是否写入成功"""
+        import asyncio
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        return await waiter
+
+    # HTTP
+    async def handle(self, reader, writer):
+        """HTTP/1.1 连接：支持 keep-alive，请求体为 JSON"""
+        import asyncio
+        import hmac
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "无效的请求"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                token = headers.get(SERVE_TOKEN_HEADER.lower(), "")
+                if not hmac.compare_digest(token.encode('latin-1'), self.token.encode('utf-8')):
+                    await self.respond(writer, 401, {"error": "会员服务口令错误"}, False)
+                    break
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= SERVE_MAX_BODY:
+                    await self.respond(writer, 413, {"error": "请求内容过大"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self.dispatch(method, target, body)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ValueError:
+            # readline() 遇到超过缓冲区上限的一行时抛出 ValueError（LimitOverrunError）
+            try:
+                await self.respond(writer, 431, {"error": "请求行或请求头过长"}, False)
+            except ConnectionError:
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write((f"HTTP/1.1 {status} {SERVE_REASONS[status]}\r\n"
+                      f"Content-Type: application/json; charset=utf-8\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        """返回 (状态码, JSON 数据)；参数错误和会员状态不允许的操作返回 400 及提示消息"""
+        url = urllib.parse.urlsplit(target)
+        parts = [urllib.parse.unquote(p) for p in url.path.split('/') if p]
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+        store = self.store
+        try:
+            if parts and parts[0] == "members" and len(parts) > 1 and parts[1] not in store.members:
+                return 404, {"error": f"会员不存在：{parts[1]}"}
+            if method == "GET":
+                if parts == ["health"]:
+                    return 200, {"status": "ok", "members": len(store.members)}
+                if parts == ["stats"]:
+                    total, levels, statuses, balance, points = store.snapshot()
+                    return 200, {"total": total, "levels": levels, "statuses": statuses,
+                                 "balance": from_cents(balance), "points": from_cents(points)}
+                if parts == ["members"] and "phone" in query:
+                    member_id = store.find_by_phone(query["phone"].strip())
+                    if not member_id:
+                        return 404, {"error": f"未找到使用手机号 {query['phone']} 的会员"}
+                    return 200, {"member": store.members[member_id].to_dict(transactions=False)}
+                if parts == ["members"]:
+                    limit = int(query.get("limit") or SERVE_SEARCH_LIMIT)
+                    member_ids = store.search(query.get("q", "").strip().lower())[:max(limit, 0)]
+                    return 200, {"members": [store.members[i].to_dict(transactions=False) for i in member_ids]}
+                if len(parts) == 2 and parts[0] == "members":
+                    return 200, {"member": store.members[parts[1]].to_dict(transactions=False)}
+                if len(parts) == 3 and parts[0] == "members" and parts[2] == "transactions":
+                    return 200, {"transactions": [t.to_dict() for t in store.transactions(parts[1])]}
+            elif method == "POST":
+                if len(parts) == 3 and parts[0] == "members" and parts[2] in SERVE_OPERATIONS:
+                    return await self.operate(parts[1], parts[2], body)
+            else:
+                return 405, {"error": f"不支持的请求方法：{method}"}
+            return 404, {"error": f"未知的请求：{url.path}"}
+        except (ValueError, OverflowError) as e:
+            return 400, {"error": str(e)}
+
+    async def operate(self, member_id, operation, body):
+        try:
+            data = json.loads(body.decode('utf-8')) if body else {}
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise ValueError("请求内容应为 JSON 对象")
+
+        def number(key):
+            # "1e999"、"inf"、超大整数等在解析时就拒绝，不进入余额计算
+            try:
+                return to_cents(data.get(key))
+            except (ValueError, OverflowError):
+                raise ValueError(f"无效的数值：{data.get(key)}") from None
+
+        store = self.store
+        # 校验和修改之间没有 await，其他请求不会插入
+        if operation == "recharge":
+            transaction = store.recharge(member_id, number("amount"))
+        elif operation == "consume":
+            transaction = store.consume(member_id, number("amount"))
+        elif operation == "exchange":
+            transaction = store.exchange_points(member_id, number("points"))
+        else:
+            transaction = store.adjust_points(member_id, number("delta"),
+                                              str(data.get("reason") or "").strip())
+        member = store.members[member_id].to_dict(transactions=False)
+        saved = await self.durable()
+        return 200, {"member": member, "transaction": transaction.to_dict(), "saved": saved}
+
+def serve_cli(argv):
+    """命令行服务模式：--serve [--host 127.0.0.1] [--port 8765] [--data 数据文件] [--token 口令]"""
+    import argparse
+    import asyncio
+    import secrets
+    parser = argparse.ArgumentParser(description="会员管理系统局域网服务")
+    parser.add_argument("--serve", action="store_true", help="启动会员服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（局域网使用 0.0.0.0）")
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--data", metavar="文件", help="数据文件（默认使用界面程序的数据文件）")
+    parser.add_argument("--token", default=os.environ.get(SERVE_TOKEN_ENV),
+                        help=f"收银终端连接时使用的口令（默认读取环境变量 {SERVE_TOKEN_ENV}，都未设置时随机生成）")
+    args = parser.parse_args(argv)
+    token = args.token or secrets.token_urlsafe(16)
+
+    path = args.data
+    if not path:
+        base_dir = os.path.join(os.path.expanduser("~"), "会员系统数据")
+        path = os.path.join(base_dir, "members_data.db")
+        if not os.path.exists(path):
+            path = os.path.join(base_dir, "members_data.json")
+    store = MemberStore(open_storage(path))
+    if store.storage.exists():
+        store.load()
+    service = MemberService(store, token, args.host, args.port)
+
+    def on_started(address):
+        print(f"会员服务已启动：http://{address[0]}:{address[1]}（{len(store.members)} 位会员，数据文件 {path}）",
+              file=sys.stderr)
+        if not args.token:
+            print(f"连接口令：{token}", file=sys.stderr)
+
+    try:
+        asyncio.run(service.run(on_started))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+    return 0
+
+class MemberServiceClient:
+    """收银终端连接会员服务时使用：查询和收银方法与 MemberStore 相同，错误同样抛出 ValueError
+
+    服务返回的会员放入本地 cache（MemberStore，只用于界面显示，不记录变更也不保存）。
+    """
+
+    def __init__(self, url, cache, token, timeout=5):
+        self.url = url.rstrip('/')
+        self.cache = cache
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, method, path, data=None, missing_ok=False):
+        import urllib.request
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8') if data is not None else None
+        request = urllib.request.Request(self.url + path, data=body, method=method,
+                                         headers={"Content-Type": "application/json", SERVE_TOKEN_HEADER: self.token})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            if e.code == 404 and missing_ok:
+                return None
+            try:
+                message = json.loads(e.read().decode('utf-8'))["error"]
+            except (ValueError, KeyError, TypeError):
+                message = f"会员服务错误：HTTP {e.code}"
+            raise ValueError(message)
+        except (urllib.error.URLError, OSError) as e:
+            raise ValueError(f"无法连接会员服务：{getattr(e, 'reason', e)}")
 
-# 打印功能适配（兼容多系统，优先核心问题修复）
-try:
-    import win32print
-    import win32ui
-    from PIL import Image, ImageWin, ImageDraw, ImageFont
-    PRINT_SUPPORTED_WIN = True
-except ImportError:
-    PRINT_SUPPORTED_WIN = False
+    def cache_member(self, data):
+        member = Member.from_dict(data)
+        old = self.cache.members.get(member.id)
+        if old is not None:
+            self.cache.unindex(old)
+        self.cache.insert(member)
+        return member
 
-try:
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4, letter
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
+    def find_by_phone(self, phone, exclude_id=None):
+        result = self.request("GET", "/members?" + urllib.parse.urlencode({"phone": phone}), missing_ok=True)
+        if result is None:
+            return None
+        return self.cache_member(result["member"]).id
+
+    def search(self, keyword):
+        result = self.request("GET", "/members?" + urllib.parse.urlencode({"q": keyword, "limit": SERVE_SEARCH_LIMIT}))
+        return [self.cache_member(data).id for data in result["members"]]
+
+    def snapshot(self):
+        result = self.request("GET", "/stats")
+        return (result["total"], result["levels"], result["statuses"],
+                to_cents(result["balance"]), to_cents(result["points"]))
+
+    def transactions(self, member_id):
+        result = self.request("GET", f"/members/{urllib.parse.quote(member_id)}/transactions")
+        return [Transaction.from_dict(t) for t in result["transactions"]]
+
+    def operate(self, member_id, operation, data):
+        result = self.request("POST", f"/members/{urllib.parse.quote(member_id)}/{operation}", data)
+        self.cache_member(result["member"])
+        return Transaction.from_dict(result["transaction"])
+
+    def recharge(self, member_id, amount):
+        return self.operate(member_id, "recharge", {"amount": from_cents(amount)})
+
+    def consume(self, member_id, amount):
+        return self.operate(member_id, "consume", {"amount": from_cents(amount)})
+
+    def exchange_points(self, member_id, points):
+        return self.operate(member_id, "exchange", {"points": from_cents(points)})
+
+    def adjust_points(self, member_id, delta, reason):
+        return self.operate(member_id, "adjust", {"delta": from_cents(delta), "reason": reason})
+
+# ------------------------------
+# 打印队列
+# ------------------------------
+@functools.lru_cache(maxsize=64)
+def receipt_layout(line_count, top, step, limit=None):
+    """单据版面：每行的 (页码, 纵坐标)，纵坐标越过 limit 时换页；同样行数的单据只计算一次"""
+    positions = []
+    page, y = 0, top
+    for _ in range(line_count):
+        if limit is not None and (y < limit if step < 0 else y > limit):
+            page, y = page + 1, top
+        positions.append((page, y))
+        y += step
+    return tuple(positions)
+
+class PrintJob:
+    """打印任务：status 为 排队中/打印中/重试中/已完成/失败/需预览，字段只在界面线程中修改"""
+
+    FINISHED = ("已完成", "失败", "需预览")
+
+    def __init__(self, job_id, title, lines):
+        self.id = job_id
+        self.title = title
+        self.lines = lines
+        self.status = "排队中"
+        self.attempts = 0
+        self.message = ""
+        self.submitted = datetime.now().strftime("%H:%M:%S")
+
+class PrintSpooler:
+    """后台打印队列：界面线程提交单据后立即返回，打印线程按提交顺序逐个渲染和打印
+
+    每次尝试依次使用 Windows 直接打印、PDF；都失败时等待后重试，最多 retries 次，
+    仍失败或没有可用的打印组件时任务结束为“失败”/“需预览”，由界面显示文本预览。
+    状态变化由界面线程调用 poll() 取回。PDF 中文字体和 Windows 打印字体只创建一次。
+    每个任务从开始打印到结束（含重试）的耗时记入 metrics 的 print.job。
+    """
+
+    def __init__(self, retries=PRINT_RETRIES, retry_delay=PRINT_RETRY_DELAY, metrics=None):
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.metrics = metrics or Metrics()
+        self.jobs = deque(maxlen=PRINT_JOB_HISTORY)
+        self.tasks = queue.Queue()
+        self.updates = queue.Queue()
+        self.pending = 0      # 已提交但尚未结束的任务数（只在界面线程中读写）
+        self.next_id = 1
+        self.pdf_font = None  # 已注册的 PDF 字体名
+        self.win32_font = None   # Windows 打印字体（False 表示黑体不可用）
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, title, lines):
+        job = PrintJob(self.next_id, title, list(lines))
+        self.next_id += 1
+        self.jobs.append(job)
+        self.enqueue(job)
+        return job
+
+    def enqueue(self, job):
+        """提交新任务或重新打印已结束的任务"""
+        job.status, job.attempts, job.message = "排队中", 0, ""
+        self.pending += 1
+        self.tasks.put(job)
+
+    def poll(self):
+        """在界面线程中应用打印线程报告的状态变化，返回状态有变化的任务"""
+        changed = []
+        while True:
+            try:
+                job, status, message, attempts = self.updates.get_nowait()
+            except queue.Empty:
+                return changed
+            job.status, job.message, job.attempts = status, message, attempts
+            if status in PrintJob.FINISHED:
+                self.pending -= 1
+            if job not in changed:
+                changed.append(job)
+
+    def flush(self):
+        """等待已提交的任务全部结束"""
+        self.tasks.join()
+        return self.poll()
+
+    def _run(self):
+        while True:
+            job = self.tasks.get()
+            start = time.perf_counter()
+            try:
+                self._print(job)
+            except Exception as e:
+                self.updates.put((job, "失败", str(e), 0))
+            finally:
+                self.metrics.record("print.job", time.perf_counter() - start)
+                self.tasks.task_done()
+
+    def backends(self):
+        """可用的打印方式（按优先顺序）"""
+        result = []
+        if sys.platform.startswith('win32') and win32_printing_supported():
+            result.append(("Windows打印", self.print_win32))
+        if reportlab_supported():
+            result.append(("PDF打印", self.print_pdf))
+        return result
+
+    def _print(self, job):
+        backends = self.backends()
+        if not backends:
+            self.updates.put((job, "需预览", "未安装打印组件（pywin32 或 reportlab）", 0))
+            return
+        errors = []
+        for attempt in range(1, self.retries + 1):
+            self.updates.put((job, "打印中", "", attempt))
+            for name, render in backends:
+                try:
+                    self.updates.put((job, "已完成", render(job), attempt))
+                    return
+                except Exception as e:
+                    errors.append(f"{name}失败：{str(e)}")
+            if attempt < self.retries:
+                self.updates.put((job, "重试中", errors[-1], attempt))
+                time.sleep(self.retry_delay * attempt)
+        self.updates.put((job, "失败", "；".join(errors[-len(backends):]), self.retries))
+
+    def print_win32(self, job):
+        """Windows 直接打印（黑体，解决中文不显示）"""
+        printer_name = win32print.GetDefaultPrinter()
+        if not printer_name:
+            raise ValueError("未找到默认打印机")
+        try:
+            printer_handle = win32print.OpenPrinter(printer_name)
+            try:
+                printer_status = win32print.GetPrinter(printer_handle, 2)['Status']
+            finally:
+                win32print.ClosePrinter(printer_handle)
+        except Exception:
+            printer_status = 0  # 无法获取状态时继续尝试打印
+        if printer_status != 0:
+            raise ValueError("打印机状态异常，请检查打印机")
+
+        if self.win32_font is None:
+            try:
+                self.win32_font = win32ui.CreateFont({'name': 'SimHei', 'height': 200, 'weight': 400})
+            except Exception:
+                self.win32_font = False  # 黑体不可用时使用默认字体
+        hdc = win32ui.CreateDC()
+        hdc.CreatePrinterDC(printer_name)
+        try:
+            hdc.StartDoc((job.title, None, "RAW"))
+            hdc.StartPage()
+            try:
+                hdc.SetTextColor(0x000000)
+                hdc.SetBkMode(1)  # 透明背景
+                if self.win32_font:
+                    hdc.SelectObject(self.win32_font)
+                lines = [line for line in job.lines if line.strip()]
+                for line, (_, y) in zip(lines, receipt_layout(len(lines), 500, 300)):
+                    try:
+                        hdc.TextOut(500, y, line)
+                    except Exception:
+                        hdc.TextOut(500, y, line.encode('gbk', errors='ignore').decode('gbk'))
+                hdc.EndPage()
+            finally:
+                hdc.EndDoc()
+        finally:
+            hdc.DeleteDC()
+        return f"已发送到打印机：{printer_name}"
+
+    def pdf_font_name(self):
+        """注册第一个可用的中文字体（只注册一次），没有时使用 Helvetica"""
+        if self.pdf_font is None:
+            self.pdf_font = "Helvetica"
+            for font_path in PDF_FONT_PATHS:
+                if os.path.exists(font_path):
+                    try:
+                        font_name = os.path.splitext(os.path.basename(font_path))[0]
+                        pdfmetrics.registerFont(TTFont(font_name, font_path))
+                        self.pdf_font = font_name
+                        break
+                    except Exception:
+                        continue
+        return self.pdf_font
+
+    def print_pdf(self, job):
+        """生成 PDF：Windows 直接发送到打印机，其他系统用默认程序打开后手动打印"""
+        path = os.path.join(tempfile.gettempdir(), f"print_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job.id}.pdf")
+        c = canvas.Canvas(path, pagesize=letter)
+        width, height = letter
+        font_name = self.pdf_font_name()
+        c.setFont(font_name, 12)
+        page = 0
+        for line, (line_page, y) in zip(job.lines, receipt_layout(len(job.lines), height - 100, -20, 100)):
+            if line_page != page:
+                c.showPage()
+                c.setFont(font_name, 12)
+                page = line_page
+            c.drawString(100, y, line)
+        c.save()
+        return self.open_pdf(path)
+
+    @staticmethod
+    def open_pdf(path):
+        """打开 PDF 不等待外部程序结束；打不开时只保留文件"""
+        import subprocess
+        try:
+            if sys.platform.startswith('win32'):
+                os.startfile(path, "print")
+                return f"PDF已发送到打印机：{path}"
+            subprocess.Popen(["xdg-open" if sys.platform.startswith('linux') else "open", path],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return f"已生成PDF，请在打开的窗口中打印：{path}"
+        except OSError:
+            return f"已生成PDF，请手动打开文件打印：{path}"
 
 class MembershipSystem:
     def __init__(self, root):
@@ -41,17 +3823,14 @@ class MembershipSystem:
         
         # 系统配置
         self.config = {
-            "level_rules": {
-                "普通会员": 0,
-                "白银会员": 1000,
-                "黄金会员": 5000,
-                "钻石会员": 20000
-            },
-            "points_rate": 0.1,
-            "points_exchange_rate": 100,
+            **MemberStore.default_config(),
             "auto_save_interval": 300,
+            "storage_engine": "json",
+            "backup_retention": {"recent": 10, "hourly": 24, "daily": 30, "weekly": 12},
             "birthday_reminder_days": 7,
-            "auto_import_path": os.path.join(os.path.expanduser("~"), "会员系统自动导入")
+            "auto_import_path": os.path.join(os.path.expanduser("~"), "会员系统自动导入"),
+            "service_url": f"http://127.0.0.1:{SERVE_PORT}",
+            "service_token": os.environ.get(SERVE_TOKEN_ENV, "")
         }
         
         # 创建自动导入目录
@@ -68,24 +3847,64 @@ class MembershipSystem:
         self.base_dir = os.path.join(os.path.expanduser("~"), "会员系统数据")
         os.makedirs(self.base_dir, exist_ok=True)
         self.default_file_path = os.path.join(self.base_dir, "members_data.json")
+        self.default_db_path = os.path.join(self.base_dir, "members_data.db")
         self.backup_dir = os.path.join(self.base_dir, "备份")
         os.makedirs(self.backup_dir, exist_ok=True)
-        
-        # 核心数据
-        self.members = {}
-        self.current_file = self.default_file_path
+        self.backups = BackupManager(self.backup_dir, self.config["backup_retention"])
+        
+        # 性能统计：各操作耗时，定期写入滚动日志；可选 cProfile 分析界面线程
+        self.metrics = Metrics()
+        self.metrics_log_path = os.path.join(self.base_dir, "性能日志.jsonl")
+        self.profiler = None
+        
+        # 核心数据（会员、索引、变更和持久化）在 MemberStore 中，界面只负责显示和交互
+        self.store = MemberStore(self.open_storage(self.default_data_path()), self.config, self.metrics)
+        self.store.on_submit = self.watch_persistence
+        self.store.on_commit = self.backups.mark_changed
+        self.store.on_write_error = self.show_write_error
+        self.store.on_sync = self.show_synced_members
+        self.store.on_conflict = self.show_sync_conflicts
+        # 查询和收银经由 service：本地使用时即 store，连接会员服务后为 MemberServiceClient
+        self.service = self.store
+        self.search_after_id = None
+        self.last_search_keyword = ""
+        # 会员列表只显示当前页：view_ids 为当前视图（全部会员或搜索结果）的ID顺序，
+        # view_set 为同样的ID集合，用于判断会员是否在视图中
+        self.view_ids = []
+        self.view_set = set()
+        self.view_all = True
+        self.page = 0
+        self.current_file = self.store.storage.path
         self.last_save_time = 0
         self.logged_in = False
-        self.auto_imported_files = set()
+        self.import_ledger = ImportLedger(os.path.join(self.base_dir, "自动导入记录.jsonl"))
+        self.import_watcher = None
+        self.auto_import_queue = []      # 等待导入的 (文件路径, 内容哈希)
+        self.auto_import_digests = set()  # 本次运行已排队或已导入的内容哈希
+        self.importing = False
+        self.committing_import = False
+        self.last_save_summary = ""
+        self.last_backup_version = None
+        self.loading = False
+        self.load_generation = 0
+        self.data_ready = False
+        self.printer = None               # 打印队列（首次打印时创建）
+        self.print_queue_refresh = None   # 打印队列窗口打开时刷新该窗口
         
         # 初始化界面
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
         # 启动自动任务
         self.start_auto_tasks()
+        self.refresh_summary()
+        self.root.after(SYNC_INTERVAL, self.sync_storage)
         
-        # 邀请码验证（20130618）
+        # 邀请码验证（20130618）；验证期间在后台加载数据，登录前不显示会员列表
         self.verify_invitation_code()
+        self.load_default_data(on_loaded=self.on_data_ready)
+        self.metrics.record("startup.window", time.perf_counter() - STARTUP_BEGIN)
+        self.root.after_idle(lambda: self.metrics.record("startup.usable", time.perf_counter() - STARTUP_BEGIN))
     
     # ------------------------------
     # 邀请码验证
@@ -118,82 +3937,174 @@ class MembershipSystem:
         if input_code == correct_code:
             self.logged_in = True
             window.destroy()
-            self.load_default_data()
-            self.check_birthday_reminders()
-            self.auto_import_members()
+            self.render_page()
+            if self.data_ready:
+                self.after_data_loaded()
         else:
             messagebox.showerror("错误", "邀请码不正确（正确邀请码：20130618）")
     
+    def on_data_ready(self):
+        """启动时的数据加载完成（可能早于验证通过）"""
+        if not self.data_ready:
+            self.metrics.record("startup.data", time.perf_counter() - STARTUP_BEGIN)
+        self.data_ready = True
+        if self.logged_in:
+            self.after_data_loaded()
+    
+    def after_data_loaded(self):
+        self.check_birthday_reminders()
+        self.auto_import_members()
+    
     # ------------------------------
     # 自动导入会员
     # ------------------------------
     def start_auto_tasks(self):
         self.auto_save()
-        self.check_auto_import()
+        self.write_metrics_log()
         self.root.after(60000, self.start_auto_tasks)
     
+    def start_import_watcher(self):
+        """开始监视自动导入目录；新文件由监视线程发现并计算哈希，界面线程只负责排队导入"""
+        if self.import_watcher is None:
+            self.import_watcher = ImportWatcher(self.config["auto_import_path"], self.import_ledger)
+            self.root.after(AUTO_IMPORT_POLL_INTERVAL, self.poll_auto_import)
+    
     def check_auto_import(self):
-        if not self.logged_in:
+        """重新检查自动导入目录中的全部文件"""
+        if self.import_watcher is None:
+            self.start_import_watcher()
+        else:
+            self.import_watcher.request_scan()
+    
+    def poll_auto_import(self):
+        """领取监视线程发现的文件，空闲时逐个导入（一个文件导入完成后再导入下一个）"""
+        if self.import_watcher.stopped.is_set():
             return
-            
-        try:
-            for filename in os.listdir(self.config["auto_import_path"]):
-                if filename.endswith(".json") and filename not in self.auto_imported_files:
-                    file_path = os.path.join(self.config["auto_import_path"], filename)
-                    if self.import_single_file(file_path):
-                        self.auto_imported_files.add(filename)
-                        self.status_bar_var.set(f"自动导入成功：{filename}")
-        except Exception as e:
-            self.status_bar_var.set(f"自动导入错误：{str(e)}")
+        while True:
+            try:
+                path, digest = self.import_watcher.ready.get_nowait()
+            except queue.Empty:
+                break
+            if digest not in self.auto_import_digests and digest not in self.import_ledger:
+                self.auto_import_digests.add(digest)
+                self.auto_import_queue.append((path, digest))
+        if (self.auto_import_queue and self.logged_in and not self.loading and not self.importing and
+                self.service is self.store):
+            self.import_next_auto_file()
+        self.root.after(AUTO_IMPORT_POLL_INTERVAL, self.poll_auto_import)
     
-    def import_single_file(self, file_path):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            imported_members = data.get('members', {})
-            
-            if not imported_members:
-                return False
-            
-            success = 0
-            existing_phones = {m['phone'] for m in self.members.values() if m['status'] != "已注销"}
-            
-            for member in imported_members.values():
-                if not member.get('name') or not member.get('phone'):
-                    continue
-                
-                if member['phone'] in existing_phones:
-                    continue
-                
-                if not re.match(r'^1[3-9]\d{9}$', member['phone'].strip()):
-                    continue
-                
-                new_member = {
-                    'id': self.generate_member_id(),
-                    'name': member.get('name', '').strip(),
-                    'phone': member.get('phone', '').strip(),
-                    'birthday': member.get('birthday', ''),
-                    'level': member.get('level', '普通会员'),
-                    'balance': member.get('balance', '0.00'),
-                    'points': member.get('points', '0.00'),
-                    'total_spent': member.get('total_spent', '0.00'),
-                    'status': member.get('status', '正常'),
-                    'created_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'transactions': member.get('transactions', [])
-                }
-                
-                self.members[new_member['id']] = new_member
-                existing_phones.add(new_member['phone'])
-                success += 1
-            
-            if success > 0:
-                self.refresh_member_list()
-                self.save_file(manual=True)
-                return True
-            return False
-        except Exception as e:
-            self.status_bar_var.set(f"导入文件错误：{str(e)}")
-            return False
+    def import_next_auto_file(self):
+        file_path, digest = self.auto_import_queue.pop(0)
+        filename = os.path.basename(file_path)
+        
+        def on_finished(success, rejected, report_path):
+            # 记录排在本次导入的保存任务之后写入，程序中途退出时文件会在下次启动时重新检查
+            self.submit_persistence(lambda: self.import_ledger.record(digest, filename, success, len(rejected)),
+                                    on_error=lambda e: self.status_bar_var.set(f"自动导入记录写入失败：{str(e)}"))
+            self.status_bar_var.set(f"自动导入完成：{filename}，成功{success}人，跳过{len(rejected)}人")
+        
+        def on_failed(e):
+            # 文件内容变化或手动检查时重试
+            self.auto_import_digests.discard(digest)
+            self.status_bar_var.set(f"导入文件错误：{filename}：{str(e)}")
+        
+        self.bulk_import(file_path, on_finished, on_failed)
+    
+    def bulk_import(self, file_path, on_finished, on_failed):
+        """批量导入：工作线程流式读取并校验，界面线程分批加入会员，全部加入后保存一次
+
+        on_finished(成功人数, 拒绝明细, 明细文件路径) / on_failed(异常) 在界面线程中回调。
+        """
+        self.importing = True
+        self.import_started = time.perf_counter()
+        levels = set(self.config["level_rules"])
+        created_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        messages = queue.Queue()
+        
+        def worker():
+            try:
+                accepted = []
+                rejected = []
+                for row, data in iter_import_rows(file_path):
+                    member, reason = normalize_import_row(data, levels, created_time)
+                    if member:
+                        accepted.append((row, member))
+                    else:
+                        rejected.append(import_rejection(row, data, reason))
+                    if (len(accepted) + len(rejected)) % Storage.LOAD_BATCH == 0:
+                        messages.put(("progress", len(accepted) + len(rejected)))
+                messages.put(("done", accepted, rejected))
+            except Exception as e:
+                messages.put(("error", e))
+        
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(LOAD_POLL_INTERVAL, self.poll_import, messages, file_path, self.load_generation,
+                        on_finished, on_failed)
+    
+    def poll_import(self, messages, file_path, generation, on_finished, on_failed):
+        if generation != self.load_generation:
+            self.importing = False
+            self.status_bar_var.set(f"已取消导入：{os.path.basename(file_path)}（数据已重新加载）")
+            return
+        while True:
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                self.status_bar_var.set(f"正在导入 {os.path.basename(file_path)}：已读取 {message[1]} 条")
+            elif message[0] == "error":
+                self.importing = False
+                on_failed(message[1])
+                return
+            else:
+                self.commit_import(file_path, message[1], message[2], generation, on_finished)
+                return
+        self.root.after(LOAD_POLL_INTERVAL, self.poll_import, messages, file_path, generation,
+                        on_finished, on_failed)
+    
+    def commit_import(self, file_path, accepted, rejected, generation, on_finished,
+                      position=0, seen=None, success=0):
+        """分批把校验通过的会员加入内存（每次最多占用 LOAD_POLL_BUDGET），去重后统一保存一次"""
+        if generation != self.load_generation:
+            self.importing = self.committing_import = False
+            self.status_bar_var.set(f"已取消导入：{os.path.basename(file_path)}（数据已重新加载）")
+            return
+        if seen is None:
+            seen = set()
+        # 提交期间暂停保存，全部加入后作为一批写入
+        self.committing_import = True
+        deadline = time.perf_counter() + LOAD_POLL_BUDGET
+        while position < len(accepted) and time.perf_counter() < deadline:
+            rows = accepted[position:position + IMPORT_BATCH_SIZE]
+            position += len(rows)
+            added, skipped = self.store.import_batch(rows, seen)
+            success += len(added)
+            rejected.extend(skipped)
+        
+        if position < len(accepted):
+            self.status_bar_var.set(f"正在导入 {os.path.basename(file_path)}：{position}/{len(accepted)}")
+            self.root.after(LOAD_POLL_INTERVAL, self.commit_import, file_path, accepted, rejected,
+                            generation, on_finished, position, seen, success)
+            return
+        
+        self.importing = self.committing_import = False
+        self.metrics.record("import", time.perf_counter() - self.import_started)
+        if success:
+            self.refresh_member_list()
+            self.save_file(manual=True)
+        report_path = None
+        if rejected:
+            rejected.sort()
+            name = os.path.splitext(os.path.basename(file_path))[0]
+            report_path = os.path.join(self.base_dir, "导入报告",
+                                       f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            try:
+                write_import_report(report_path, rejected)
+            except Exception as e:
+                self.status_bar_var.set(f"导入明细写入失败：{str(e)}")
+                report_path = None
+        on_finished(success, rejected, report_path)
     
     def manual_auto_import(self):
         if not self.logged_in:
@@ -201,262 +4112,146 @@ class MembershipSystem:
             return
             
         self.check_auto_import()
-        messagebox.showinfo("提示", "已完成自动导入目录检查")
+        messagebox.showinfo("提示", "已开始检查自动导入目录，新文件的导入结果将在状态栏显示")
     
     # ------------------------------
     # 打印功能（核心修复部分）
     # ------------------------------
+    @instrumented("print_receipt")
     def print_receipt(self, receipt_type="transaction"):
         """打印单据（交易凭证/会员信息）- 修复版"""
         member_id = self.id_var.get()
-        if not member_id or member_id not in self.members:
+        if not member_id or member_id not in self.store.members:
             messagebox.showerror("错误", "请先选择会员")
             return
         
-        member = self.members[member_id]
+        member = self.store.members[member_id]
         
         # 生成打印内容
         if receipt_type == "transaction":
-            if not member['transactions']:
+            transactions = self.service.transactions(member_id)
+            if not transactions:
                 messagebox.showinfo("提示", "该会员暂无交易记录可打印")
                 return
             
-            last_trans = member['transactions'][-1]
+            last_trans = transactions[-1]
             content = [
                 "=" * 30,
                 "      会员交易凭证",
                 "=" * 30,
-                f"会员ID: {member['id']}",
-                f"会员姓名: {member['name']}",
-                f"手机号: {member['phone']}",
-                f"会员等级: {member['level']}",
+                f"会员ID: {member.id}",
+                f"会员姓名: {member.name}",
+                f"手机号: {member.phone}",
+                f"会员等级: {member.level}",
                 "-" * 30,
-                f"交易时间: {last_trans['time']}",
-                f"交易类型: {last_trans['action']}",
-                f"交易金额: ¥{last_trans['amount']}",
-                f"积分变化: {last_trans['points_change']}",
-                f"余额剩余: ¥{last_trans['balance_after']}",
+                f"交易时间: {last_trans.time}",
+                f"交易类型: {last_trans.action}",
+                f"交易金额: ¥{from_cents(last_trans.amount)}",
+                f"积分变化: {from_cents(last_trans.points_change)}",
+                f"余额剩余: ¥{from_cents(last_trans.balance_after)}",
                 "-" * 30,
                 "感谢您的光临！",
                 f"打印时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
                 "=" * 30
             ]
-            title = f"{member['name']}的交易凭证"
+            title = f"{member.name}的交易凭证"
         
         elif receipt_type == "member_info":
             content = [
                 "=" * 30,
                 "      会员信息详情",
                 "=" * 30,
-                f"会员ID: {member['id']}",
-                f"会员姓名: {member['name']}",
-                f"手机号: {member['phone']}",
-                f"生日: {member['birthday'] or '未设置'}",
-                f"会员等级: {member['level']}",
-                f"累计消费: ¥{member['total_spent']}",
+                f"会员ID: {member.id}",
+                f"会员姓名: {member.name}",
+                f"手机号: {member.phone}",
+                f"生日: {member.birthday or '未设置'}",
+                f"会员等级: {member.level}",
+                f"累计消费: ¥{from_cents(member.total_spent)}",
                 "-" * 30,
-                f"当前余额: ¥{member['balance']}",
-                f"当前积分: {member['points']}",
-                f"会员状态: {member['status']}",
-                f"注册时间: {member['created_time']}",
+                f"当前余额: ¥{from_cents(member.balance)}",
+                f"当前积分: {from_cents(member.points)}",
+                f"会员状态: {member.status}",
+                f"注册时间: {member.created_time}",
                 "-" * 30,
                 f"打印时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
                 "=" * 30
             ]
-            title = f"{member['name']}的会员信息"
+            title = f"{member.name}的会员信息"
         
         else:
             return
         
-        # 尝试多种打印方式（优先级：Windows直接打印 > PDF打印 > 文本预览）
-        print_success = False
+        # 交给后台打印队列（Windows直接打印 > PDF打印，失败时显示文本预览），收银可以继续
+        job = self.print_spooler().submit(title, content)
+        self.status_bar_var.set(f"打印任务 #{job.id} 已加入队列：{title}")
+        return job
+    
+    def print_spooler(self):
+        """首次打印时启动打印线程"""
+        if self.printer is None:
+            self.printer = PrintSpooler(metrics=self.metrics)
+        if not self.printer.pending:
+            self.root.after(PRINT_POLL_INTERVAL, self.poll_printing)
+        return self.printer
+    
+    def poll_printing(self):
+        """在状态栏显示打印任务的进度；打印失败或无法打印的单据显示文本预览"""
+        for job in self.printer.poll():
+            if job.status == "已完成":
+                self.status_bar_var.set(f"打印任务 #{job.id} 已完成：{job.message}")
+            elif job.status == "重试中":
+                self.status_bar_var.set(f"打印任务 #{job.id} 第 {job.attempts} 次失败，稍后重试：{job.message}")
+            elif job.status in ("失败", "需预览"):
+                self.status_bar_var.set(f"打印任务 #{job.id} {job.status}：{job.message}")
+                self.print_with_text('\n'.join(job.lines), job.title)
+        if self.print_queue_refresh:
+            self.print_queue_refresh()
+        if self.printer.pending:
+            self.root.after(PRINT_POLL_INTERVAL, self.poll_printing)
+    
+    def show_print_queue(self):
+        """打印队列：最近的打印任务及状态，可重新打印已结束的任务"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("打印队列")
+        dialog.geometry("640x360")
+        dialog.transient(self.root)
         
-        # 1. Windows系统专用打印（修复中文显示和打印失败问题）
-        if sys.platform.startswith('win32') and PRINT_SUPPORTED_WIN:
-            print_success = self.print_with_win32('\n'.join(content), title)
+        columns = ("编号", "单据", "提交时间", "状态", "尝试次数", "说明")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings", height=10)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width={"单据": 140, "说明": 220}.get(col, 60))
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
-        # 2. 生成PDF打印（跨平台兼容方案）
-        if not print_success and REPORTLAB_AVAILABLE:
-            print_success = self.print_with_pdf('\n'.join(content), title)
+        def refresh():
+            tree.delete(*tree.get_children())
+            if self.printer is None:
+                return
+            for job in reversed(self.printer.jobs):
+                tree.insert("", tk.END, iid=str(job.id), values=(
+                    job.id, job.title, job.submitted, job.status, job.attempts, job.message))
         
-        # 3. 文本预览模式（保底方案）
-        if not print_success:
-            self.print_with_text('\n'.join(content), title)
-            print_success = True  # 预览模式视为成功
+        def reprint():
+            selection = tree.selection()
+            if not selection or self.printer is None:
+                return
+            job = next((job for job in self.printer.jobs if str(job.id) == selection[0]), None)
+            if job is None or job.status not in PrintJob.FINISHED:
+                return
+            self.print_spooler().enqueue(job)
+            refresh()
         
-        return print_success
-
-    def print_with_win32(self, content, title):
-        """Windows系统打印（修复版）- 解决中文不显示和打印失败"""
-        try:
-            # 获取默认打印机
-            printer_name = win32print.GetDefaultPrinter()
-            if not printer_name:
-                self.status_bar_var.set("未找到默认打印机")
-                return False
-            
-            # 创建打印机设备上下文
-            hdc = win32ui.CreateDC()
-            hdc.CreatePrinterDC(printer_name)
-            
-            # 检查打印机状态
-            try:
-                printer_handle = win32print.OpenPrinter(printer_name)
-                printer_info = win32print.GetPrinter(printer_handle, 2)
-                if printer_info['Status'] != 0:
-                    self.status_bar_var.set("打印机状态异常，请检查打印机")
-                    win32print.ClosePrinter(printer_handle)
-                    return False
-                win32print.ClosePrinter(printer_handle)
-            except:
-                pass  # 如果无法获取状态，继续尝试打印
-            
-            # 开始打印作业
-            doc_info = (title, None, "RAW")
-            job_id = hdc.StartDoc(doc_info)
-            hdc.StartPage()
-
-            try:
-                # 设置文本格式
-                hdc.SetTextColor(0x000000)  # 黑色
-                hdc.SetBkMode(1)  # 透明背景
-                
-                # 使用系统字体（支持中文）
-                try:
-                    font = win32ui.CreateFont({
-                        'name': 'SimHei',  # 黑体
-                        'height': 200,     # 字体高度
-                        'weight': 400,     # 正常粗细
-                    })
-                    hdc.SelectObject(font)
-                except:
-                    # 如果黑体不可用，使用默认字体
-                    pass
-                
-                # 打印内容
-                lines = content.split('\n')
-                y_position = 500  # 起始位置
-                line_height = 300  # 行高
-                
-                for line in lines:
-                    if line.strip():  # 跳过空行
-                        try:
-                            # 尝试直接打印
-                            hdc.TextOut(500, y_position, line)
-                        except:
-                            try:
-                                # 如果默认编码失败，尝试GBK编码
-                                line_gbk = line.encode('gbk', errors='ignore').decode('gbk', errors='ignore')
-                                hdc.TextOut(500, y_position, line_gbk)
-                            except:
-                                # 最后尝试UTF-8
-                                try:
-                                    line_utf8 = line.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
-                                    hdc.TextOut(500, y_position, line_utf8)
-                                except:
-                                    # 如果所有编码都失败，跳过该行
-                                    pass
-                        
-                        y_position += line_height
-                
-                hdc.EndPage()
-                hdc.EndDoc()
-                
-                messagebox.showinfo("成功", "打印任务已发送到打印机")
-                return True
-                
-            except Exception as e:
-                try:
-                    hdc.EndDoc()
-                except:
-                    pass
-                raise e
-                
-        except Exception as e:
-            error_msg = f"Windows打印失败：{str(e)}"
-            self.status_bar_var.set(error_msg)
-            return False
-
-    def print_with_pdf(self, content, title):
-        """PDF打印方案（跨平台兼容）- 增强版"""
-        try:
-            # 创建临时PDF文件
-            temp_pdf = os.path.join(tempfile.gettempdir(), f"print_{int(time.time())}.pdf")
-            
-            # 创建PDF文档
-            c = canvas.Canvas(temp_pdf, pagesize=letter)
-            width, height = letter
-            
-            # 设置字体（尝试多种中文字体）
-            fonts_tried = []
-            try:
-                # 尝试注册中文字体
-                font_paths = [
-                    "C:/Windows/Fonts/simhei.ttf",  # 黑体
-                    "C:/Windows/Fonts/simsun.ttc",  # 宋体
-                    "C:/Windows/Fonts/msyh.ttc",    # 微软雅黑
-                ]
-                
-                font_registered = False
-                for font_path in font_paths:
-                    if os.path.exists(font_path):
-                        try:
-                            font_name = os.path.basename(font_path).split('.')[0]
-                            pdfmetrics.registerFont(TTFont(font_name, font_path))
-                            c.setFont(font_name, 12)
-                            font_registered = True
-                            break
-                        except:
-                            continue
-                
-                if not font_registered:
-                    # 使用默认字体
-                    c.setFont("Helvetica", 12)
-            except:
-                c.setFont("Helvetica", 12)
-            
-            # 绘制内容
-            y_position = height - 100
-            line_height = 20
-            
-            for line in content.split('\n'):
-                if y_position < 100:  # 如果页面不够，创建新页面
-                    c.showPage()
-                    y_position = height - 100
-                    try:
-                        if font_registered:
-                            c.setFont(font_name, 12)
-                        else:
-                            c.setFont("Helvetica", 12)
-                    except:
-                        c.setFont("Helvetica", 12)
-                
-                c.drawString(100, y_position, line)
-                y_position -= line_height
-            
-            c.save()
-            
-            # 尝试自动打开PDF（用户可手动打印）
-            try:
-                if sys.platform.startswith('win32'):
-                    os.startfile(temp_pdf, "print")  # Windows直接发送打印
-                    messagebox.showinfo("成功", f"PDF文件已发送到打印机\n文件路径：{temp_pdf}")
-                else:
-                    # macOS/Linux打开PDF让用户手动打印
-                    if sys.platform.startswith('linux'):
-                        os.system(f'xdg-open "{temp_pdf}"')
-                    else:
-                        os.system(f'open "{temp_pdf}"')
-                    messagebox.showinfo("成功", f"已生成PDF文件，请手动打印\n文件路径：{temp_pdf}")
-                return True
-            except Exception as e:
-                # 如果自动打印失败，只生成文件
-                messagebox.showinfo("成功", f"已生成PDF文件：{temp_pdf}\n请手动打开文件进行打印")
-                return True
-                
-        except Exception as e:
-            self.status_bar_var.set(f"PDF打印失败：{str(e)}")
-            return False
+        def close():
+            self.print_queue_refresh = None
+            dialog.destroy()
+        
+        self.print_queue_refresh = refresh
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(pady=10)
+        ttk.Button(btn_frame, text="重新打印", command=reprint).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="关闭", command=close).pack(side=tk.LEFT, padx=10)
+        refresh()
 
     def print_with_text(self, content, title):
         """文本预览模式（保底方案）- 优化用户体验"""
@@ -519,56 +4314,356 @@ class MembershipSystem:
         if not self.logged_in:
             return
         
+        # 只有存在未保存的变更时才写盘，数据有变化时才备份
         current_time = time.time()
-        if current_time - self.last_save_time > self.config["auto_save_interval"] and self.members:
-            if self.save_file():
+        if current_time - self.last_save_time > self.config["auto_save_interval"]:
+            if self.store.changes:
+                self.save_file(on_saved=lambda: self.status_bar_var.set(
+                    f"自动保存成功（{datetime.now().strftime('%H:%M:%S')}）{self.last_save_summary}"))
                 self.last_save_time = current_time
-                self.status_bar_var.set(f"自动保存成功（{datetime.now().strftime('%H:%M:%S')}）")
-    
-    def save_file(self, manual=False):
-        try:
-            for member_id, member in self.members.items():
-                if not member.get('name') or not member.get('phone'):
-                    raise ValueError(f"会员 {member_id} 缺少姓名或手机号")
-                if not re.match(r'^1[3-9]\d{9}$', member['phone']):
-                    raise ValueError(f"会员 {member_id} 手机号格式错误")
-            
-            data = {
-                'members': self.members,
-                'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'version': "1.17.95"
-            }
-            
-            with open(self.current_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-            
             self.create_backup()
-            
+
+    def default_data_path(self):
+        """默认数据文件：已启用SQLite存储（或已存在数据库）时使用 .db 文件"""
+        if self.config["storage_engine"] == "sqlite" or os.path.exists(self.default_db_path):
+            return self.default_db_path
+        return self.default_file_path
+
+    def open_storage(self, path, seq=0):
+        return open_storage(path, self.config["journal_compact_threshold"], seq)
+
+    def switch_storage(self, storage):
+        self.store.switch_storage(storage)
+        self.current_file = storage.path
+        self.backups.invalidate()
+        self.last_backup_version = None
+
+    @instrumented("save_file")
+    def save_file(self, manual=False, on_saved=None):
+        """保存变更集：无变更时跳过，否则由 MemberStore 交给后台线程写入
+
+        返回 False 表示未能提交（加载中、导入提交中或校验失败）。写入结果在后台完成后显示在状态栏，
+        写入失败时下次保存改为写入完整数据，内存中的数据不会丢失。
+        """
+        if self.loading or self.committing_import:
+            return False
+        # 连接会员服务时数据由服务保存，本地只有显示用的缓存
+        if self.service is not self.store:
+            return True
+        if not self.store.changes and not self.store.needs_full_save:
             if manual:
-                self.status_bar_var.set(f"已保存至 {os.path.basename(self.current_file)}")
+                self.status_bar_var.set("没有需要保存的更改")
             return True
+
+        start = time.perf_counter()
+        file_name = os.path.basename(self.current_file)
+        failures = self.store.write_failures
+        count = len(self.store.changes)
+
+        def on_done():
+            # 写入失败时保留状态栏中的错误提示
+            if self.store.write_failures != failures:
+                return
+            elapsed = (time.perf_counter() - start) * 1000
+            self.last_save_summary = f"（{count} 条记录，{elapsed:.1f} ms）"
+            if on_saved:
+                on_saved()
+            elif manual:
+                self.status_bar_var.set(f"已保存至 {file_name}{self.last_save_summary}")
+
+        try:
+            count, full = self.store.save(on_done)
         except Exception as e:
             msg = f"保存失败：{str(e)}"
             self.status_bar_var.set(msg)
             if manual:
                 messagebox.showerror("保存错误", msg)
             return False
-    
+        if full:
+            self.create_backup()
+        if self.store.save_pending and manual:
+            self.status_bar_var.set("正在合并其他终端的修改，完成后自动保存…")
+        return True
+
+    def submit_persistence(self, func, on_done=None, on_error=None):
+        self.store.submit(func, on_done, on_error)
+
+    def watch_persistence(self):
+        """有任务提交时开始轮询后台写入结果"""
+        if not self.store.persistence.pending:
+            self.root.after(SAVE_POLL_INTERVAL, self.poll_persistence)
+
+    def show_write_error(self, e):
+        self.status_bar_var.set(f"保存失败：{str(e)}（将在下次保存时重试）")
+
+    def poll_persistence(self):
+        self.store.persistence.poll()
+        if self.store.persistence.pending:
+            self.root.after(SAVE_POLL_INTERVAL, self.poll_persistence)
+
+    def flush_persistence(self):
+        self.store.flush()
+
+    def sync_storage(self):
+        """定时读取其他终端写入同一数据文件的变更"""
+        if not self.loading and not self.committing_import and self.service is self.store:
+            self.store.sync()
+        self.root.after(SYNC_INTERVAL, self.sync_storage)
+
+    def show_synced_members(self, member_ids):
+        """其他终端的变更已合并到内存：更新列表中对应的行和当前显示的会员"""
+        removed = []
+        for member_id in member_ids:
+            if member_id not in self.store.members:
+                removed.append(member_id)
+            elif self.tree.exists(member_id):
+                self.update_member_row(member_id)
+            elif self.view_all and member_id not in self.view_set:
+                self.append_member_row(member_id)
+        self.remove_member_rows(removed)
+        member_id = self.id_var.get()
+        if member_id in member_ids and member_id in self.store.members:
+            member = self.store.members[member_id]
+            self.level_var.set(member.level)
+            self.balance_var.set(from_cents(member.balance))
+            self.points_var.set(from_cents(member.points))
+
+    def show_sync_conflicts(self, messages):
+        self.status_bar_var.set(messages[-1])
+        messagebox.showwarning("与其他终端的修改冲突", "\n".join(messages))
+
+    @instrumented("create_backup")
     def create_backup(self):
-        try:
-            backup_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = os.path.join(self.backup_dir, f"backup_{backup_time}.json")
-            
-            with open(self.current_file, 'r', encoding='utf-8') as f_in, \
-                 open(backup_path, 'w', encoding='utf-8') as f_out:
-                f_out.write(f_in.read())
-            
-            backups = sorted(os.listdir(self.backup_dir), reverse=True)
-            if len(backups) > 10:
-                for old_backup in backups[10:]:
-                    os.remove(os.path.join(self.backup_dir, old_backup))
-        except Exception as e:
+        if self.loading or self.service is not self.store:
+            return
+        # 数据自上次备份后没有变化时跳过；只写入变化的会员对象和一个清单
+        if self.last_backup_version == self.store.data_version:
+            return
+        storage = self.store.storage
+        backups = self.backups
+        members, changed = backups.snapshot(self.store.members)
+        
+        def backup():
+            # 数据文件尚未写入过时不备份
+            if storage.exists():
+                backups.create(storage.with_transactions(members), changed)
+        
+        def on_error(e):
+            # 未写入的变更留待下次备份
+            backups.mark_changed(changed)
+            self.last_backup_version = None
             self.status_bar_var.set(f"备份失败：{str(e)}")
+        
+        self.last_backup_version = self.store.data_version
+        self.submit_persistence(self.metrics.wrap("backup.write", backup), on_error=on_error)
+    
+    def on_closing(self):
+        """退出前保存未写入的变更，并等待后台写入完成"""
+        saved = True
+        if self.loading:
+            self.cancel_loading()
+        else:
+            saved = self.save_file()
+        self.write_metrics_log()
+        self.flush_persistence()
+        if (not saved or self.store.needs_full_save) and not messagebox.askyesno("保存失败", "部分数据未能保存，是否仍要退出？"):
+            return
+        if self.printer is not None and self.printer.pending and not messagebox.askyesno(
+                "打印未完成", f"还有 {self.printer.pending} 个打印任务未完成，是否仍要退出？"):
+            return
+        if self.import_watcher is not None:
+            self.import_watcher.stop()
+        if self.profiler is not None:
+            self.stop_profiling()
+        self.store.storage.close()
+        self.root.destroy()
+    
+    def show_restore_dialog(self):
+        """从备份恢复：列出保留的时间点，恢复后作为当前数据完整保存"""
+        if not self.ensure_local():
+            return
+        manifests = self.backups.list_manifests()
+        if not manifests:
+            messagebox.showinfo("提示", "暂无可恢复的备份")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("从备份恢复")
+        dialog.geometry("420x360")
+        dialog.transient(self.root)
+        
+        ttk.Label(dialog, text="选择要恢复的时间点：", font=("SimHei", 10)).pack(pady=5)
+        listbox = tk.Listbox(dialog, font=("SimHei", 10))
+        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        for name in manifests:
+            kind = "全量" if "_delta_" not in name else "增量"
+            listbox.insert(tk.END, f"{self.backups.manifest_time(name).strftime('%Y-%m-%d %H:%M:%S')}  {kind}")
+        
+        def do_restore():
+            selection = listbox.curselection()
+            if not selection:
+                messagebox.showerror("错误", "请选择备份时间点", parent=dialog)
+                return
+            name = manifests[selection[0]]
+            if not messagebox.askyesno("确认", "恢复后当前数据将被替换，是否继续？", parent=dialog):
+                return
+            try:
+                members = self.backups.restore(name)
+            except Exception as e:
+                messagebox.showerror("错误", f"恢复失败：{str(e)}", parent=dialog)
+                return
+            
+            dialog.destroy()
+            self.flush_persistence()
+            self.store.reset(members)
+            self.backups.invalidate()
+            self.store.needs_full_save = True
+            self.save_file(manual=True)
+            self.refresh_member_list()
+            self.clear_inputs()
+            self.status_bar_var.set(f"已恢复至 {self.backups.manifest_time(name).strftime('%Y-%m-%d %H:%M:%S')}：{len(members)} 位会员")
+        
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(pady=10)
+        ttk.Button(btn_frame, text="恢复", command=do_restore).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="关闭", command=dialog.destroy).pack(side=tk.LEFT, padx=10)
+    
+    # ------------------------------
+    # 连接会员服务（多台收银终端共用数据）
+    # ------------------------------
+    def attach_service(self):
+        """连接 --serve 启动的会员服务：之后查询和收银都由服务处理，本地数据文件不再读写"""
+        if not self.ensure_local():
+            return
+        url = simpledialog.askstring("连接会员服务", "会员服务地址：", initialvalue=self.config["service_url"],
+                                     parent=self.root)
+        if not url:
+            return
+        token = simpledialog.askstring("连接会员服务", "服务口令：", initialvalue=self.config["service_token"],
+                                       show="*", parent=self.root)
+        if not token:
+            return
+        client = MemberServiceClient(url.strip(), self.store, token.strip())
+        try:
+            total = client.snapshot()[0]
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        if not self.save_file(manual=True):
+            return
+        
+        self.flush_persistence()
+        self.store.reset({})
+        self.service = client
+        self.config["service_url"] = client.url
+        self.config["service_token"] = client.token
+        self.refresh_member_list()
+        self.clear_inputs()
+        self.status_bar_var.set(f"已连接会员服务 {client.url}（{total} 位会员），请搜索或按手机号查找会员")
+    
+    def detach_service(self):
+        """断开会员服务，重新读取本地数据文件"""
+        if self.service is self.store:
+            messagebox.showinfo("提示", "当前未连接会员服务")
+            return
+        url = self.service.url
+        self.service = self.store
+        self.store.reset({})
+        self.clear_inputs()
+        self.refresh_member_list()
+        if self.store.storage.exists():
+            self.start_loading(self.store.storage, on_loaded=lambda: self.status_bar_var.set(
+                f"已断开会员服务 {url}，使用本地数据（{len(self.store.members)} 位会员）"))
+        else:
+            self.status_bar_var.set(f"已断开会员服务 {url}")
+    
+    # ------------------------------
+    # 诊断信息（耗时统计与性能分析）
+    # ------------------------------
+    def write_metrics_log(self):
+        """把上次写入以来的耗时汇总追加到滚动性能日志（后台线程写入）"""
+        interval = self.metrics.interval()
+        if not interval:
+            return
+        entry = {"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "members": len(self.store.members),
+                 "metrics": interval}
+        path = self.metrics_log_path
+        self.submit_persistence(lambda: append_metrics_log(path, entry))
+    
+    def show_diagnostics(self):
+        """诊断窗口：各操作的次数、平均值和 p50/p95/p99，选中一行显示耗时分布"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("诊断信息")
+        dialog.geometry("720x480")
+        dialog.transient(self.root)
+        
+        columns = ("指标", "次数", "平均(ms)", "p50(ms)", "p95(ms)", "p99(ms)", "最大(ms)")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings", height=12)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=150 if col == "指标" else 80, anchor=tk.W if col == "指标" else tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        histogram_var = tk.StringVar(value="选择一项查看耗时分布")
+        ttk.Label(dialog, textvariable=histogram_var, font=("SimHei", 9), justify=tk.LEFT).pack(fill=tk.X, padx=10)
+        rows = {}
+        
+        def refresh():
+            tree.delete(*tree.get_children())
+            rows.clear()
+            for row in self.metrics.summary():
+                rows[row["name"]] = row
+                tree.insert("", tk.END, iid=row["name"], values=(
+                    row["name"], row["count"], f"{row['avg_ms']:.1f}", f"{row['p50_ms']:.1f}",
+                    f"{row['p95_ms']:.1f}", f"{row['p99_ms']:.1f}", f"{row['max_ms']:.1f}"))
+            profile_btn.config(text="停止性能分析并保存" if self.profiler else "开始性能分析")
+        
+        def on_select(event):
+            selection = tree.selection()
+            if not selection or selection[0] not in rows:
+                return
+            bounds = [f"≤{b}ms" for b in METRIC_BUCKETS_MS] + [f">{METRIC_BUCKETS_MS[-1]}ms"]
+            histogram_var.set(f"{selection[0]} 耗时分布：" + "  ".join(
+                f"{label} {count}" for label, count in zip(bounds, rows[selection[0]]["buckets"]) if count))
+        
+        def toggle_profiling():
+            if self.profiler:
+                path = self.stop_profiling()
+                messagebox.showinfo("性能分析", f"分析结果已保存：\n{path}", parent=dialog)
+            else:
+                self.start_profiling()
+            refresh()
+        
+        tree.bind("<<TreeviewSelect>>", on_select)
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(pady=10)
+        ttk.Button(btn_frame, text="刷新", command=refresh).pack(side=tk.LEFT, padx=10)
+        profile_btn = ttk.Button(btn_frame, text="开始性能分析", command=toggle_profiling)
+        profile_btn.pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="关闭", command=dialog.destroy).pack(side=tk.LEFT, padx=10)
+        ttk.Label(dialog, text=f"性能日志：{self.metrics_log_path}", font=("SimHei", 9), foreground="gray").pack(pady=5)
+        refresh()
+    
+    def start_profiling(self):
+        """开始用 cProfile 记录界面线程的调用（点击按钮后的处理都在界面线程中）"""
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        self.status_bar_var.set("性能分析已开始")
+    
+    def stop_profiling(self):
+        """停止性能分析，保存 .prof（可用 pstats / snakeviz 打开）和按累计耗时排序的文本摘要，返回 .prof 路径"""
+        import pstats
+        profiler, self.profiler = self.profiler, None
+        profiler.disable()
+        directory = os.path.join(self.base_dir, "性能分析")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+        profiler.dump_stats(path)
+        with open(os.path.splitext(path)[0] + ".txt", 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(60)
+        self.status_bar_var.set(f"性能分析已保存：{path}")
+        return path
     
     # ------------------------------
     # 界面组件
@@ -587,6 +4682,7 @@ class MembershipSystem:
         
         ttk.Label(search_frame, text="搜索:").grid(row=0, column=0, padx=5, pady=5)
         self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_changed)
         ttk.Entry(search_frame, textvariable=self.search_var, width=20).grid(row=0, column=1, padx=5, pady=5)
         ttk.Button(search_frame, text="搜索", command=self.search_member).grid(row=0, column=2, padx=5)
         ttk.Button(search_frame, text="重置", command=self.reset_search).grid(row=0, column=3, padx=5)
@@ -615,6 +4711,13 @@ class MembershipSystem:
         x_scroll = ttk.Scrollbar(left_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
         self.tree.configure(yscroll=y_scroll.set, xscroll=x_scroll.set)
         
+        page_frame = ttk.Frame(left_frame)
+        page_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+        ttk.Button(page_frame, text="上一页", command=lambda: self.goto_page(self.page - 1)).pack(side=tk.LEFT)
+        ttk.Button(page_frame, text="下一页", command=lambda: self.goto_page(self.page + 1)).pack(side=tk.LEFT, padx=5)
+        self.page_var = tk.StringVar()
+        ttk.Label(page_frame, textvariable=self.page_var).pack(side=tk.LEFT, padx=5)
+        
         y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -686,9 +4789,38 @@ class MembershipSystem:
         ttk.Button(btn_frame1, text="充值", command=lambda: self.update_balance("add")).pack(fill=tk.X, pady=3)
         ttk.Button(btn_frame1, text="消费", command=lambda: self.update_balance("subtract")).pack(fill=tk.X, pady=3)
         
+        # 交易记录和积分管理页在首次切换到该页时才创建控件（缩短启动时间）
         trans_frame = ttk.LabelFrame(self.notebook, text="交易记录", padding="10")
         self.notebook.add(trans_frame, text="交易记录")
+        self.lazy_tabs = {len(self.notebook.tabs()) - 1: lambda: self.build_transactions_tab(trans_frame)}
+        points_frame = ttk.LabelFrame(self.notebook, text="积分管理", padding="10")
+        self.notebook.add(points_frame, text="积分管理")
+        self.lazy_tabs[len(self.notebook.tabs()) - 1] = lambda: self.build_points_tab(points_frame)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.trans_tree = None
+        self.exchange_points_var = tk.StringVar()
+        
+        common_btn_frame = ttk.Frame(right_frame)
+        common_btn_frame.pack(fill=tk.X, pady=10)
+        ttk.Button(common_btn_frame, text="打印会员信息", 
+                 command=lambda: self.print_receipt("member_info")).pack(fill=tk.X, pady=3)
+        ttk.Button(common_btn_frame, text="删除会员", command=self.delete_member).pack(fill=tk.X, pady=3)
+        ttk.Button(common_btn_frame, text="清空输入", command=self.clear_inputs).pack(fill=tk.X, pady=3)
         
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.summary_var = tk.StringVar()
+        ttk.Label(status_frame, textvariable=self.summary_var, relief=tk.SUNKEN, anchor=tk.E).pack(side=tk.RIGHT)
+        self.status_bar_var = tk.StringVar(value="就绪")
+        status_bar = ttk.Label(status_frame, textvariable=self.status_bar_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    
+    def on_tab_changed(self, event=None):
+        build = self.lazy_tabs.pop(self.notebook.index("current"), None)
+        if build:
+            build()
+    
+    def build_transactions_tab(self, trans_frame):
         trans_columns = ("time", "action", "amount", "points_change", "balance_after")
         self.trans_tree = ttk.Treeview(trans_frame, columns=trans_columns, show="headings", height=8)
         
@@ -717,9 +4849,9 @@ class MembershipSystem:
         ttk.Button(trans_frame, text="清空交易记录", 
                  command=lambda: self.clear_transactions(self.id_var.get())).pack(fill=tk.X, pady=5)
         
-        points_frame = ttk.LabelFrame(self.notebook, text="积分管理", padding="10")
-        self.notebook.add(points_frame, text="积分管理")
-        
+        self.refresh_transaction_list(self.id_var.get())
+    
+    def build_points_tab(self, points_frame):
         points_grid = ttk.Frame(points_frame)
         points_grid.pack(fill=tk.X, pady=10)
         
@@ -727,7 +4859,6 @@ class MembershipSystem:
         ttk.Entry(points_grid, textvariable=self.points_var, state="readonly", width=20).grid(row=0, column=1, pady=5)
         
         ttk.Label(points_grid, text="兑换积分:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        self.exchange_points_var = tk.StringVar()
         ttk.Entry(points_grid, textvariable=self.exchange_points_var, width=20).grid(row=1, column=1, pady=5)
         
         ttk.Label(points_grid, text=f"兑换规则: {self.config['points_exchange_rate']}积分 = 1元", 
@@ -741,17 +4872,6 @@ class MembershipSystem:
                  command=lambda: self.adjust_points(self.id_var.get())).pack(fill=tk.X, pady=3)
         ttk.Button(btn_frame3, text="积分规则说明", 
                  command=self.show_points_rules).pack(fill=tk.X, pady=3)
-        
-        common_btn_frame = ttk.Frame(right_frame)
-        common_btn_frame.pack(fill=tk.X, pady=10)
-        ttk.Button(common_btn_frame, text="打印会员信息", 
-                 command=lambda: self.print_receipt("member_info")).pack(fill=tk.X, pady=3)
-        ttk.Button(common_btn_frame, text="删除会员", command=self.delete_member).pack(fill=tk.X, pady=3)
-        ttk.Button(common_btn_frame, text="清空输入", command=self.clear_inputs).pack(fill=tk.X, pady=3)
-        
-        self.status_bar_var = tk.StringVar(value="就绪")
-        status_bar = ttk.Label(self.root, textvariable=self.status_bar_var, relief=tk.SUNKEN, anchor=tk.W)
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
     
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -761,12 +4881,17 @@ class MembershipSystem:
         file_menu.add_command(label="打开", command=self.open_file)
         file_menu.add_command(label="保存", command=lambda: self.save_file(manual=True))
         file_menu.add_command(label="另存为", command=self.save_as_file)
+        file_menu.add_command(label="转换为SQLite存储", command=self.convert_to_sqlite)
+        file_menu.add_command(label="从备份恢复", command=self.show_restore_dialog)
+        file_menu.add_separator()
+        file_menu.add_command(label="连接会员服务", command=self.attach_service)
+        file_menu.add_command(label="断开会员服务", command=self.detach_service)
         file_menu.add_separator()
         file_menu.add_command(label="手动导入会员", command=self.import_members)
         file_menu.add_command(label="自动导入设置", command=self.set_auto_import)
         file_menu.add_command(label="导出会员", command=self.export_members)
         file_menu.add_separator()
-        file_menu.add_command(label="退出", command=self.root.quit)
+        file_menu.add_command(label="退出", command=self.on_closing)
         menubar.add_cascade(label="文件", menu=file_menu)
         
         print_menu = tk.Menu(menubar, tearoff=0)
@@ -775,20 +4900,25 @@ class MembershipSystem:
         print_menu.add_command(label="打印最后一笔交易", 
                              command=lambda: self.print_receipt("transaction"))
         print_menu.add_separator()
+        print_menu.add_command(label="打印队列", command=self.show_print_queue)
         print_menu.add_command(label="打印设置", command=self.print_settings)
         menubar.add_cascade(label="打印", menu=print_menu)
         
         member_menu = tk.Menu(menubar, tearoff=0)
+        member_menu.add_command(label="按手机号查找", command=self.lookup_member_by_phone)
         member_menu.add_command(label="生日提醒", command=self.show_birthday_reminders)
         member_menu.add_command(label="会员统计", command=self.show_statistics)
         member_menu.add_separator()
         member_menu.add_command(label="批量操作", command=self.batch_operations)
+        member_menu.add_command(label="等级规则", command=self.edit_level_rules)
         menubar.add_cascade(label="会员", menu=member_menu)
         
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="关于", command=self.show_about)
         help_menu.add_command(label="使用帮助", command=self.show_help)
         help_menu.add_command(label="打印帮助", command=self.show_print_help)
+        help_menu.add_separator()
+        help_menu.add_command(label="诊断信息", command=self.show_diagnostics)
         menubar.add_cascade(label="帮助", menu=help_menu)
         
         self.root.config(menu=menubar)
@@ -809,8 +4939,8 @@ class MembershipSystem:
         status_frame = ttk.LabelFrame(settings_window, text="当前环境", padding=10)
         status_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        ttk.Label(status_frame, text=f"Windows打印支持: {'已启用' if PRINT_SUPPORTED_WIN else '未安装（需pywin32和PIL）'}").pack(anchor=tk.W, pady=2)
-        ttk.Label(status_frame, text=f"PDF打印支持: {'已启用' if REPORTLAB_AVAILABLE else '未安装（需reportlab）'}").pack(anchor=tk.W, pady=2)
+        ttk.Label(status_frame, text=f"Windows打印支持: {'已启用' if win32_printing_supported() else '未安装（需pywin32和PIL）'}").pack(anchor=tk.W, pady=2)
+        ttk.Label(status_frame, text=f"PDF打印支持: {'已启用' if reportlab_supported() else '未安装（需reportlab）'}").pack(anchor=tk.W, pady=2)
         
         # 安装指引
         guide_frame = ttk.LabelFrame(settings_window, text="安装建议", padding=10)
@@ -851,261 +4981,365 @@ class MembershipSystem:
     # ------------------------------
     # 会员管理核心功能
     # ------------------------------
-    def load_default_data(self):
-        if os.path.exists(self.default_file_path):
-            try:
-                with open(self.default_file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                self.members = data.get('members', {})
-                
-                for member in self.members.values():
-                    if 'points' not in member:
-                        member['points'] = '0.00'
-                    if 'transactions' not in member:
-                        member['transactions'] = []
-                    if 'total_spent' not in member:
-                        member['total_spent'] = '0.00'
-                    for trans in member['transactions']:
-                        if 'points_change' not in trans:
-                            trans['points_change'] = '0.00'
-                    if 'phone' in member and not re.match(r'^1[3-9]\d{9}$', member['phone']):
-                        member['status'] = "需审核"
-                
-                self.refresh_member_list()
-                self.status_bar_var.set(f"已加载数据：{len(self.members)} 位会员")
-                self.last_save_time = time.time()
-            except Exception as e:
+    def load_default_data(self, on_loaded=None):
+        # 启用SQLite存储但数据库尚未建立时，从原JSON数据迁移
+        migrate_from = None
+        if (self.store.storage.engine == "sqlite" and not self.store.storage.exists() and
+                JsonStorage(self.default_file_path).exists()):
+            migrate_from = JsonStorage(self.default_file_path)
+
+        if self.store.storage.exists() or migrate_from:
+            def on_failed(e):
                 messagebox.showerror("加载错误", f"数据文件损坏：{str(e)}\n将使用新数据文件")
-                self.members = {}
+                self.store.reset({})
+                self.store.changes.clear()
+                self.store.needs_full_save = True
+                self.refresh_member_list()
+                if on_loaded:
+                    on_loaded()
+
+            self.start_loading(migrate_from or self.store.storage, target=self.store.storage,
+                               on_loaded=on_loaded, on_failed=on_failed)
         else:
             self.status_bar_var.set("未找到数据文件，将创建新文件")
+            if on_loaded:
+                on_loaded()
+
+    def start_loading(self, source, target=None, on_loaded=None, on_failed=None):
+        """在工作线程中流式解析数据，界面线程逐批填充会员列表并在状态栏显示进度
+
+        加载完成后切换到 target 存储（默认即 source）；source 与 target 不同时，
+        数据会整体写入 target（用于JSON迁移到SQLite）。
+        """
+        self.load_generation += 1
+        generation = self.load_generation
+        self.loading = True
+        self.load_started = time.perf_counter()
+        self.store.load_source = source
+        self.store.reset({})
+        self.show_member_ids([])
+        self.status_bar_var.set("正在加载数据…")
+
+        messages = queue.Queue()
+
+        def worker():
+            try:
+                for batch, progress in source.stream():
+                    if generation != self.load_generation:
+                        return
+                    for member_id, member in batch:
+                        MemberStore.migrate_member(member)
+                    messages.put(("batch", batch, progress))
+                messages.put(("done",))
+            except Exception as e:
+                messages.put(("error", e))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(LOAD_POLL_INTERVAL, self.poll_loading, generation, messages,
+                        source, target or source, on_loaded, on_failed)
+
+    def poll_loading(self, generation, messages, source, target, on_loaded, on_failed):
+        if generation != self.load_generation:
+            return
+
+        deadline = time.perf_counter() + LOAD_POLL_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                break
+
+            if message[0] == "batch":
+                _, batch, progress = message
+                for member_id, member in batch:
+                    self.store.insert(member)
+                    self.view_ids.append(member_id)
+                    self.view_set.add(member_id)
+                self.fill_page()
+                self.status_bar_var.set(f"正在加载数据：{len(self.store.members)} 位会员（{progress:.0%}）")
+            elif message[0] == "error":
+                self.end_loading()
+                if source is not self.store.storage:
+                    source.close()
+                if on_failed:
+                    on_failed(message[1])
+                return
+            else:
+                self.finish_loading(source, target, on_loaded, on_failed)
+                return
+
+        self.root.after(LOAD_POLL_INTERVAL, self.poll_loading, generation, messages,
+                        source, target, on_loaded, on_failed)
+
+    def finish_loading(self, source, target, on_loaded, on_failed):
+        try:
+            replayed = source.finish_load(self.store.members)
+            self.store.use_level_rules(source)
+            if target is not source:
+                target.level_rules = source.level_rules
+                target.write_all(source.with_transactions(self.store.members))
+                source.close()
+                for member in self.store.members.values():
+                    member.transactions = None
+        except Exception as e:
+            self.end_loading()
+            if on_failed:
+                on_failed(e)
+            return
+
+        self.end_loading()
+        self.metrics.record("load", time.perf_counter() - self.load_started)
+        if target is not self.store.storage:
+            self.switch_storage(target)
+        if replayed:
+            self.store.reset(self.store.members)
+            self.refresh_member_list()
+
+        msg = f"已加载数据：{len(self.store.members)} 位会员"
+        if replayed:
+            msg += f"（重放日志 {replayed} 条）"
+        self.status_bar_var.set(msg)
+        self.last_save_time = time.time()
+        if on_loaded:
+            on_loaded()
+        # 旧版数据文件的交易记录内嵌在会员数据中：整体写入一次，转存到交易记录存储
+        if any(member.transactions is not None for member in self.store.members.values()):
+            self.store.needs_full_save = True
+            self.save_file()
+
+    def cancel_loading(self):
+        self.load_generation += 1
+        self.end_loading()
+
+    def end_loading(self):
+        self.loading = False
+        self.store.load_source = None
+
+    def ensure_loaded(self):
+        if self.loading:
+            messagebox.showinfo("提示", "数据加载中，请稍候")
+            return False
+        return True
     
-    def generate_member_id(self):
-        while True:
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            random_str = hashlib.md5(str(random.randint(100000, 999999)).encode()).hexdigest()[:6]
-            member_id = f"VIP{timestamp}{random_str}".upper()
-            if member_id not in self.members:
-                return member_id
+    def ensure_local(self):
+        """连接会员服务时只能查询和收银，会员资料和数据文件的操作不可用"""
+        if self.service is not self.store:
+            messagebox.showinfo("提示", "已连接会员服务，此操作不可用（可在“文件”菜单中断开连接）")
+            return False
+        return self.ensure_loaded()
+    
+    # ------------------------------
+    # 查询（内存索引与统计）
+    # ------------------------------
+    def refresh_summary(self):
+        """状态栏右侧的实时汇总，读取累计统计，与会员数量无关"""
+        if self.service is not self.store:
+            self.summary_var.set(f"会员服务：{self.service.url}")
+            self.root.after(SUMMARY_INTERVAL, self.refresh_summary)
+            return
+        stats = self.store.stats
+        self.summary_var.set(f"会员 {len(stats.entries)} 人 | 余额 ¥{from_cents(stats.total_balance)} | "
+                             f"积分 {from_cents(stats.total_points)} | 消费 ¥{from_cents(stats.total_spent)}")
+        self.root.after(SUMMARY_INTERVAL, self.refresh_summary)
+    
+    def upcoming_birthdays(self):
+        """提醒范围内过生日的正常会员，每项为“姓名（MM-DD，N天后）”"""
+        return [f"{self.store.members[member_id].name}（{day.strftime('%m-%d')}，{days}天后）"
+                for member_id, day, days in self.store.birthday_index.upcoming(
+                    date.today(), self.config["birthday_reminder_days"])]
     
     def check_member_status(self, member_id, required_status="正常"):
-        if not member_id or member_id not in self.members:
+        if not self.ensure_loaded():
+            return False
+        if not member_id or member_id not in self.store.members:
             messagebox.showerror("错误", "请先选择会员（双击左侧列表）")
             return False
         
-        member = self.members[member_id]
-        if member['status'] != required_status:
-            messagebox.showerror("错误", f"会员状态为 {member['status']}，无法操作")
+        member = self.store.members[member_id]
+        if member.status != required_status:
+            messagebox.showerror("错误", f"会员状态为 {member.status}，无法操作")
             return False
         return True
     
     def add_member(self):
-        name = self.name_var.get().strip()
-        phone = self.phone_var.get().strip()
-        birthday = self.birthday_var.get().strip()
-        level = self.level_var.get()
-        status = self.status_var.get()
-        
-        if not name:
-            messagebox.showerror("错误", "请输入会员姓名")
+        if not self.ensure_local():
             return
-        
-        if not phone:
-            messagebox.showerror("错误", "请输入手机号")
-            return
-        if not re.match(r'^1[3-9]\d{9}$', phone):
-            messagebox.showerror("错误", "手机号格式错误（11位数字，以13-19开头）")
+        birthday = self.birthday_var.get().strip()
+        try:
+            member = self.store.add_member(
+                self.name_var.get().strip(), self.phone_var.get().strip(),
+                birthday=birthday if birthday != "YYYY-MM-DD" else "",
+                level=self.level_var.get(), status=self.status_var.get())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
             return
         
-        duplicate = False
-        for member in self.members.values():
-            if member['phone'] == phone and member['status'] != "已注销":
-                duplicate = True
-                break
-        if duplicate:
-            messagebox.showerror("错误", "该手机号已被使用（非注销状态）")
-            return
-        
-        if birthday and birthday != "YYYY-MM-DD" and not re.match(r'^\d{4}-\d{2}-\d{2}$', birthday):
-            messagebox.showerror("错误", "生日格式应为 YYYY-MM-DD（例如 1990-01-01）")
-            return
-        
-        member_id = self.generate_member_id()
-        self.members[member_id] = {
-            'id': member_id,
-            'name': name,
-            'phone': phone,
-            'birthday': birthday if birthday != "YYYY-MM-DD" else "",
-            'level': level,
-            'balance': '0.00',
-            'points': '0.00',
-            'total_spent': '0.00',
-            'status': status,
-            'created_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'transactions': []
-        }
-        
-        self.refresh_member_list()
+        self.append_member_row(member.id)
         self.save_file(manual=True)
         self.clear_inputs()
         
-        messagebox.showinfo("成功", f"会员添加成功！\nID: {member_id}")
-        self.status_bar_var.set(f"添加会员：{name}")
+        messagebox.showinfo("成功", f"会员添加成功！\nID: {member.id}")
+        self.status_bar_var.set(f"添加会员：{member.name}")
     
     def update_balance(self, operation):
         member_id = self.id_var.get()
         if not self.check_member_status(member_id):
             return
         
-        member = self.members[member_id]
-        
+        # 金额和积分都以 0.01 为单位的整数计算
         try:
-            amount = float(self.amount_var.get().strip())
-            if amount <= 0:
-                raise ValueError("金额必须为正数")
-        except:
-            messagebox.showerror("错误", "请输入有效的正数金额")
-            return
-        
-        current_balance = float(member['balance'])
-        if operation == "subtract" and amount > current_balance:
-            messagebox.showerror("错误", f"余额不足（当前：¥{current_balance:.2f}）")
+            amount = to_cents(self.amount_var.get().strip())
+            if operation == "add":
+                transaction = self.service.recharge(member_id, amount)
+            else:
+                transaction = self.service.consume(member_id, amount)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
             return
         
-        new_balance = current_balance + amount if operation == "add" else current_balance - amount
-        member['balance'] = f"{new_balance:.2f}"
-        
-        points_change = 0
-        if operation == "subtract":
-            points_change = amount * self.config["points_rate"]
-            member['points'] = f"{float(member['points']) + points_change:.2f}"
-            member['total_spent'] = f"{float(member['total_spent']) + amount:.2f}"
-            
-            new_level = self.get_level_by_spent(float(member['total_spent']))
-            if new_level != member['level']:
-                member['level'] = new_level
-                self.level_var.set(new_level)
-        
-        self.balance_var.set(member['balance'])
-        self.points_var.set(member['points'])
-        
-        action = "充值" if operation == "add" else "消费"
-        self.add_transaction(member_id, action, amount, points_change)
-        
-        self.refresh_member_list()
-        self.save_file(manual=True)
-        
-        messagebox.showinfo("成功", f"{action}成功！\n当前余额：¥{new_balance:.2f}\n积分变化：+{points_change:.2f}")
+        member = self.show_balance(member_id)
+        messagebox.showinfo("成功", f"{transaction.action}成功！\n当前余额：¥{from_cents(member.balance)}\n积分变化：+{from_cents(transaction.points_change)}")
         self.amount_var.set("")
     
+    def show_balance(self, member_id):
+        """余额或积分变化后更新表单、列表行和交易记录，并保存"""
+        member = self.store.members[member_id]
+        self.level_var.set(member.level)
+        self.balance_var.set(from_cents(member.balance))
+        self.points_var.set(from_cents(member.points))
+        self.refresh_transaction_list(member_id)
+        self.update_member_row(member_id)
+        self.save_file(manual=True)
+        return member
+    
     # ------------------------------
     # 其他功能实现
     # ------------------------------
     def new_file(self):
-        if self.members and not messagebox.askyesno("提示", "当前数据未保存，是否继续？"):
+        if not self.ensure_local():
+            return
+        if self.store.members and not messagebox.askyesno("提示", "当前数据未保存，是否继续？"):
             return
         
-        self.members = {}
-        self.current_file = self.default_file_path
+        self.cancel_loading()
+        self.flush_persistence()
+        self.store.reset({})
+        # 新数据与旧快照无关，下次变更时写入完整数据而不是追加日志
+        self.switch_storage(self.open_storage(self.default_data_path(), self.store.storage.seq))
+        self.store.needs_full_save = True
         self.refresh_member_list()
         self.clear_inputs()
         self.status_bar_var.set("已创建新数据文件")
     
     def open_file(self):
+        if self.service is not self.store:
+            self.ensure_local()
+            return
         file_path = filedialog.askopenfilename(
-            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")],
+            filetypes=[("JSON文件", "*.json"), ("SQLite数据库", "*.db"), ("所有文件", "*.*")],
             initialdir=self.base_dir
         )
         
         if file_path:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                self.members = data.get('members', {})
-                self.current_file = file_path
-                self.refresh_member_list()
-                self.status_bar_var.set(f"已打开文件：{os.path.basename(file_path)}")
-                self.last_save_time = time.time()
+                storage = self.open_storage(file_path)
             except Exception as e:
                 messagebox.showerror("错误", f"打开失败：{str(e)}")
+                return
+            
+            previous_members = self.store.members
+            
+            def on_loaded():
+                self.store.needs_full_save = False
+                self.status_bar_var.set(f"已打开文件：{os.path.basename(file_path)}（{len(self.store.members)} 位会员）")
+            
+            def on_failed(e):
+                self.store.reset(previous_members)
+                self.refresh_member_list()
+                self.status_bar_var.set("就绪")
+                messagebox.showerror("错误", f"打开失败：{str(e)}")
+            
+            self.start_loading(storage, on_loaded=on_loaded, on_failed=on_failed)
     
     def save_as_file(self):
         file_path = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON文件", "*.json")],
+            filetypes=[("JSON文件", "*.json"), ("SQLite数据库", "*.db")],
             initialdir=self.base_dir
         )
         
-        if file_path:
-            self.current_file = file_path
+        if file_path and self.ensure_local():
+            self.flush_persistence()
+            self.store.load_all_transactions()
+            self.switch_storage(self.open_storage(file_path, self.store.storage.seq))
+            self.store.needs_full_save = True
             self.save_file(manual=True)
     
+    def convert_to_sqlite(self):
+        """将当前数据迁移到SQLite数据库，此后默认使用数据库存储"""
+        if not self.ensure_local():
+            return
+        if self.store.storage.engine == "sqlite":
+            messagebox.showinfo("提示", f"当前已使用SQLite存储：{os.path.basename(self.store.storage.path)}")
+            return
+        if not messagebox.askyesno("确认", "将当前数据迁移到SQLite数据库（原JSON文件保留），是否继续？"):
+            return
+        
+        self.flush_persistence()
+        storage = self.open_storage(self.default_db_path)
+        storage.level_rules = dict(self.config["level_rules"])
+        try:
+            storage.write_all(self.store.storage.with_transactions(self.store.members))
+        except Exception as e:
+            storage.close()
+            messagebox.showerror("错误", f"迁移失败：{str(e)}")
+            return
+        
+        self.switch_storage(storage)
+        for member in self.store.members.values():
+            member.transactions = None
+        self.config["storage_engine"] = "sqlite"
+        self.status_bar_var.set(f"已切换到SQLite存储：{os.path.basename(storage.path)}")
+    
     def import_members(self):
         if not self.logged_in:
             messagebox.showerror("错误", "请先通过验证")
             return
+        if not self.ensure_local():
+            return
+        
+        if self.importing:
+            messagebox.showinfo("提示", "正在导入其他文件，请稍候")
+            return
         
         file_path = filedialog.askopenfilename(
             title="选择会员数据文件",
-            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")],
+            filetypes=[("会员数据文件", "*.json *.jsonl *.csv"), ("JSON文件", "*.json"),
+                       ("JSONL文件", "*.jsonl"), ("CSV文件", "*.csv"), ("所有文件", "*.*")],
             initialdir=self.base_dir
         )
         
         if not file_path:
             return
         
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            imported_members = data.get('members', {})
-            
-            if not imported_members:
+        def on_finished(success, rejected, report_path):
+            if not success and not rejected:
                 messagebox.showerror("错误", "文件中未找到会员数据")
                 return
-            
-            success = 0
-            skip = 0
-            existing_phones = {m['phone'] for m in self.members.values() if m['status'] != "已注销"}
-            
-            for member in imported_members.values():
-                if not member.get('name') or not member.get('phone'):
-                    skip += 1
-                    continue
-                
-                if member['phone'] in existing_phones:
-                    skip += 1
-                    continue
-                
-                if not re.match(r'^1[3-9]\d{9}$', member['phone'].strip()):
-                    skip += 1
-                    continue
-                
-                new_member = {
-                    'id': self.generate_member_id(),
-                    'name': member.get('name', '').strip(),
-                    'phone': member.get('phone', '').strip(),
-                    'birthday': member.get('birthday', ''),
-                    'level': member.get('level', '普通会员'),
-                    'balance': member.get('balance', '0.00'),
-                    'points': member.get('points', '0.00'),
-                    'total_spent': member.get('total_spent', '0.00'),
-                    'status': member.get('status', '正常'),
-                    'created_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'transactions': member.get('transactions', [])
-                }
-                
-                self.members[new_member['id']] = new_member
-                existing_phones.add(new_member['phone'])
-                success += 1
-            
-            self.refresh_member_list()
-            self.save_file(manual=True)
-            messagebox.showinfo("成功", f"导入完成：成功{success}人，跳过{skip}人")
-        except Exception as e:
+            msg = f"导入完成：成功{success}人，跳过{len(rejected)}人"
+            if report_path:
+                msg += f"\n未导入的记录及原因：{report_path}"
+            messagebox.showinfo("成功", msg)
+        
+        def on_failed(e):
             messagebox.showerror("错误", f"导入失败：{str(e)}")
+        
+        self.bulk_import(file_path, on_finished, on_failed)
     
     def export_members(self):
-        if not self.members:
+        if not self.ensure_local():
+            return
+        if not self.store.members:
             messagebox.showinfo("提示", "没有会员数据可导出")
             return
         
@@ -1117,10 +5351,13 @@ class MembershipSystem:
         
         if file_path:
             try:
-                data = {'members': self.members, 'export_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+                self.flush_persistence()
+                members = self.store.storage.with_transactions(self.store.members)
+                data = {'members': {mid: m.to_dict() for mid, m in members.items()},
+                        'export_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
                 with open(file_path, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=4)
-                messagebox.showinfo("成功", f"已导出 {len(self.members)} 位会员数据")
+                messagebox.showinfo("成功", f"已导出 {len(self.store.members)} 位会员数据")
             except Exception as e:
                 messagebox.showerror("错误", f"导出失败：{str(e)}")
     
@@ -1141,92 +5378,157 @@ class MembershipSystem:
         
         ttk.Button(dialog, text="关闭", command=dialog.destroy).pack(pady=5)
     
-    def add_transaction(self, member_id, action, amount, points_change=0):
-        if member_id not in self.members:
-            return
-        
-        member = self.members[member_id]
-        transaction = {
-            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'action': action,
-            'amount': f"{amount:.2f}",
-            'points_change': f"{points_change:.2f}",
-            'balance_after': member['balance']
-        }
-        member['transactions'].append(transaction)
-        self.refresh_transaction_list(member_id)
-    
-    def get_level_by_spent(self, total_spent):
-        levels = sorted(self.config["level_rules"].items(), key=lambda x: x[1], reverse=True)
-        for level, threshold in levels:
-            if total_spent >= threshold:
-                return level
-        return "普通会员"
-    
     def on_member_select(self, event):
         selection = self.tree.selection()
         if not selection:
             return
         
-        member_id = self.tree.item(selection[0])['values'][0]
-        if member_id not in self.members:
+        member_id = selection[0]
+        if member_id not in self.store.members:
             return
         
-        member = self.members[member_id]
-        self.id_var.set(member['id'])
-        self.name_var.set(member['name'])
-        self.phone_var.set(member['phone'])
-        self.birthday_var.set(member['birthday'] or "YYYY-MM-DD")
-        self.level_var.set(member['level'])
-        self.balance_var.set(member['balance'])
-        self.points_var.set(member['points'])
-        self.status_var.set(member['status'])
+        self.show_member(member_id)
+    
+    @instrumented("show_member")
+    def show_member(self, member_id):
+        """在右侧表单中显示会员资料和最近的交易记录"""
+        member = self.store.members[member_id]
+        self.id_var.set(member.id)
+        self.name_var.set(member.name)
+        self.phone_var.set(member.phone)
+        self.birthday_var.set(member.birthday or "YYYY-MM-DD")
+        self.level_var.set(member.level)
+        self.balance_var.set(from_cents(member.balance))
+        self.points_var.set(from_cents(member.points))
+        self.status_var.set(member.status)
         
         self.refresh_transaction_list(member_id)
     
+    @instrumented("refresh_member_list")
     def refresh_member_list(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        for member in self.members.values():
-            self.tree.insert("", tk.END, values=(
-                member['id'],
-                member['name'],
-                member['phone'],
-                member['level'],
-                f"¥{member['balance']}",
-                member['points'],
-                member['status']
-            ))
+        """显示全部会员（保持当前页码）"""
+        self.view_all = True
+        self.view_ids = list(self.store.members)
+        self.view_set = set(self.view_ids)
+        self.render_page()
+    
+    def show_member_ids(self, member_ids, view_all=False):
+        """以给定的会员ID列表作为当前视图，从第一页开始显示"""
+        self.view_all = view_all
+        self.view_ids = list(member_ids)
+        self.view_set = set(self.view_ids)
+        self.page = 0
+        self.render_page()
+    
+    def page_count(self):
+        return max(1, (len(self.view_ids) + MEMBER_PAGE_SIZE - 1) // MEMBER_PAGE_SIZE)
+    
+    def goto_page(self, page):
+        page = min(max(page, 0), self.page_count() - 1)
+        if page != self.page:
+            self.page = page
+            self.render_page()
+    
+    @instrumented("render_page")
+    def render_page(self):
+        """只把当前页的会员放进列表，其余行不创建控件"""
+        self.page = min(self.page, self.page_count() - 1)
+        self.tree.delete(*self.tree.get_children())
+        start = self.page * MEMBER_PAGE_SIZE
+        for member_id in self.view_ids[start:start + MEMBER_PAGE_SIZE] if self.logged_in else ():
+            member = self.store.members.get(member_id)
+            if member:
+                self.insert_member_row(member)
+        self.update_page_label()
+    
+    def fill_page(self):
+        """视图末尾追加了会员：只在当前页未满时补齐行"""
+        start = self.page * MEMBER_PAGE_SIZE
+        shown = len(self.tree.get_children())
+        if self.logged_in and shown < MEMBER_PAGE_SIZE:
+            for member_id in self.view_ids[start + shown:start + MEMBER_PAGE_SIZE]:
+                self.insert_member_row(self.store.members[member_id])
+        self.update_page_label()
+    
+    def update_page_label(self):
+        self.page_var.set(f"第 {self.page + 1}/{self.page_count()} 页，共 {len(self.view_ids)} 位会员")
+    
+    def member_row_values(self, member):
+        return (
+            member.id,
+            member.name,
+            member.phone,
+            member.level,
+            f"¥{from_cents(member.balance)}",
+            from_cents(member.points),
+            member.status
+        )
+    
+    def insert_member_row(self, member):
+        self.tree.insert("", tk.END, iid=member.id, values=self.member_row_values(member))
+    
+    def update_member_row(self, member_id):
+        """会员信息变化后只更新对应行（不在当前页则无需处理）"""
+        if self.tree.exists(member_id):
+            self.tree.item(member_id, values=self.member_row_values(self.store.members[member_id]))
+    
+    def append_member_row(self, member_id):
+        """新增会员：显示全部会员时追加到视图末尾"""
+        if self.view_all:
+            self.view_ids.append(member_id)
+            self.view_set.add(member_id)
+            self.fill_page()
+    
+    def remove_member_row(self, member_id):
+        self.remove_member_rows((member_id,))
+    
+    def remove_member_rows(self, member_ids):
+        """删除会员：从视图中移除（视图列表只重建一次），当前页显示了其中的会员时重新填充本页"""
+        removed = self.view_set.intersection(member_ids)
+        if not removed:
+            return
+        self.view_set -= removed
+        self.view_ids = [member_id for member_id in self.view_ids if member_id not in removed]
+        if any(self.tree.exists(member_id) for member_id in removed):
+            self.render_page()
+        else:
+            self.update_page_label()
     
     def refresh_transaction_list(self, member_id):
+        if self.trans_tree is None:
+            return
         for item in self.trans_tree.get_children():
             self.trans_tree.delete(item)
         
-        if member_id not in self.members:
+        if member_id not in self.store.members:
             return
         
-        transactions = self.members[member_id]['transactions'][-10:]
+        transactions = self.service.transactions(member_id)[-10:]
         for trans in reversed(transactions):
-            self.trans_tree.insert("", tk.END, values=(
-                trans['time'],
-                trans['action'],
-                f"¥{trans['amount']}",
-                trans['points_change'],
-                f"¥{trans['balance_after']}"
-            ))
+            self.trans_tree.insert("", tk.END, values=self.transaction_row_values(trans))
+    
+    @staticmethod
+    def transaction_row_values(trans):
+        return (
+            trans.time,
+            trans.action,
+            f"¥{from_cents(trans.amount)}",
+            from_cents(trans.points_change),
+            f"¥{from_cents(trans.balance_after)}"
+        )
     
     def show_all_transactions(self, member_id):
-        if not member_id or member_id not in self.members:
+        if not member_id or member_id not in self.store.members:
             return
         
-        member = self.members[member_id]
-        if not member['transactions']:
+        member = self.store.members[member_id]
+        transactions = list(self.service.transactions(member_id))
+        if not transactions:
             messagebox.showinfo("提示", "该会员暂无交易记录")
             return
         
         trans_window = tk.Toplevel(self.root)
-        trans_window.title(f"{member['name']} 的所有交易记录")
+        trans_window.title(f"{member.name} 的所有交易记录")
         trans_window.geometry("800x500")
         trans_window.transient(self.root)
         
@@ -1249,26 +5551,40 @@ class MembershipSystem:
         x_scroll = ttk.Scrollbar(trans_window, orient=tk.HORIZONTAL, command=tree.xview)
         tree.configure(yscroll=y_scroll.set, xscroll=x_scroll.set)
         
-        for trans in reversed(member['transactions']):
-            tree.insert("", tk.END, values=(
-                trans['time'],
-                trans['action'],
-                f"¥{trans['amount']}",
-                trans['points_change'],
-                f"¥{trans['balance_after']}"
-            ))
+        # 分页显示（新的记录在前），每页只创建 TRANSACTION_PAGE_SIZE 行
+        pages = (len(transactions) + TRANSACTION_PAGE_SIZE - 1) // TRANSACTION_PAGE_SIZE
+        current = [0]
+        page_var = tk.StringVar()
+        
+        def show_page(page):
+            page = min(max(page, 0), pages - 1)
+            current[0] = page
+            tree.delete(*tree.get_children())
+            end = len(transactions) - page * TRANSACTION_PAGE_SIZE
+            for trans in reversed(transactions[max(end - TRANSACTION_PAGE_SIZE, 0):end]):
+                tree.insert("", tk.END, values=self.transaction_row_values(trans))
+            page_var.set(f"第 {page + 1}/{pages} 页，共 {len(transactions)} 条记录")
+        
+        page_frame = ttk.Frame(trans_window)
+        page_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+        ttk.Button(page_frame, text="上一页", command=lambda: show_page(current[0] - 1)).pack(side=tk.LEFT)
+        ttk.Button(page_frame, text="下一页", command=lambda: show_page(current[0] + 1)).pack(side=tk.LEFT, padx=5)
+        ttk.Label(page_frame, textvariable=page_var).pack(side=tk.LEFT, padx=5)
+        show_page(0)
         
         tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
     
     def clear_transactions(self, member_id):
-        if not member_id or member_id not in self.members:
+        if not self.ensure_local():
+            return
+        if not member_id or member_id not in self.store.members:
             messagebox.showerror("错误", "请先选择会员")
             return
         
         if messagebox.askyesno("确认", "确定要清空所有交易记录吗？（此操作不可恢复）"):
-            self.members[member_id]['transactions'] = []
+            self.store.clear_transactions(member_id)
             self.refresh_transaction_list(member_id)
             self.save_file(manual=True)
             messagebox.showinfo("成功", "交易记录已清空")
@@ -1277,73 +5593,42 @@ class MembershipSystem:
         if not self.check_member_status(member_id):
             return
         
-        member = self.members[member_id]
-        current_points = float(member['points'])
-        
-        if current_points < self.config["points_exchange_rate"]:
-            messagebox.showerror("错误", f"积分不足（最低需{self.config['points_exchange_rate']}积分）")
-            return
-        
         try:
-            exchange_points = float(self.exchange_points_var.get().strip())
-            if exchange_points <= 0:
-                raise ValueError
-            if exchange_points > current_points:
-                raise ValueError(f"不能超过当前积分（{current_points:.2f}）")
-            if exchange_points % 100 != 0:
-                raise ValueError("积分兑换需为100的整数倍")
+            exchange_points = to_cents(float(self.exchange_points_var.get().strip()))
+        except ValueError:
+            exchange_points = 0
+        try:
+            transaction = self.service.exchange_points(member_id, exchange_points)
         except ValueError as e:
-            messagebox.showerror("错误", f"请输入有效的积分数量\n{str(e)}")
+            messagebox.showerror("错误", str(e))
             return
         
-        exchange_amount = exchange_points / self.config["points_exchange_rate"]
-        
-        member['balance'] = f"{float(member['balance']) + exchange_amount:.2f}"
-        member['points'] = f"{current_points - exchange_points:.2f}"
-        
-        self.balance_var.set(member['balance'])
-        self.points_var.set(member['points'])
-        
-        self.add_transaction(member_id, "积分兑换", exchange_amount, -exchange_points)
-        
-        self.refresh_member_list()
-        self.save_file(manual=True)
-        
-        messagebox.showinfo("成功", f"积分兑换成功！\n兑换积分：{exchange_points:.2f}\n获得余额：¥{exchange_amount:.2f}")
+        self.show_balance(member_id)
+        messagebox.showinfo("成功", f"积分兑换成功！\n兑换积分：{from_cents(exchange_points)}\n获得余额：¥{from_cents(transaction.amount)}")
         self.exchange_points_var.set("")
     
     def adjust_points(self, member_id):
         if not self.check_member_status(member_id):
             return
         
-        member = self.members[member_id]
-        current_points = float(member['points'])
-        
+        current_points = self.store.members[member_id].points
         try:
-            adjust_value = float(simpledialog.askstring("调整积分", 
-                f"当前积分：{current_points:.2f}\n请输入调整值（正数增加，负数减少）", 
-                parent=self.root))
+            adjust_value = to_cents(float(simpledialog.askstring("调整积分", 
+                f"当前积分：{from_cents(current_points)}\n请输入调整值（正数增加，负数减少）", 
+                parent=self.root)))
         except:
             messagebox.showerror("错误", "输入无效")
             return
         
         reason = simpledialog.askstring("调整原因", "请输入调整原因：", parent=self.root)
-        if not reason:
-            messagebox.showerror("错误", "请输入调整原因")
-            return
-        
-        new_points = current_points + adjust_value
-        if new_points < 0:
-            messagebox.showerror("错误", "调整后积分不能为负数")
+        try:
+            self.service.adjust_points(member_id, adjust_value, reason)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
             return
         
-        member['points'] = f"{new_points:.2f}"
-        self.points_var.set(member['points'])
-        
-        self.add_transaction(member_id, f"积分调整（{reason}）", 0, adjust_value)
-        
-        self.save_file(manual=True)
-        messagebox.showinfo("成功", f"积分调整成功！\n新积分：{new_points:.2f}")
+        member = self.show_balance(member_id)
+        messagebox.showinfo("成功", f"积分调整成功！\n新积分：{from_cents(member.points)}")
     
     def show_points_rules(self):
         rules = (f"积分规则说明：\n\n"
@@ -1354,98 +5639,275 @@ class MembershipSystem:
         messagebox.showinfo("积分规则", rules)
     
     def show_birthday_reminders(self):
-        today = date.today()
-        upcoming = []
-        
-        for member in self.members.values():
-            if member['status'] != "正常" or not member['birthday']:
-                continue
-            
-            try:
-                bday = datetime.strptime(member['birthday'], "%Y-%m-%d").date()
-                this_year_bday = bday.replace(year=today.year)
-                if this_year_bday < today:
-                    this_year_bday = this_year_bday.replace(year=today.year + 1)
-                
-                days = (this_year_bday - today).days
-                if 0 <= days <= self.config["birthday_reminder_days"]:
-                    upcoming.append(f"{member['name']}（{this_year_bday.strftime('%m-%d')}，{days}天后）")
-            except:
-                continue
-        
+        upcoming = self.upcoming_birthdays()
         if upcoming:
             messagebox.showinfo("生日提醒", "近期生日会员：\n" + "\n".join(upcoming))
         else:
-            messagebox.showinfo("生日提醒", f"未来{self.config["birthday_reminder_days"]}天内没有会员生日")
+            messagebox.showinfo("生日提醒", f"未来{self.config['birthday_reminder_days']}天内没有会员生日")
     
     def show_statistics(self):
-        if not self.members:
+        if not self.store.members:
             messagebox.showinfo("统计", "没有会员数据")
             return
         
-        total = len(self.members)
-        levels = defaultdict(int)
-        statuses = defaultdict(int)
-        total_balance = 0
-        total_points = 0
-        
-        for member in self.members.values():
-            levels[member['level']] += 1
-            statuses[member['status']] += 1
-            total_balance += float(member['balance'])
-            total_points += float(member['points'])
+        total, levels, statuses, total_balance, total_points = self.service.snapshot()
         
         stats = (f"总会员数：{total}\n"
-                 f"总余额：¥{total_balance:.2f}\n"
-                 f"总积分：{total_points:.2f}\n\n"
+                 f"总余额：¥{from_cents(total_balance)}\n"
+                 f"总积分：{from_cents(total_points)}\n\n"
                  f"等级分布：\n" + "\n".join([f"- {k}：{v}人" for k, v in levels.items()]) +
-                 f"\n\n状态分布：\n" + "\n".join([f"- {k}：{v}人" for k, v in statuses.items()]))
+                 "\n\n状态分布：\n" + "\n".join([f"- {k}：{v}人" for k, v in statuses.items()]))
         
         messagebox.showinfo("会员统计", stats)
     
     def batch_operations(self):
-        messagebox.showinfo("提示", "批量操作功能即将上线，敬请期待")
+        """批量操作：按条件筛选会员，对筛选结果执行同一操作，执行前显示预览汇总"""
+        if not self.ensure_local():
+            return
+        levels = list(self.config["level_rules"].keys())
+        operations = {label: key for key, label in MemberStore.BATCH_OPERATIONS.items()}
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("批量操作")
+        dialog.geometry("460x480")
+        dialog.transient(self.root)
+        
+        filter_frame = ttk.LabelFrame(dialog, text="筛选会员", padding="10")
+        filter_frame.pack(fill=tk.X, padx=10, pady=5)
+        keyword_var = tk.StringVar(value=self.search_var.get().strip())
+        level_var = tk.StringVar(value="全部")
+        status_var = tk.StringVar(value="全部")
+        ttk.Label(filter_frame, text="关键字：").grid(row=0, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(filter_frame, textvariable=keyword_var, width=28).grid(row=0, column=1, pady=3)
+        ttk.Label(filter_frame, text="等级：").grid(row=1, column=0, sticky=tk.W, pady=3)
+        ttk.Combobox(filter_frame, textvariable=level_var, values=["全部"] + levels,
+                     state="readonly", width=26).grid(row=1, column=1, pady=3)
+        ttk.Label(filter_frame, text="状态：").grid(row=2, column=0, sticky=tk.W, pady=3)
+        ttk.Combobox(filter_frame, textvariable=status_var, values=["全部"] + list(IMPORT_STATUSES),
+                     state="readonly", width=26).grid(row=2, column=1, pady=3)
+        
+        op_frame = ttk.LabelFrame(dialog, text="操作", padding="10")
+        op_frame.pack(fill=tk.X, padx=10, pady=5)
+        operation_var = tk.StringVar(value=MemberStore.BATCH_OPERATIONS["recharge"])
+        value_var = tk.StringVar()
+        reason_var = tk.StringVar()
+        ttk.Label(op_frame, text="操作：").grid(row=0, column=0, sticky=tk.W, pady=3)
+        operation_box = ttk.Combobox(op_frame, textvariable=operation_var, values=list(operations),
+                                     state="readonly", width=26)
+        operation_box.grid(row=0, column=1, pady=3)
+        value_label = ttk.Label(op_frame, text="金额：")
+        value_label.grid(row=1, column=0, sticky=tk.W, pady=3)
+        value_box = ttk.Combobox(op_frame, textvariable=value_var, width=26)
+        value_box.grid(row=1, column=1, pady=3)
+        ttk.Label(op_frame, text="备注：").grid(row=2, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(op_frame, textvariable=reason_var, width=28).grid(row=2, column=1, pady=3)
+        
+        result_var = tk.StringVar(value="设置条件和操作后点击“预览”")
+        ttk.Label(dialog, textvariable=result_var, font=("SimHei", 10), justify=tk.LEFT,
+                  wraplength=420).pack(fill=tk.X, padx=10, pady=5)
+        
+        def on_operation(event=None):
+            operation = operations[operation_var.get()]
+            if operation in ("level", "status"):
+                choices = levels if operation == "level" else list(IMPORT_STATUSES)
+                value_label.config(text="改为：")
+                value_box.config(values=choices, state="readonly")
+                value_var.set(choices[0])
+            else:
+                value_label.config(text={"recharge": "金额：", "points": "积分："}.get(operation, ""))
+                value_box.config(values=[], state="disabled" if operation == "delete" else "normal")
+                value_var.set("")
+        
+        def collect():
+            """返回 (会员ID列表, 操作, 数值, 备注, 预览汇总)；参数有误时提示并返回 None"""
+            member_ids = self.store.select_members(
+                keyword_var.get().strip().lower(),
+                level_var.get() if level_var.get() != "全部" else None,
+                status_var.get() if status_var.get() != "全部" else None)
+            operation = operations[operation_var.get()]
+            value = value_var.get().strip()
+            reason = reason_var.get().strip()
+            try:
+                if operation in ("recharge", "points"):
+                    value = to_cents(value)
+                summary = self.store.run_batch(member_ids, operation, value, reason, dry_run=True)
+            except ValueError as e:
+                messagebox.showerror("错误", str(e), parent=dialog)
+                return None
+            return member_ids, operation, value, reason, summary
+        
+        def describe(member_ids, operation, summary):
+            lines = [f"符合条件：{len(member_ids)} 位会员，将处理 {summary['count']} 位，跳过 {len(summary['skipped'])} 位"]
+            if operation == "recharge":
+                lines.append(f"充值合计：¥{from_cents(summary['amount'])}")
+            elif operation == "points":
+                lines.append(f"赠送积分合计：{from_cents(summary['points'])}")
+            elif operation == "delete":
+                lines.append(f"被删除会员的余额合计：¥{from_cents(summary['balance'])}")
+            else:
+                title = "原等级" if operation == "level" else "原状态"
+                lines.append(f"{title}：" + "，".join(f"{k} {v}人" for k, v in summary["changes"].items()))
+            reasons = defaultdict(int)
+            for _, skip in summary["skipped"]:
+                reasons[skip] += 1
+            if reasons:
+                lines.append("跳过原因：" + "，".join(f"{k} {v}人" for k, v in reasons.items()))
+            return "\n".join(lines)
+        
+        def preview():
+            collected = collect()
+            if collected:
+                member_ids, operation, _, _, summary = collected
+                result_var.set(describe(member_ids, operation, summary))
+        
+        def execute():
+            collected = collect()
+            if not collected:
+                return
+            member_ids, operation, value, reason, summary = collected
+            text = describe(member_ids, operation, summary)
+            result_var.set(text)
+            if not summary["count"]:
+                messagebox.showinfo("提示", "没有需要处理的会员", parent=dialog)
+                return
+            if not messagebox.askyesno("确认", f"{text}\n\n确定执行“{operation_var.get()}”？", parent=dialog):
+                return
+            summary = self.apply_batch(member_ids, operation, value, reason)
+            result_var.set(f"已完成：{operation_var.get()} {summary['count']} 位会员")
+        
+        operation_box.bind("<<ComboboxSelected>>", on_operation)
+        on_operation()
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(pady=10)
+        ttk.Button(btn_frame, text="预览", command=preview).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="执行", command=execute).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="关闭", command=dialog.destroy).pack(side=tk.LEFT, padx=10)
     
-    def update_member(self):
+    @instrumented("batch")
+    def apply_batch(self, member_ids, operation, value, reason=""):
+        """执行批量操作：全部会员处理完后只保存一次、刷新一次列表"""
+        summary = self.store.run_batch(member_ids, operation, value, reason)
+        self.save_file()
+        self.refresh_member_list()
         member_id = self.id_var.get()
-        if not member_id or member_id not in self.members:
-            messagebox.showerror("错误", "请先选择会员")
+        if member_id in self.store.members:
+            self.show_member(member_id)
+        elif member_id:
+            self.clear_inputs()
+        self.status_bar_var.set(f"{MemberStore.BATCH_OPERATIONS[operation]}完成：{summary['count']} 位会员")
+        return summary
+    
+    def edit_level_rules(self):
+        """修改各等级的累计消费门槛，并按新规则重算全部会员的等级（可先预览）"""
+        if not self.ensure_local():
             return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("等级规则")
+        dialog.geometry("400x380")
+        dialog.transient(self.root)
         
-        name = self.name_var.get().strip()
-        phone = self.phone_var.get().strip()
-        if not name:
-            messagebox.showerror("错误", "请输入姓名")
+        rules_frame = ttk.LabelFrame(dialog, text="累计消费门槛（元）", padding="10")
+        rules_frame.pack(fill=tk.X, padx=10, pady=5)
+        threshold_vars = {}
+        for row, (level, threshold) in enumerate(self.config["level_rules"].items()):
+            threshold_vars[level] = tk.StringVar(value=f"{threshold:g}")
+            ttk.Label(rules_frame, text=f"{level}：").grid(row=row, column=0, sticky=tk.W, pady=3)
+            ttk.Entry(rules_frame, textvariable=threshold_vars[level], width=20).grid(row=row, column=1, pady=3)
+        
+        result_var = tk.StringVar(value="修改门槛后点击“预览”查看等级变化")
+        ttk.Label(dialog, textvariable=result_var, font=("SimHei", 10), justify=tk.LEFT,
+                  wraplength=360).pack(fill=tk.X, padx=10, pady=5)
+        
+        def collect():
+            """返回 (新规则, 预览报告)；门槛有误时提示并返回 None"""
+            rules = {}
+            for level, var in threshold_vars.items():
+                try:
+                    rules[level] = float(var.get().strip())
+                except ValueError:
+                    messagebox.showerror("错误", f"{level}的门槛无效：{var.get()}", parent=dialog)
+                    return None
+            try:
+                return rules, self.store.relevel(rules, dry_run=True)
+            except ValueError as e:
+                messagebox.showerror("错误", str(e), parent=dialog)
+                return None
+        
+        def describe(report):
+            if not report["count"]:
+                return "没有会员的等级需要变化"
+            return f"等级变化：{report['count']} 位会员\n" + "\n".join(
+                f"- {old} → {new}：{count}人" for (old, new), count in report["changes"].items())
+        
+        def preview():
+            collected = collect()
+            if collected:
+                result_var.set(describe(collected[1]))
+        
+        def apply():
+            collected = collect()
+            if not collected:
+                return
+            rules, report = collected
+            result_var.set(describe(report))
+            if report["count"] and not messagebox.askyesno(
+                    "确认", f"{describe(report)}\n\n确定按新规则调整会员等级？", parent=dialog):
+                return
+            report = self.apply_level_rules(rules)
+            result_var.set(f"已应用新规则，{report['count']} 位会员的等级已调整")
+        
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(pady=10)
+        ttk.Button(btn_frame, text="预览", command=preview).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="应用", command=apply).pack(side=tk.LEFT, padx=10)
+        ttk.Button(btn_frame, text="关闭", command=dialog.destroy).pack(side=tk.LEFT, padx=10)
+    
+    @instrumented("relevel")
+    def apply_level_rules(self, rules):
+        """替换等级规则并重算全部会员的等级：只保存一次、刷新一次列表"""
+        report = self.store.relevel(rules)
+        self.save_file()
+        if report["count"]:
+            self.refresh_member_list()
+            member_id = self.id_var.get()
+            if member_id in self.store.members:
+                self.show_member(member_id)
+        self.status_bar_var.set(f"等级规则已更新：{report['count']} 位会员的等级已调整")
+        return report
+    
+    def update_member(self):
+        if not self.ensure_local():
             return
-        if not re.match(r'^1[3-9]\d{9}$', phone):
-            messagebox.showerror("错误", "手机号格式错误")
+        member_id = self.id_var.get()
+        if not member_id or member_id not in self.store.members:
+            messagebox.showerror("错误", "请先选择会员")
             return
         
-        for mid, m in self.members.items():
-            if mid != member_id and m['phone'] == phone and m['status'] != "已注销":
-                messagebox.showerror("错误", "该手机号已被使用")
-                return
-        
-        member = self.members[member_id]
-        member['name'] = name
-        member['phone'] = phone
-        member['birthday'] = self.birthday_var.get().strip() or ""
-        member['level'] = self.level_var.get()
-        member['status'] = self.status_var.get()
+        birthday = self.birthday_var.get().strip()
+        try:
+            self.store.update_member(
+                member_id, self.name_var.get().strip(), self.phone_var.get().strip(),
+                birthday=birthday if birthday != "YYYY-MM-DD" else "",
+                level=self.level_var.get(), status=self.status_var.get())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
         
-        self.refresh_member_list()
+        self.update_member_row(member_id)
         self.save_file(manual=True)
         messagebox.showinfo("成功", "会员信息已更新")
     
     def delete_member(self):
+        if not self.ensure_local():
+            return
         member_id = self.id_var.get()
-        if not member_id or member_id not in self.members:
+        if not member_id or member_id not in self.store.members:
             messagebox.showerror("错误", "请先选择会员")
             return
         
-        if messagebox.askyesno("确认", f"确定删除会员 {self.members[member_id]['name']}？"):
-            del self.members[member_id]
-            self.refresh_member_list()
+        if messagebox.askyesno("确认", f"确定删除会员 {self.store.members[member_id].name}？"):
+            self.store.delete_member(member_id)
+            self.remove_member_row(member_id)
             self.clear_inputs()
             self.save_file(manual=True)
             messagebox.showinfo("成功", "会员已删除")
@@ -1470,75 +5932,71 @@ class MembershipSystem:
         self.exchange_points_var.set("")
         self.status_var.set("正常")
         
-        for item in self.trans_tree.get_children():
-            self.trans_tree.delete(item)
+        if self.trans_tree is not None:
+            self.trans_tree.delete(*self.trans_tree.get_children())
     
+    def on_search_changed(self, *args):
+        """边输入边搜索：输入停顿后再执行，避免每个字符都刷新列表"""
+        if self.search_after_id:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE, self.search_as_typed)
+    
+    def search_as_typed(self):
+        self.search_after_id = None
+        if self.loading or self.search_var.get().strip().lower() == self.last_search_keyword:
+            return
+        self.search_member()
+    
+    @instrumented("search_member")
     def search_member(self):
         keyword = self.search_var.get().strip().lower()
+        self.last_search_keyword = keyword
         if not keyword:
             self.refresh_member_list()
             return
         
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        count = 0
-        for member in self.members.values():
-            if (keyword in member['id'].lower() or
-                keyword in member['name'].lower() or
-                keyword in member['phone'].lower() or
-                keyword in member['level'].lower()):
-                self.tree.insert("", tk.END, values=(
-                    member['id'],
-                    member['name'],
-                    member['phone'],
-                    member['level'],
-                    f"¥{member['balance']}",
-                    member['points'],
-                    member['status']
-                ))
-                count += 1
-        
-        self.status_bar_var.set(f"搜索到 {count} 个结果")
+        # 输入完整手机号时直接定位到该会员
+        if PHONE_PATTERN.match(keyword) and self.service.find_by_phone(keyword):
+            self.lookup_member_by_phone(keyword)
+            return
+        
+        self.show_member_ids(self.service.search(keyword))
+        self.status_bar_var.set(f"搜索到 {len(self.view_ids)} 个结果")
+    
+    def lookup_member_by_phone(self, phone=None):
+        """按手机号定位会员（收银时快速查找）"""
+        if not self.ensure_loaded():
+            return
+        if phone is None:
+            phone = simpledialog.askstring("按手机号查找", "请输入会员手机号：", parent=self.root)
+            if not phone:
+                return
+            phone = phone.strip()
+        
+        member_id = self.service.find_by_phone(phone)
+        if not member_id:
+            messagebox.showinfo("提示", f"未找到使用手机号 {phone} 的会员")
+            return
+        
+        self.show_member_ids([member_id])
+        self.tree.selection_set(member_id)
+        self.show_member(member_id)
+        self.status_bar_var.set(f"已定位会员：{self.store.members[member_id].name}（{phone}）")
     
     def reset_search(self):
         self.search_var.set("")
+        self.last_search_keyword = ""
         self.refresh_member_list()
         self.status_bar_var.set("就绪")
     
     def check_birthday_reminders(self):
-        today = date.today()
-        upcoming = []
-        
-        for member in self.members.values():
-            if member['status'] != "正常" or not member['birthday']:
-                continue
-            
-            try:
-                bday = datetime.strptime(member['birthday'], "%Y-%m-%d").date()
-                this_year_bday = bday.replace(year=today.year)
-                if this_year_bday < today:
-                    this_year_bday = this_year_bday.replace(year=today.year + 1)
-                
-                days = (this_year_bday - today).days
-                if 0 <= days <= self.config["birthday_reminder_days"]:
-                    upcoming.append(f"{member['name']}（{this_year_bday.strftime('%m-%d')}，{days}天后）")
-            except:
-                continue
-        
+        upcoming = self.upcoming_birthdays()
         if upcoming:
             messagebox.showinfo("生日提醒", "近期生日会员：\n" + "\n".join(upcoming))
     
     def auto_import_members(self):
-        """自动导入会员数据"""
-        try:
-            for filename in os.listdir(self.config["auto_import_path"]):
-                if filename.endswith(".json") and filename not in self.auto_imported_files:
-                    file_path = os.path.join(self.config["auto_import_path"], filename)
-                    if self.import_single_file(file_path):
-                        self.auto_imported_files.add(filename)
-        except Exception as e:
-            print(f"自动导入错误: {e}")
+        """自动导入会员数据：启动目录监视，已有的新文件和之后放入的文件都会自动导入"""
+        self.start_import_watcher()
     
     def show_about(self):
         messagebox.showinfo("关于", "会员管理系统 v1.17.95\n\n更新内容：\n1. 修复打印功能，解决无法打印问题\n2. 新增PDF打印方案，支持跨平台\n3. 优化中文显示，确保打印内容完整\n4. 增加打印设置和帮助说明")
@@ -1558,6 +6016,15 @@ class MembershipSystem:
         messagebox.showinfo("使用帮助", help_text)
 
 if __name__ == "__main__":
+    if any(arg in ("--list-backups", "--restore") for arg in sys.argv[1:]):
+        sys.exit(backup_cli(sys.argv[1:]))
+    if "--benchmark" in sys.argv[1:]:
+        sys.exit(benchmark_cli(sys.argv[1:]))
+    if "--serve" in sys.argv[1:]:
+        sys.exit(serve_cli(sys.argv[1:]))
+    
     root = tk.Tk()
     app = MembershipSystem(root)
+    if "--profile" in sys.argv[1:]:
+        app.start_profiling()
     root.mainloop()
\ No newline at end of file